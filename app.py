@@ -1,8 +1,10 @@
-from flask import Flask, render_template, request
+from flask import Flask, Response, make_response, render_template, request, stream_with_context
 from dotenv import load_dotenv
+import json
 import os
 import uuid
-from src.graphChat import agentic_reply  
+from src.graphChat import agentic_reply, agentic_reply_stream, courses, warm_up
+from src.metrics import registry
 
 app = Flask(__name__)
 
@@ -10,40 +12,123 @@ load_dotenv()
 os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY", "")
 os.environ["PINECONE_API_KEY"] = os.getenv("PINECONE_API_KEY", "")
 
+# por padrão LLM, embedder e índice carregam no primeiro uso;
+# WARMUP_ON_START=1 carrega tudo antes de aceitar requisições
+if os.getenv("WARMUP_ON_START", "0") == "1":
+    warm_up()
+
+def _session_id_from_form() -> str:
+    # sem session_id (cliente antigo) a requisição vira uma sessão avulsa
+    return request.form.get("session_id", "").strip()[:64] or str(uuid.uuid4())
+
+# cookie com o id estável do aluno (perfil de domínio por seção, src/student_profiles.py)
+STUDENT_COOKIE = "student_id"
+STUDENT_COOKIE_MAX_AGE = 365 * 24 * 3600
+
+def _student_id():
+    # campo "student_id" (integração com LMS/login) ou o cookie criado pela página; None = sem perfil
+    value = request.form.get("student_id", "") or request.cookies.get(STUDENT_COOKIE, "")
+    return value.strip()[:64] or None
+
+def _course_id(value: str):
+    # vazio = curso padrão; None quando o curso não está no catálogo
+    value = (value or "").strip()[:64]
+    if not value:
+        return courses.default_id
+    return value if value in courses else None
+
 @app.route("/")
 def index():
+    """
+    Página do chat; ?course=<id> escolhe o curso do catálogo (src/courses.py).
+    """
+    course_id = _course_id(request.args.get("course", ""))
+    if course_id is None:
+        return "Curso desconhecido.", 404
+    session_id = str(uuid.uuid4())
     try:
-        welcome = agentic_reply()
+        welcome = agentic_reply(session_id=session_id, course_id=course_id)
     except Exception as e:
         print("Erro ao obter mensagem inicial:", e)
         welcome = "Olá! Sou a professora Maísa. Estou aqui para conversar sobre o tema deste chat."
 
-    session_id = str(uuid.uuid4())
-    return render_template(
+    response = make_response(render_template(
         "chat.html",
         welcome_message=welcome,
-        session_id=session_id
-    )
+        session_id=session_id,
+        course_id=course_id,
+    ))
+    if not request.cookies.get(STUDENT_COOKIE):
+        response.set_cookie(
+            STUDENT_COOKIE, str(uuid.uuid4()), max_age=STUDENT_COOKIE_MAX_AGE, httponly=True, samesite="Lax"
+        )
+    return response
 
 @app.route("/get", methods=["POST"])
 def chat():
     """
     Rota de interação:
-    - Recebe mensagem do usuário.
+    - Recebe mensagem do usuário, o session_id gerado na página e o curso.
     - Retorna a resposta do agente.
     """
     msg = request.form.get("msg", "").strip()
     if not msg:
         return "Mensagem vazia.", 400
+    course_id = _course_id(request.form.get("course", ""))
+    if course_id is None:
+        return "Curso desconhecido.", 404
+    session_id = _session_id_from_form()
 
     try:
-        response = agentic_reply(msg)
+        response = agentic_reply(msg, session_id=session_id, course_id=course_id, student_id=_student_id())
     except Exception as e:
         print("Erro ao processar mensagem:", e)
         response = "Desculpe, ocorreu um erro ao processar sua mensagem."
 
     return str(response)
 
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@app.route("/stream", methods=["POST"])
+def chat_stream():
+    """
+    Rota de interação com streaming (Server-Sent Events):
+    - event: token -> pedaço da resposta assim que o LLM o gera.
+    - event: done  -> fim da resposta.
+    - event: error -> falha no meio do processamento.
+    """
+    msg = request.form.get("msg", "").strip()
+    if not msg:
+        return "Mensagem vazia.", 400
+    course_id = _course_id(request.form.get("course", ""))
+    if course_id is None:
+        return "Curso desconhecido.", 404
+    session_id = _session_id_from_form()
+    student_id = _student_id()
+
+    def generate():
+        try:
+            for token in agentic_reply_stream(msg, session_id=session_id, course_id=course_id, student_id=student_id):
+                yield _sse("token", {"text": token})
+        except Exception as e:
+            print("Erro ao processar mensagem:", e)
+            yield _sse("error", {"text": "Desculpe, ocorreu um erro ao processar sua mensagem."})
+        yield _sse("done", {})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/metrics")
+def metrics():
+    """
+    Latência por estágio, tokens e contadores de cache no formato texto do Prometheus.
+    """
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8080, debug=True)
 
@@ -0,0 +1,203 @@
+"""
+Entrada ASGI do chat (mesmas rotas de app.py, com handlers assíncronos).
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8080 --workers 2
+
+Variáveis de ambiente:
+    MAX_CONCURRENCY  requisições processando o grafo ao mesmo tempo (padrão 64)
+    MAX_QUEUE        requisições aguardando vaga; acima disso responde 429 (padrão 256)
+    QUEUE_TIMEOUT    segundos máximos na fila antes de responder 429 (padrão 10)
+                     (/stream já abriu o SSE: a recusa vem como evento "error")
+    WARMUP_ON_START  1 = carrega LLM, embedder e índice antes de aceitar requisições
+    COURSES_FILE     catálogo de cursos (src/courses.py); o curso vem em ?course= / no campo "course"
+
+O perfil do aluno usa o campo "student_id" ou o cookie student_id criado pela página.
+"""
+import asyncio
+import json
+import os
+import uuid
+
+from dotenv import load_dotenv
+from quart import Quart, Response, make_response, render_template, request
+
+from src.graphChat import agentic_reply_async, agentic_reply_astream, courses, warm_up
+from src.metrics import registry
+
+app = Quart(__name__)
+
+load_dotenv()
+os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY", "")
+os.environ["PINECONE_API_KEY"] = os.getenv("PINECONE_API_KEY", "")
+
+
+class ConcurrencyLimiter:
+    """
+    Backpressure: no máximo max_concurrency turnos em andamento e max_queue
+    aguardando. Quando a fila está cheia, ou a espera passa de queue_timeout,
+    a requisição é recusada na hora (429) em vez de estourar timeout no cliente.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float) -> None:
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def acquire(self) -> bool:
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+limiter = ConcurrencyLimiter(
+    max_concurrency=int(os.getenv("MAX_CONCURRENCY", "64")),
+    max_queue=int(os.getenv("MAX_QUEUE", "256")),
+    queue_timeout=float(os.getenv("QUEUE_TIMEOUT", "10")),
+)
+
+@app.before_serving
+async def _warm_up():
+    if os.getenv("WARMUP_ON_START", "0") == "1":
+        await asyncio.to_thread(warm_up)
+
+
+BUSY_MESSAGE = "Muitos alunos conversando agora. Tente novamente em alguns segundos."
+
+
+def _course_id(value: str):
+    # vazio = curso padrão; None quando o curso não está no catálogo
+    value = (value or "").strip()[:64]
+    if not value:
+        return courses.default_id
+    return value if value in courses else None
+
+
+STUDENT_COOKIE = "student_id"
+STUDENT_COOKIE_MAX_AGE = 365 * 24 * 3600
+
+
+def _student_id(form):
+    # campo "student_id" (integração com LMS/login) ou o cookie criado pela página; None = sem perfil
+    value = form.get("student_id", "") or request.cookies.get(STUDENT_COOKIE, "")
+    return value.strip()[:64] or None
+
+
+def _too_many_requests():
+    return BUSY_MESSAGE, 429, {"Retry-After": "2"}
+
+
+@app.route("/")
+async def index():
+    course_id = _course_id(request.args.get("course", ""))
+    if course_id is None:
+        return "Curso desconhecido.", 404
+    session_id = str(uuid.uuid4())
+    try:
+        welcome = await agentic_reply_async(None, session_id, course_id)
+    except Exception as e:
+        print("Erro ao obter mensagem inicial:", e)
+        welcome = "Olá! Sou a professora Maísa. Estou aqui para conversar sobre o tema deste chat."
+
+    response = await make_response(await render_template(
+        "chat.html",
+        welcome_message=welcome,
+        session_id=session_id,
+        course_id=course_id,
+    ))
+    if not request.cookies.get(STUDENT_COOKIE):
+        response.set_cookie(
+            STUDENT_COOKIE, str(uuid.uuid4()), max_age=STUDENT_COOKIE_MAX_AGE, httponly=True, samesite="Lax"
+        )
+    return response
+
+
+@app.route("/get", methods=["POST"])
+async def chat():
+    form = await request.form
+    msg = form.get("msg", "").strip()
+    if not msg:
+        return "Mensagem vazia.", 400
+    course_id = _course_id(form.get("course", ""))
+    if course_id is None:
+        return "Curso desconhecido.", 404
+    session_id = form.get("session_id", "").strip()[:64] or str(uuid.uuid4())
+    student_id = _student_id(form)
+
+    if not await limiter.acquire():
+        return _too_many_requests()
+    try:
+        response = await agentic_reply_async(msg, session_id, course_id, student_id)
+    except Exception as e:
+        print("Erro ao processar mensagem:", e)
+        response = "Desculpe, ocorreu um erro ao processar sua mensagem."
+    finally:
+        limiter.release()
+
+    return str(response)
+
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@app.route("/stream", methods=["POST"])
+async def chat_stream():
+    form = await request.form
+    msg = form.get("msg", "").strip()
+    if not msg:
+        return "Mensagem vazia.", 400
+    course_id = _course_id(form.get("course", ""))
+    if course_id is None:
+        return "Curso desconhecido.", 404
+    session_id = form.get("session_id", "").strip()[:64] or str(uuid.uuid4())
+    student_id = _student_id(form)
+
+    async def generate():
+        # a vaga é pedida e liberada dentro do stream: se o corpo nunca for
+        # consumido (cliente caiu antes do envio), nenhuma vaga fica presa
+        if not await limiter.acquire():
+            yield _sse("error", {"text": BUSY_MESSAGE})
+            return
+        try:
+            async for token in agentic_reply_astream(msg, session_id, course_id, student_id):
+                yield _sse("token", {"text": token})
+        except Exception as e:
+            print("Erro ao processar mensagem:", e)
+            yield _sse("error", {"text": "Desculpe, ocorreu um erro ao processar sua mensagem."})
+        finally:
+            limiter.release()
+        yield _sse("done", {})
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/metrics")
+async def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=8080)
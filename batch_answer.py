@@ -0,0 +1,164 @@
+"""
+Responde em lote as perguntas de um arquivo JSONL (avaliações de regressão,
+explicações de exercícios, atualização de FAQ) e grava os resultados em JSONL.
+
+Entrada: uma pergunta por linha, {"id": ..., "question": ..., "course": ...}
+("course" é opcional); também aceita o formato do requests.jsonl
+(request_id, title, body).
+
+    python batch_answer.py perguntas.jsonl -o respostas.jsonl
+    python batch_answer.py perguntas.jsonl -o respostas.jsonl --concurrency 16 --chunk-size 256
+    python batch_answer.py perguntas.jsonl -o respostas.jsonl --mode graph
+
+Modos:
+  staged (padrão): graphChat.agentic_reply_batch, etapa por etapa para cada
+      bloco de --chunk-size perguntas (embeddings em lote, llm.batch);
+  graph: agentic_reply com uma sessão nova por pergunta, --concurrency em
+      paralelo (o caminho ao vivo, com caches, coalescência e perfis).
+
+Cada bloco é gravado assim que termina: depois de uma falha (ou Ctrl-C)
+basta rodar de novo, os ids que já estão na saída são pulados. Perguntas
+com erro não são gravadas e entram na próxima execução. No fim, mostra a
+vazão em perguntas/minuto.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# chamadas simultâneas ao LLM (limite de taxa do provedor)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "64"))
+
+
+def read_questions(path):
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            text = data.get("question") or data.get("text")
+            if not text:
+                text = "\n\n".join(str(data[field]) for field in ("title", "body") if data.get(field))
+            if not text:
+                raise ValueError(f"{path}:{number}: linha sem pergunta")
+            question_id = str(data.get("id") or data.get("request_id") or f"linha-{number}")
+            questions.append({"id": question_id, "question": text, "course": data.get("course")})
+    return questions
+
+
+def done_ids(path):
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                # última linha cortada por uma interrupção: a pergunta roda de novo
+                continue
+    return done
+
+
+def run_staged(graphChat, chunk, course_id, args):
+    results = []
+    by_course = {}
+    for entry in chunk:
+        by_course.setdefault(entry["course"] or course_id, []).append(entry)
+    for course, entries in by_course.items():
+        answers = graphChat.agentic_reply_batch(
+            [e["question"] for e in entries], course_id=course, concurrency=args.concurrency, use_bank=args.use_bank
+        )
+        results.extend(zip(entries, answers))
+    return results
+
+
+def run_graph(graphChat, pool, chunk, course_id):
+    def answer(entry):
+        try:
+            text = graphChat.agentic_reply(
+                entry["question"], session_id=f"batch-{uuid.uuid4().hex}", course_id=entry["course"] or course_id
+            )
+            return {"answer": text}
+        except Exception as e:
+            return {"error": repr(e)}
+
+    return list(zip(chunk, pool.map(answer, chunk)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL de perguntas")
+    parser.add_argument("-o", "--output", required=True, help="JSONL de respostas (retomado se já existir)")
+    parser.add_argument("--course", help="curso das linhas sem \"course\" (padrão: curso padrão)")
+    parser.add_argument("--mode", choices=("staged", "graph"), default="staged")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--chunk-size", type=int, default=BATCH_CHUNK_SIZE)
+    parser.add_argument("--use-bank", action="store_true", help="staged: aceita respostas do banco pré-computado")
+    parser.add_argument("--limit", type=int, help="responde no máximo N perguntas nesta execução")
+    args = parser.parse_args(argv)
+
+    questions = read_questions(args.input)
+    done = done_ids(args.output)
+    pending = [q for q in questions if q["id"] not in done][:args.limit]
+    print(json.dumps({"questions": len(questions), "done": len(done), "pending": len(pending)}))
+    if not pending:
+        return
+
+    from src import graphChat
+
+    pool = ThreadPoolExecutor(max_workers=max(1, args.concurrency), thread_name_prefix="batch-answer")
+    chunk_size = max(1, args.chunk_size)
+    answered = 0
+    failures = []
+    start = time.perf_counter()
+    try:
+        with open(args.output, "a", encoding="utf-8") as out:
+            for i in range(0, len(pending), chunk_size):
+                chunk = pending[i:i + chunk_size]
+                if args.mode == "staged":
+                    results = run_staged(graphChat, chunk, args.course, args)
+                else:
+                    results = run_graph(graphChat, pool, chunk, args.course)
+                for entry, result in results:
+                    if "error" in result:
+                        failures.append({"id": entry["id"], "question": entry["question"][:80], "error": result["error"]})
+                        continue
+                    record = {"id": entry["id"], "course": entry["course"] or args.course, "question": entry["question"], **result}
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    answered += 1
+                out.flush()
+                os.fsync(out.fileno())
+                elapsed = time.perf_counter() - start
+                print(f"{answered}/{len(pending)} respostas ({60 * answered / elapsed:.1f} perguntas/min)...")
+    except KeyboardInterrupt:
+        print(f"Interrompido: {answered} respostas gravadas; rode de novo para continuar.")
+        pool.shutdown(wait=False, cancel_futures=True)
+        sys.exit(130)
+    pool.shutdown()
+
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "mode": args.mode,
+        "answered": answered,
+        "failed": len(failures),
+        "elapsed_s": round(elapsed, 1),
+        "questions_per_min": round(60 * answered / elapsed, 1) if elapsed else 0.0,
+    }))
+    if failures:
+        print(json.dumps(failures[:10], ensure_ascii=False, indent=1))
+        print(f"{len(failures)} falhas; rode de novo para responder só as pendentes.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
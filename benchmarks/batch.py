@@ -0,0 +1,83 @@
+"""
+Vazão do modo em lote (graphChat.agentic_reply_batch / batch_answer.py)
+contra o laço de sempre sobre agentic_reply, com LLM e embeddings stub.
+
+Três execuções sobre as mesmas perguntas sintéticas (sessões novas):
+  - loop:   agentic_reply uma pergunta por vez (só as primeiras --loop-questions);
+  - graph:  agentic_reply com --concurrency threads (batch_answer.py --mode graph);
+  - staged: agentic_reply_batch em blocos de --chunk-size (o padrão do CLI).
+Mostra perguntas/minuto de cada uma e confere que staged respondeu tudo.
+
+    python -m benchmarks.batch
+    python -m benchmarks.batch --questions 500 --llm-latency 0.5 --concurrency 16
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+TOPICS = ["tabelas", "listas ordenadas", "formulários", "variáveis em PHP", "laços for", "sessões", "cookies", "arrays"]
+
+
+def synthetic_questions(n):
+    return [f"Como funcionam {TOPICS[i % len(TOPICS)]} no exemplo {i}?" for i in range(n)]
+
+
+def _per_min(count, elapsed):
+    return round(60 * count / elapsed, 1) if elapsed else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--loop-questions", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    tmpdir = tempfile.mkdtemp(prefix="batch-bench-")
+    os.environ.update({
+        "LLM_BACKEND": "stub",
+        "STUB_LLM_LATENCY": str(args.llm_latency),
+        "EMBEDDINGS_BACKEND": "stub",
+        "VECTOR_BACKEND": "stub",
+        "ANSWER_CACHE_ENABLED": "0",
+        "ANSWER_BANK_ENABLED": "0",
+        "PROFILES_DIR": os.path.join(tmpdir, "profiles"),
+        "LOG_FILE": os.path.join(tmpdir, "agent_llm_calls.txt"),
+    })
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src import graphChat
+
+    questions = synthetic_questions(args.questions)
+    report = {"questions": args.questions, "llm_latency_s": args.llm_latency, "concurrency": args.concurrency}
+
+    start = time.perf_counter()
+    for question in questions[:args.loop_questions]:
+        graphChat.agentic_reply(question, session_id=f"bench-{uuid.uuid4().hex}")
+    report["loop_per_min"] = _per_min(min(args.loop_questions, len(questions)), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda q: graphChat.agentic_reply(q, session_id=f"bench-{uuid.uuid4().hex}"), questions))
+    report["graph_per_min"] = _per_min(len(questions), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    results = []
+    for i in range(0, len(questions), args.chunk_size):
+        results.extend(graphChat.agentic_reply_batch(questions[i:i + args.chunk_size], concurrency=args.concurrency))
+    report["staged_per_min"] = _per_min(len(questions), time.perf_counter() - start)
+    report["staged_errors"] = sum("error" in r for r in results)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if report["staged_errors"] or len(results) != len(questions):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
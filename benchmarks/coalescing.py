@@ -0,0 +1,140 @@
+"""
+Coalescência de perguntas idênticas em andamento (src/singleflight.py).
+
+N alunos novos mandam a mesma primeira pergunta ao mesmo tempo (variando
+maiúsculas, espaços e pontuação final), com LLM e retriever stub lentos.
+Com COALESCE_ENABLED o backend deve ver exatamente uma chamada ao
+classificador, uma ao retriever e uma ao LLM de resposta; sem coalescência,
+N de cada. Roda pelo caminho síncrono (threads) e pelo assíncrono
+(agentic_reply_async com asyncio.gather) e sai com código 1 se a contagem
+não bater.
+
+    python -m benchmarks.coalescing
+    python -m benchmarks.coalescing --callers 50 --llm-latency 1.0
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+QUESTION = "Como faço uma lista ordenada com <ol>?"
+
+calls = Counter()
+_calls_lock = threading.Lock()
+
+
+def _count(stage):
+    with _calls_lock:
+        calls[stage] += 1
+
+
+def variants(question, n):
+    forms = [question, question.lower(), question.upper(), "  " + question.rstrip("?") + "  ", question + "!"]
+    return [forms[i % len(forms)] for i in range(n)]
+
+
+def _build_stubs(llm_latency, retrieve_latency):
+    from src.stubs import StubChatModel, StubRetriever
+
+    class CountingChatModel(StubChatModel):
+        def _reply_for(self, messages):
+            first = str(getattr(messages[0], "content", "")) if messages else ""
+            _count("classify" if "classificador" in first else "answer")
+            return super()._reply_for(messages)
+
+    class CountingRetriever(StubRetriever):
+        def _get_relevant_documents(self, query, *, run_manager):
+            _count("retrieve")
+            return super()._get_relevant_documents(query, run_manager=run_manager)
+
+    return CountingChatModel(latency=llm_latency), CountingRetriever(k=2, latency=retrieve_latency)
+
+
+def run_threads(graphChat, questions):
+    barrier = threading.Barrier(len(questions))
+
+    def ask(question):
+        barrier.wait()
+        return graphChat.agentic_reply(question, session_id=f"coalesce-{uuid.uuid4().hex}")
+
+    with ThreadPoolExecutor(max_workers=len(questions)) as pool:
+        return list(pool.map(ask, questions))
+
+
+def run_async(graphChat, questions):
+    async def main():
+        return await asyncio.gather(
+            *(graphChat.agentic_reply_async(q, f"coalesce-{uuid.uuid4().hex}") for q in questions)
+        )
+
+    return asyncio.run(main())
+
+
+def measure(graphChat, runner, questions, coalesce):
+    graphChat.COALESCE_ENABLED = coalesce
+    calls.clear()
+    start = time.perf_counter()
+    answers = runner(graphChat, questions)
+    elapsed = time.perf_counter() - start
+    return {
+        "coalesce": coalesce,
+        "elapsed_s": round(elapsed, 3),
+        "backend_calls": dict(calls),
+        "distinct_answers": len(set(answers)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--retrieve-latency", type=float, default=0.2)
+    parser.add_argument("--question", default=QUESTION)
+    args = parser.parse_args(argv)
+
+    # sem roteador local e sem cache de respostas: toda pergunta passa pelo classificador LLM
+    tmpdir = tempfile.mkdtemp(prefix="coalescing-bench-")
+    os.environ.update({
+        "ROUTER_ENABLED": "0",
+        "ANSWER_CACHE_ENABLED": "0",
+        "ANSWER_BANK_ENABLED": "0",
+        "EMBEDDINGS_BACKEND": "stub",
+        "LLM_BACKEND": "stub",
+        "VECTOR_BACKEND": "stub",
+        "CHECKPOINT_BACKEND": "memory",
+        "PROFILES_DIR": os.path.join(tmpdir, "profiles"),
+        "LOG_FILE": os.path.join(tmpdir, "agent_llm_calls.txt"),
+    })
+    from src import graphChat
+
+    llm, retriever = _build_stubs(args.llm_latency, args.retrieve_latency)
+    graphChat.set_resource("llm", llm)
+    graphChat.set_resource("retriever", (retriever, "stub"))
+
+    questions = variants(args.question, args.callers)
+    report = {"callers": args.callers, "llm_latency_s": args.llm_latency, "retrieve_latency_s": args.retrieve_latency}
+    failures = []
+    for name, runner in (("threads", run_threads), ("async", run_async)):
+        on = measure(graphChat, runner, questions, coalesce=True)
+        off = measure(graphChat, runner, questions, coalesce=False)
+        report[name] = {"coalesced": on, "baseline": off}
+        expected = {"classify": 1, "retrieve": 1, "answer": 1}
+        if on["backend_calls"] != expected:
+            failures.append(f"{name}: esperado {expected}, obtido {on['backend_calls']}")
+
+    report["flights"] = {name: flight.stats() for name, flight in graphChat._flights.items()}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if failures:
+        print("\n".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
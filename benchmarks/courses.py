@@ -0,0 +1,154 @@
+"""
+Memória por curso extra num único processo (catálogo de src/courses.py).
+
+Monta N cursos sintéticos num diretório temporário: cada um tem um índice
+local próprio com os documentos de --paths, marcados com o id do curso.
+Depois carrega os cursos um a um pelo CourseRegistry do graphChat. Mede:
+  - o custo fixo compartilhado (modelo de embeddings), carregado uma vez;
+  - a memória acrescentada por curso: tracemalloc (Python + NumPy) e RSS;
+  - evicção LRU com --max-loaded menor que N;
+  - um turno de chat por curso (LLM stub), para conferir que cada
+    requisição usa os prompts e o índice do próprio curso.
+
+    python -m benchmarks.courses
+    python -m benchmarks.courses --courses 20 --max-loaded 8 --paths resources/Exercícios.json
+    python -m benchmarks.courses --real-embeddings
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+
+def build_catalogue(root, documents, embeddings, n):
+    from langchain_core.documents import Document
+
+    from src.vector_index import LocalVectorIndex
+
+    courses = []
+    for i in range(n):
+        course_id = f"curso-{i:03d}"
+        docs = [
+            Document(page_content=f"{d.page_content}\n\n({course_id})", metadata={**d.metadata, "course": course_id})
+            for d in documents
+        ]
+        index_dir = os.path.join(root, "index", course_id)
+        LocalVectorIndex.from_documents(docs, embeddings).save(index_dir)
+        courses.append({
+            "id": course_id,
+            "name": f"Curso sintético {i}",
+            "welcome_message": f"Olá! Este é o {course_id}.",
+            "index_dir": index_dir,
+        })
+    path = os.path.join(root, "courses.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"default": courses[0]["id"], "courses": courses}, f, ensure_ascii=False)
+    return path, [c["id"] for c in courses]
+
+
+def _rss_bytes():
+    from src.courses import _rss_bytes
+
+    return _rss_bytes()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=10)
+    parser.add_argument("--max-loaded", type=int, help="COURSE_MAX_LOADED (padrão: todos)")
+    parser.add_argument("--paths", nargs="*", default=[os.path.join("resources", "Exercícios.json")])
+    parser.add_argument("--real-embeddings", action="store_true", help="modelo de embeddings do projeto (senão, stub)")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src.indexing import iter_source_files
+    from src.ingest import Ingestor, supported_extensions
+
+    ingestor = Ingestor()
+    documents = [d for f in iter_source_files(args.paths, supported_extensions()) for d in ingestor.load(f) or []]
+
+    tmpdir = tempfile.mkdtemp(prefix="courses-bench-")
+    os.environ.update({
+        "LLM_BACKEND": "stub",
+        "STUB_LLM_LATENCY": "0",
+        "EMBEDDINGS_BACKEND": "huggingface" if args.real_embeddings else "stub",
+        "VECTOR_BACKEND": "local",
+        "ANSWER_CACHE_ENABLED": "0",
+        "ANSWER_BANK_ENABLED": "0",
+        "COURSE_MAX_LOADED": str(args.max_loaded or args.courses),
+        "LOG_FILE": os.path.join(tmpdir, "agent_llm_calls.txt"),
+    })
+
+    tracemalloc.start()
+    rss = _rss_bytes()
+    traced = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    if args.real_embeddings:
+        from src.helper import downloald_hugging_face_embeddings
+
+        embeddings = downloald_hugging_face_embeddings()
+    else:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+
+        embeddings = DeterministicFakeEmbedding(size=384)
+    embeddings.embed_query("aquecimento")
+    shared = {
+        "traced_bytes": tracemalloc.get_traced_memory()[0] - traced,
+        "rss_bytes": _rss_bytes() - rss,
+        "load_s": round(time.perf_counter() - start, 3),
+    }
+
+    os.environ["COURSES_FILE"], course_ids = build_catalogue(tmpdir, documents, embeddings, args.courses)
+    from src import graphChat
+
+    graphChat.set_resource("embeddings", embeddings)
+
+    per_course = []
+    for course_id in course_ids:
+        traced = tracemalloc.get_traced_memory()[0]
+        rss = _rss_bytes()
+        start = time.perf_counter()
+        graphChat.get_retriever(course_id)
+        graphChat.get_router(course_id)
+        per_course.append({
+            "course": course_id,
+            "traced_bytes": tracemalloc.get_traced_memory()[0] - traced,
+            "rss_bytes": _rss_bytes() - rss,
+            "load_s": round(time.perf_counter() - start, 3),
+        })
+    tracemalloc.stop()
+
+    wrong_course = []
+    for course_id in course_ids:
+        welcome = graphChat.agentic_reply(None, session_id=f"bench-{uuid.uuid4().hex}", course_id=course_id)
+        if course_id not in welcome:
+            wrong_course.append(course_id)
+        graphChat.agentic_reply("Como faço uma tabela em HTML5?", session_id=f"bench-{uuid.uuid4().hex}", course_id=course_id)
+
+    # o primeiro curso é o padrão (fixo na memória): os extras são os demais
+    extra = per_course[1:] or per_course
+    report = {
+        "courses": args.courses,
+        "documents_per_course": len(documents),
+        "shared_embedder": shared,
+        "per_extra_course": {
+            "traced_bytes_mean": int(statistics.mean(c["traced_bytes"] for c in extra)),
+            "rss_bytes_mean": int(statistics.mean(c["rss_bytes"] for c in extra)),
+            "load_s_mean": round(statistics.mean(c["load_s"] for c in extra), 3),
+        },
+        "per_course": per_course,
+        "registry": {k: v for k, v in graphChat.courses.stats().items() if k != "per_course"},
+        "welcome_from_wrong_course": wrong_course,
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if wrong_course:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Compara o caminho atual de embeddings (HuggingFaceEmbeddings, um texto
+após o outro pelo LangChain) com o EmbeddingService:
+
+  - docs/s ao embedar as seções do PDF (ou --synthetic N textos), com cache
+    frio e com cache quente;
+  - latência de embed_query (p50/p95) com --concurrency consultas simultâneas.
+
+    python -m benchmarks.embeddings --pdf "data/Capítulo do Livro.pdf"
+    python -m benchmarks.embeddings --synthetic 2000 --workers 4 --runtime onnx-int8
+
+Precisa do modelo de embeddings disponível localmente (ou acesso ao Hub).
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.helper import EMBEDDING_MODEL, downloald_embeddings, extract_sections_as_documents
+
+QUERIES = [
+    "O que é uma fração?",
+    "Como somar frações com denominadores diferentes?",
+    "Explique frações equivalentes.",
+    "Qual a diferença entre numerador e denominador?",
+    "Como simplificar uma fração?",
+    "O que é número misto?",
+]
+
+
+def _synthetic_texts(n, seed=0):
+    rng = random.Random(seed)
+    words = "fração número parte inteiro metade terço divisão soma resultado exemplo aluno".split()
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(8, 300))) for _ in range(n)]
+
+
+def _docs_per_second(embeddings, texts):
+    start = time.perf_counter()
+    embeddings.embed_documents(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def _query_latency(embeddings, concurrency, total):
+    def one(i):
+        start = time.perf_counter()
+        embeddings.embed_query(f"{QUERIES[i % len(QUERIES)]} ({i})")
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(one, range(total)))
+    return {
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=os.path.join("data", "Capítulo do Livro.pdf"))
+    parser.add_argument("--synthetic", type=int, default=0, help="usa N textos sintéticos em vez do PDF")
+    parser.add_argument("--runtime", default="torch", choices=("torch", "onnx", "onnx-int8"))
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        texts = _synthetic_texts(args.synthetic)
+    else:
+        texts = [d.page_content for d in extract_sections_as_documents(args.pdf)]
+
+    from src.embedding_service import EmbeddingService
+
+    report = {"texts": len(texts)}
+    baseline = downloald_embeddings()
+    report["baseline"] = {
+        "docs_per_s": _docs_per_second(baseline, texts),
+        "query": _query_latency(baseline, args.concurrency, args.queries),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        service = EmbeddingService(
+            EMBEDDING_MODEL,
+            runtime=args.runtime,
+            batch_size=args.batch_size,
+            num_workers=args.workers,
+            cache_path=os.path.join(tmp, "cache.sqlite"),
+        )
+        try:
+            report["service"] = {
+                "runtime": args.runtime,
+                "docs_per_s_cold": _docs_per_second(service, texts),
+                "docs_per_s_cached": _docs_per_second(service, texts),
+                "query": _query_latency(service, args.concurrency, args.queries),
+                "stats": service.stats(),
+            }
+        finally:
+            service.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
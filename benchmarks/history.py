@@ -0,0 +1,115 @@
+"""
+Mostra que o tamanho do prompt e a latência por turno ficam estáveis em
+conversas longas (janela de histórico + checkpoint SQLite com só o último estado)
+e quanto de cada prompt repete o início do anterior (prefixo aproveitável pelo
+cache de prompt do provedor).
+
+    python -m benchmarks.history --turns 100
+
+Roda com LLM, embeddings e retriever locais (sem rede) e falha (exit 1) se
+o prompt dos últimos turnos passar o maior prompt da primeira metade da
+conversa (quando a janela já encheu) em mais que --tolerance.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class PromptSizeRecorder(BaseCallbackHandler):
+    """
+    Registra o tamanho (em caracteres) de cada prompt enviado ao LLM de resposta.
+    """
+
+    def __init__(self) -> None:
+        self.sizes = []
+        self.prompts = []
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        for batch in messages:
+            if batch and "classificador" in str(batch[0].content):
+                continue
+            self.sizes.append(sum(len(str(m.content)) for m in batch))
+            self.prompts.append([(m.type, str(m.content)) for m in batch])
+
+    def prefix_reuse(self):
+        """
+        Para cada prompt, fração (em caracteres) que repete o início do prompt
+        anterior mensagem a mensagem: o que o cache de prompt do provedor aproveitaria.
+        """
+        ratios = []
+        for previous, current in zip(self.prompts, self.prompts[1:]):
+            shared = 0
+            for a, b in zip(previous, current):
+                if a != b:
+                    break
+                shared += len(a[1])
+            total = sum(len(content) for _, content in current)
+            ratios.append(shared / total if total else 0.0)
+        return ratios
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--window", type=int, default=10, help="turnos comparados no início e no fim")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    tmpdir = tempfile.mkdtemp(prefix="history-bench-")
+    os.environ.update({
+        "LLM_BACKEND": "stub",
+        "VECTOR_BACKEND": "stub",
+        "EMBEDDINGS_BACKEND": "stub",
+        "STUB_LLM_LATENCY": "0",
+        "ANSWER_CACHE_ENABLED": "0",
+        "CHECKPOINT_BACKEND": "sqlite",
+        "CHECKPOINT_DB": os.path.join(tmpdir, "checkpoints.sqlite"),
+        "LOG_FILE": os.path.join(tmpdir, "agent_llm_calls.txt"),
+    })
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src import graphChat
+
+    recorder = PromptSizeRecorder()
+    graphChat.llm.callbacks = [recorder]
+
+    session_id = str(uuid.uuid4())
+    graphChat.agentic_reply(session_id=session_id)
+    latencies = []
+    for turn in range(args.turns):
+        start = time.perf_counter()
+        graphChat.agentic_reply(f"Pergunta {turn}: como funciona a tag <table>?", session_id=session_id)
+        latencies.append(time.perf_counter() - start)
+
+    w = args.window
+    head_prompt = statistics.fmean(recorder.sizes[:w])
+    tail_prompt = statistics.fmean(recorder.sizes[-w:])
+    head_ms = statistics.fmean(latencies[:w]) * 1000
+    tail_ms = statistics.fmean(latencies[-w:]) * 1000
+    db_bytes = os.path.getsize(os.environ["CHECKPOINT_DB"])
+
+    report = {
+        "turns": args.turns,
+        "prompt_chars_first": round(head_prompt),
+        "prompt_chars_last": round(tail_prompt),
+        "prompt_chars_max": max(recorder.sizes),
+        "latency_ms_first": round(head_ms, 2),
+        "latency_ms_last": round(tail_ms, 2),
+        "checkpoint_db_bytes": db_bytes,
+        "prompt_prefix_reuse_mean": round(statistics.fmean(recorder.prefix_reuse()), 3),
+    }
+    print(json.dumps(report, indent=2))
+
+    # os primeiros turnos ainda estão enchendo a janela: compara o fim com o pico
+    grew = tail_prompt > max(recorder.sizes[:args.turns // 2]) * (1 + args.tolerance)
+    sys.exit(1 if grew else 0)
+
+
+if __name__ == "__main__":
+    main()
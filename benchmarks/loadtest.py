@@ -0,0 +1,110 @@
+"""
+Teste de carga do servidor ASGI com LLM e retriever locais (sem rede).
+
+    python -m benchmarks.loadtest --students 50 200 1000 --turns 3 --llm-latency 0.5
+
+Cada aluno simulado abre uma sessão e envia --turns mensagens em sequência;
+todos os alunos rodam ao mesmo tempo. Reporta vazão, latência p50/p95/p99
+e quantas requisições foram recusadas (429) pelo limitador de concorrência.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+QUESTIONS = [
+    "O que é uma tabela em HTML5?",
+    "Qual a diferença entre ul e ol?",
+    "Como uso a tag thead?",
+    "Como defino a estrutura básica de uma página?",
+]
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(q * (len(values) - 1))))
+    return values[idx]
+
+
+async def _student(client, turns, latencies, statuses):
+    session_id = str(uuid.uuid4())
+    for t in range(turns):
+        start = time.perf_counter()
+        resp = await client.post(
+            "/get",
+            form={"msg": QUESTIONS[t % len(QUESTIONS)], "session_id": session_id},
+        )
+        latencies.append(time.perf_counter() - start)
+        statuses.append(resp.status_code)
+
+
+async def run_level(app, students, turns):
+    client = app.test_client()
+    latencies, statuses = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(_student(client, turns, latencies, statuses) for _ in range(students)))
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for s in statuses if s == 200)
+    return {
+        "students": students,
+        "requests": len(statuses),
+        "ok": ok,
+        "rejected_429": sum(1 for s in statuses if s == 429),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0,
+    }
+
+
+async def run_levels(app, levels, turns):
+    # um único event loop para todos os níveis (o limitador é criado uma vez)
+    return [await run_level(app, n, turns) for n in levels]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--max-concurrency", type=int, default=None)
+    parser.add_argument("--max-queue", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    # precisa ser definido antes de importar o grafo
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["VECTOR_BACKEND"] = "stub"
+    os.environ["EMBEDDINGS_BACKEND"] = "stub"
+    os.environ["STUB_LLM_LATENCY"] = str(args.llm_latency)
+    # todos os alunos mandam as mesmas perguntas: cache, banco de respostas e
+    # coalescência responderiam quase tudo sem passar pelo grafo
+    os.environ["ANSWER_CACHE_ENABLED"] = "0"
+    os.environ["ANSWER_BANK_ENABLED"] = "0"
+    os.environ["COALESCE_ENABLED"] = "0"
+    # trace e perfis fora da árvore do repositório
+    tmpdir = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ["LOG_FILE"] = os.path.join(tmpdir, "agent_llm_calls.txt")
+    os.environ["PROFILES_DIR"] = os.path.join(tmpdir, "profiles")
+    if args.max_concurrency is not None:
+        os.environ["MAX_CONCURRENCY"] = str(args.max_concurrency)
+    if args.max_queue is not None:
+        os.environ["MAX_QUEUE"] = str(args.max_queue)
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from asgi import app
+
+    results = asyncio.run(run_levels(app, args.students, args.turns))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Regressão e desempenho da extração de seções dos PDFs.
+
+Compara iter_sections_as_documents (streaming, flags sem imagens, pool de
+processos opcional) com a implementação original (get_text("dict") completo,
+todas as linhas em memória) e mede páginas/s de cada uma.
+
+    python -m benchmarks.pdf_extract                 # PDFs de resources/
+    python -m benchmarks.pdf_extract livros/ --workers 4
+
+Sai com código 1 se alguma seção (texto, título ou keywords) divergir.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from src.helper import iter_sections_as_documents
+from src.indexing import iter_source_files
+
+
+# ---------- implementação original (referência congelada) ----------
+def _reference_dominant_font(spans):
+    fonts = [s.get("font", "") for s in spans if s.get("text", "").strip()]
+    if not fonts:
+        return ""
+    return Counter(fonts).most_common(1)[0][0]
+
+
+def _reference_lines(doc):
+    for page in doc:
+        for block in page.get_text("dict").get("blocks", []):
+            if "lines" not in block:
+                continue
+            for line in block["lines"]:
+                spans = line.get("spans", [])
+                text = "".join(s.get("text", "") for s in spans).strip()
+                if text:
+                    yield text, _reference_dominant_font(spans)
+
+
+def _has(font, name):
+    return bool(font) and name.lower() in font.lower()
+
+
+def reference_sections(pdf_path):
+    import fitz
+
+    doc = fitz.open(pdf_path)
+    lines = list(_reference_lines(doc))
+    doc.close()
+    sections = []
+    i, n = 0, len(lines)
+    while i < n:
+        text, font = lines[i]
+        if not _has(font, "MyriadPro-Black"):
+            i += 1
+            continue
+        title_parts = [text]
+        j = i + 1
+        while j < n and _has(lines[j][1], "MyriadPro-Black"):
+            title_parts.append(lines[j][0])
+            j += 1
+        title = " ".join(p.strip() for p in title_parts).strip()
+        content, keywords = [], {title}
+        k = j
+        while k < n and not _has(lines[k][1], "MyriadPro-Black"):
+            if _has(lines[k][1], "MyriadPro-Semibold"):
+                keywords.add(lines[k][0].strip())
+            content.append(lines[k][0])
+            k += 1
+        sections.append({
+            "page_content": title + "\n\n" + "\n".join(content).strip(),
+            "metadata": {"source": pdf_path, "title": title, "keywords": sorted(keywords)},
+        })
+        i = k
+    return sections
+
+
+def _page_count(pdf_path):
+    import fitz
+
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", default=["resources"], help="PDFs ou diretórios (padrão: fontes do curso)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args(argv)
+
+    files = iter_source_files(args.paths)
+    pages = sum(_page_count(f) for f in files)
+    report = {"files": len(files), "pages": pages}
+    mismatches = []
+
+    reference, elapsed = _timed(lambda: {f: reference_sections(f) for f in files})
+    report["reference_pages_per_s"] = pages / elapsed
+
+    for label, workers in (("streaming", 0), (f"streaming_{args.workers}_workers", args.workers)):
+        result, elapsed = _timed(lambda: {
+            f: [{"page_content": d.page_content, "metadata": d.metadata} for d in iter_sections_as_documents(f, workers=workers)]
+            for f in files
+        })
+        report[f"{label}_pages_per_s"] = pages / elapsed
+        for f in files:
+            if result[f] != reference[f]:
+                mismatches.append({"file": f, "variant": label})
+
+    report["mismatches"] = mismatches
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Perfis de alunos (src/student_profiles.py) em escala: --students alunos,
+--sections seções, --turns turnos com busca, SQLite num diretório temporário.
+
+Cada aluno sintético tem algumas seções "difíceis" e pergunta sobre elas na
+maior parte dos turnos. Mede:
+  - latência de record_retrieval (atualização do perfil) e de rerank
+    (promoção das seções fracas entre os candidatos), p50/p99 em µs;
+  - memória das matrizes (bytes por aluno) com no máximo --resident alunos
+    em memória (PROFILE_MAX_RESIDENT) e quantos saíram por LRU;
+  - gravação em lote: lotes/linhas gravados pela thread durante a simulação
+    e a vazão de um flush com todos os alunos alterados;
+  - reabertura: leitura sob demanda dos perfis gravados (e se batem com a memória);
+  - efeito: alunos de amostra fazem mais --history turnos; depois, fração
+    de seções difíceis no top-k, sem e com o perfil, para perguntas em que
+    elas estão logo abaixo do top-k (até --max-shift posições); e, quando
+    estão mais abaixo, a fração promovida mesmo assim (deve ser 0: o perfil
+    não passa na frente de seções bem mais relevantes).
+
+    python -m benchmarks.profiles
+    python -m benchmarks.profiles --students 100000 --sections 200 --turns 500000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+
+def _percentiles(samples_ns):
+    samples = sorted(samples_ns)
+    if not samples:
+        return {"p50_us": 0.0, "p99_us": 0.0}
+    return {
+        "p50_us": round(samples[len(samples) // 2] / 1000, 1),
+        "p99_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] / 1000, 1),
+    }
+
+
+def candidates_for(asked, sections, n, position, rng):
+    # seção perguntada na posição dada, o resto aleatório (como os candidatos da busca híbrida)
+    others = [s for s in rng.sample(sections, n + 1) if s != asked][:n - 1]
+    others.insert(min(position, len(others)), asked)
+    return others
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=100_000)
+    parser.add_argument("--sections", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=300_000)
+    parser.add_argument("--weak", type=int, default=5, help="seções difíceis por aluno")
+    parser.add_argument("--history", type=int, default=30, help="turnos extras dos alunos de amostra")
+    parser.add_argument("--k", type=int, default=2)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=512, help="PROFILE_FLUSH_BATCH")
+    parser.add_argument("--interval", type=float, default=5.0, help="PROFILE_FLUSH_INTERVAL")
+    parser.add_argument("--resident", type=int, default=10_000, help="PROFILE_MAX_RESIDENT")
+    parser.add_argument("--max-shift", type=float, default=3.0, help="PROFILE_MAX_SHIFT")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src.student_profiles import StudentProfileStore
+
+    rng = random.Random(args.seed)
+    sections = [f"Seção {i}" for i in range(args.sections)]
+    students = [f"aluno-{i}" for i in range(args.students)]
+    weak = {s: rng.sample(sections, args.weak) for s in students}
+    path = os.path.join(tempfile.mkdtemp(prefix="profiles-bench-"), "profiles.sqlite")
+
+    store = StudentProfileStore(
+        path,
+        sections=sections,
+        batch_size=args.batch,
+        flush_interval=args.interval,
+        max_resident=args.resident,
+        max_shift=args.max_shift,
+    )
+    record_ns, rerank_ns = [], []
+    start = time.perf_counter()
+
+    def turn(student):
+        asked = rng.choice(weak[student]) if rng.random() < 0.7 else rng.choice(sections)
+        docs = candidates_for(asked, sections, args.candidates, rng.randrange(5), rng)
+        t0 = time.perf_counter_ns()
+        store.rerank(student, docs, args.k, str)
+        t1 = time.perf_counter_ns()
+        # como graphChat._personalize: registra o top-k por relevância, não o reordenado
+        store.record_retrieval(student, docs[:args.k])
+        t2 = time.perf_counter_ns()
+        rerank_ns.append(t1 - t0)
+        record_ns.append(t2 - t1)
+
+    for i in range(args.turns):
+        # todos os alunos aparecem ao menos uma vez; depois, turnos aleatórios
+        turn(students[i] if i < len(students) else rng.choice(students))
+    simulate_s = time.perf_counter() - start
+    during_run = store.stats()
+
+    # efeito: a seção difícil fora do top-k original, logo abaixo (near) ou bem abaixo (far)
+    probes = rng.sample(students, min(1000, len(students)))
+    for student in probes:
+        for _ in range(args.history):
+            turn(student)
+    near_ranks = int(args.max_shift)
+    baseline = boosted = far_promoted = 0
+    for student in probes:
+        asked = rng.choice(weak[student])
+        difficult = set(weak[student])
+        docs = candidates_for(asked, sections, args.candidates, rng.randrange(args.k, args.k + near_ranks), rng)
+        docs = [d for d in docs if d == asked or d not in difficult]
+        baseline += sum(d in difficult for d in docs[:args.k])
+        boosted += sum(d in difficult for d in store.rerank(student, docs, args.k, str))
+        docs = candidates_for(asked, sections, args.candidates, rng.randrange(args.k + near_ranks + 1, args.candidates), rng)
+        docs = [d for d in docs if d == asked or d not in difficult]
+        far_promoted += asked in store.rerank(student, docs, args.k, str)
+
+    # flush com todos os alunos alterados (pior caso de um lote); a thread não grava no meio
+    store.batch_size = len(students) + 1
+    for student in students:
+        store.record_retrieval(student, [])
+    start = time.perf_counter()
+    flushed = store.flush()
+    flush_s = time.perf_counter() - start
+    expected = {s: store.mastery(s) for s in rng.sample(students, 200)}
+    stats = store.stats()
+    start = time.perf_counter()
+    store.close()
+    close_s = time.perf_counter() - start
+
+    reopened = StudentProfileStore(path, flush_interval=3600)
+    sample = rng.sample(students, min(10_000, len(students)))
+    start = time.perf_counter()
+    for student in sample:
+        reopened.mastery(student)
+    load_s = time.perf_counter() - start
+    mismatched = sum(reopened.mastery(s) != m for s, m in expected.items())
+    reopened.close()
+
+    report = {
+        "students": args.students,
+        "sections": args.sections,
+        "turns": args.turns,
+        "simulate_s": round(simulate_s, 2),
+        "turns_per_s": round(args.turns / simulate_s) if simulate_s else 0,
+        "record_retrieval": _percentiles(record_ns),
+        "rerank": _percentiles(rerank_ns),
+        "memory": {
+            "matrix_bytes": stats["bytes"],
+            "bytes_per_student": round(stats["bytes"] / max(1, stats["students"]), 1),
+            "resident_students": stats["students"],
+            "evictions": stats["evictions"],
+        },
+        "background_flush": {"flushes": during_run["flushes"], "rows": during_run["flushed_rows"]},
+        "full_flush": {
+            "rows": flushed,
+            "seconds": round(flush_s, 3),
+            "rows_per_s": round(flushed / flush_s) if flush_s else 0,
+            "close_s": round(close_s, 3),
+        },
+        "reopen": {
+            "db_bytes": os.path.getsize(path),
+            "lazy_load_us_mean": round(1e6 * load_s / len(sample), 1),
+            "mismatched_profiles": mismatched,
+        },
+        "difficult_in_top_k": {
+            "baseline": round(baseline / (len(probes) * args.k), 3),
+            "with_profile": round(boosted / (len(probes) * args.k), 3),
+            "far_promoted": round(far_promoted / len(probes), 3),
+        },
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if mismatched or far_promoted:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
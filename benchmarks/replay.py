@@ -0,0 +1,324 @@
+"""
+Replay offline dos turnos gravados em agent_llm_calls.txt pelo grafo, sem
+OpenAI nem Pinecone: LLM stub determinístico (reproduz as rotas e as
+respostas gravadas, com latência simulada) e índice vetorial local.
+
+    python -m benchmarks.replay
+    python -m benchmarks.replay --trace agent_llm_calls.txt --llm-latency 0.2 --repeat 20 --concurrency 8
+    python -m benchmarks.replay --questions perguntas.jsonl --output bench.json
+
+Saída (JSON, comparável entre commits):
+  - latência ponta a ponta por turno (p50/p95/p99) e vazão (turnos/s);
+  - latência por nó/estágio (histograma tutor_stage_seconds: média, p50, p95);
+  - memória retida por sessão e alocações (tracemalloc, numa segunda passada
+    para não distorcer os tempos).
+
+O índice local vem de --index-dir (gerado pelo store_index.py) quando existe;
+senão é montado com os trechos de retrieve gravados no próprio trace.
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+WELCOME_TEXT = "(inicialização do chat)"
+
+
+# -------------------- leitura do trace --------------------
+def _open_text(path):
+    return gzip.open(path, "rt", encoding="utf-8") if path.endswith(".gz") else open(path, encoding="utf-8")
+
+
+def load_trace(paths):
+    """
+    Sessões gravadas: [{"session_id", "turns": [{"user_text", "needs_search",
+    "answer", "retrieved"}]}]. Mensagens com prompt_ref (system prompts
+    deduplicados pelo AgentLogger) são resolvidas pelos registros "prompt".
+    Arquivos rotacionados devem vir do mais antigo para o mais novo.
+    """
+    sessions = {}
+    for path in paths:
+        prompts = {}
+        with _open_text(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                kind = record.get("type")
+                if kind == "prompt":
+                    prompts[record["hash"]] = record["content"]
+                    continue
+                session = sessions.setdefault(record.get("session_id"), {"turns": {}})
+                turn = session["turns"].setdefault(record.get("turn_id"), {
+                    "user_text": None, "needs_search": None, "answer": None, "retrieved": [], "prompts": [],
+                })
+                if kind == "turn_start":
+                    text = record.get("user_text")
+                    turn["user_text"] = None if text == WELCOME_TEXT else text
+                elif kind == "route_decision":
+                    turn["needs_search"] = bool(record.get("needs_search"))
+                elif kind == "turn_end":
+                    turn["answer"] = record.get("assistant_text")
+                elif kind == "retrieve":
+                    turn["retrieved"].extend(record.get("results_preview") or [])
+                elif kind == "llm_call":
+                    turn["prompts"].append([
+                        {"role": m.get("role"), "content": m["content"] if "content" in m else prompts.get(m.get("prompt_ref"), "")}
+                        for m in record.get("prompt_messages") or []
+                    ])
+
+    result = []
+    for session_id, session in sessions.items():
+        turns = [t for _, t in sorted(session["turns"].items(), key=lambda item: item[0] or 0)]
+        # sessões só com a mensagem de boas-vindas não exercitam o grafo
+        if any(t["user_text"] for t in turns):
+            result.append({"session_id": session_id, "turns": turns})
+    return result
+
+
+def load_questions(path):
+    """
+    Perguntas avulsas (JSONL); cada linha vira uma sessão de um turno.
+    Usa o primeiro campo presente entre question, user_text, msg e title.
+    """
+    sessions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = next((record[k] for k in ("question", "user_text", "msg", "title") if record.get(k)), None)
+            if text:
+                sessions.append({"session_id": None, "turns": [
+                    {"user_text": text, "needs_search": None, "answer": None, "retrieved": [], "prompts": []}
+                ]})
+    return sessions
+
+
+def build_trace_index(sessions, directory):
+    """
+    Índice local com os trechos que o retrieve devolveu durante a gravação.
+    """
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    from src.vector_index import LocalVectorIndex
+
+    docs = {}
+    for session in sessions:
+        for turn in session["turns"]:
+            for item in turn["retrieved"]:
+                metadata = item.get("metadata") or {}
+                key = metadata.get("title") or item.get("preview", "")[:80]
+                docs.setdefault(key, Document(page_content=item.get("preview", ""), metadata=metadata))
+    if not docs:
+        docs["stub"] = Document(page_content="Conteúdo de exemplo sobre HTML5.", metadata={"title": "stub", "keywords": []})
+    LocalVectorIndex.from_documents(list(docs.values()), DeterministicFakeEmbedding(size=384)).save(directory)
+
+
+# -------------------- execução --------------------
+def _percentiles(values):
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def pick(q):
+        return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+    return {
+        "mean_ms": round(1000 * statistics.fmean(values), 3),
+        "p50_ms": round(1000 * pick(0.50), 3),
+        "p95_ms": round(1000 * pick(0.95), 3),
+        "p99_ms": round(1000 * pick(0.99), 3),
+    }
+
+
+def _replay_session(graphChat, session, latencies):
+    session_id = str(uuid.uuid4())
+    graphChat.agentic_reply(session_id=session_id)
+    for turn in session["turns"]:
+        if not turn["user_text"]:
+            continue
+        start = time.perf_counter()
+        graphChat.agentic_reply(turn["user_text"], session_id=session_id)
+        latencies.append(time.perf_counter() - start)
+    return session_id
+
+
+def run_pass(graphChat, sessions, repeat, concurrency):
+    latencies = []
+    work = [s for _ in range(repeat) for s in sessions]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda s: _replay_session(graphChat, s, latencies), work))
+    elapsed = time.perf_counter() - start
+    return latencies, elapsed, len(work)
+
+
+def _trace_summary(sessions):
+    """
+    Tamanho dos prompts gravados (com os system prompts já resolvidos), para
+    comparar com os prompts que o código atual monta.
+    """
+    sizes = [
+        sum(len(m["content"] or "") for m in prompt)
+        for session in sessions for turn in session["turns"] for prompt in turn["prompts"]
+    ]
+    return {"llm_calls": len(sizes), "prompt_chars_mean": round(statistics.fmean(sizes)) if sizes else 0}
+
+
+def stage_report():
+    from src.metrics import STAGE_SECONDS
+
+    report = {}
+    for (stage,), series in sorted(STAGE_SECONDS.series().items()):
+        if not series["count"]:
+            continue
+        report[stage] = {
+            "count": int(series["count"]),
+            "mean_ms": round(1000 * series["sum"] / series["count"], 3),
+            "p50_ms": round(1000 * (STAGE_SECONDS.quantile(0.50, stage=stage) or 0.0), 3),
+            "p95_ms": round(1000 * (STAGE_SECONDS.quantile(0.95, stage=stage) or 0.0), 3),
+        }
+    return report
+
+
+def memory_pass(graphChat, sessions, top):
+    """
+    Segunda passada sob tracemalloc: memória retida por sessão (o que fica
+    nos checkpoints, SessionStore etc.) e os pontos que mais alocam.
+    """
+    import gc
+
+    gc.collect()
+    tracemalloc.start(10)
+    before = tracemalloc.take_snapshot()
+    base_current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    latencies = []
+    for session in sessions:
+        _replay_session(graphChat, session, latencies)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    diff = after.compare_to(before, "lineno")
+    retained = current - base_current
+    return {
+        "sessions": len(sessions),
+        "retained_bytes": retained,
+        "retained_bytes_per_session": round(retained / max(len(sessions), 1)),
+        "peak_bytes": peak - base_current,
+        "allocated_blocks": sum(max(stat.count_diff, 0) for stat in diff),
+        "top_allocations": [
+            {"where": str(stat.traceback[0]), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+            for stat in diff[:top]
+        ],
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", nargs="*", default=["agent_llm_calls.txt"])
+    parser.add_argument("--questions", help="JSONL com perguntas avulsas (além do trace)")
+    parser.add_argument("--index-dir", default=os.getenv("LOCAL_INDEX_DIR", os.path.join("index", "chatbot")))
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="latência simulada por chamada ao LLM (s)")
+    parser.add_argument("--repeat", type=int, default=10, help="vezes que cada sessão gravada é reproduzida")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--memory-sessions", type=int, default=200, help="sessões na passada de memória (0 desliga)")
+    parser.add_argument("--top", type=int, default=10, help="linhas de maior alocação no relatório")
+    parser.add_argument("--router", action="store_true", help="liga o roteador local (com embeddings stub ele diverge das rotas gravadas)")
+    parser.add_argument("--output", help="grava o JSON também neste arquivo")
+    args = parser.parse_args(argv)
+
+    sessions = load_trace([p for p in args.trace if os.path.exists(p)])
+    if args.questions:
+        sessions.extend(load_questions(args.questions))
+    if not sessions:
+        parser.error("nenhum turno para reproduzir")
+
+    tmpdir = tempfile.mkdtemp(prefix="replay-bench-")
+    index_dir = args.index_dir
+    if not os.path.exists(os.path.join(index_dir, "meta.json")):
+        index_dir = os.path.join(tmpdir, "index")
+        build_trace_index(sessions, index_dir)
+
+    os.environ.update({
+        "LLM_BACKEND": "stub",
+        "EMBEDDINGS_BACKEND": "stub",
+        "VECTOR_BACKEND": "local",
+        "LOCAL_INDEX_DIR": index_dir,
+        "ANSWER_CACHE_ENABLED": "0",
+        "ANSWER_BANK_ENABLED": "0",
+        "ROUTER_ENABLED": "1" if args.router else "0",
+        "LOG_FILE": os.path.join(tmpdir, "agent_llm_calls.txt"),
+        "SESSION_MAX": str(max(10000, len(sessions) * (args.repeat + 1) + args.memory_sessions)),
+    })
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src import graphChat
+    from src.stubs import StubChatModel
+
+    # rotas e respostas gravadas: o replay percorre os mesmos caminhos do grafo
+    routes, answers = {}, {}
+    for session in sessions:
+        for turn in session["turns"]:
+            if turn["user_text"] and turn["needs_search"] is not None:
+                routes[turn["user_text"]] = "YES" if turn["needs_search"] else "NO"
+            if turn["user_text"] and turn["answer"]:
+                answers[turn["user_text"]] = turn["answer"]
+    graphChat.set_resource("llm", StubChatModel(latency=args.llm_latency, classifier_answers=routes, answers=answers))
+
+    turns_per_pass = sum(1 for s in sessions for t in s["turns"] if t["user_text"])
+    latencies, elapsed, replayed = run_pass(graphChat, sessions, args.repeat, args.concurrency)
+    report = {
+        "commit": _git_commit(),
+        "config": {
+            "sessions": len(sessions),
+            "turns_per_pass": turns_per_pass,
+            "repeat": args.repeat,
+            "concurrency": args.concurrency,
+            "llm_latency_s": args.llm_latency,
+            "index_dir": index_dir,
+        },
+        "trace": _trace_summary(sessions),
+        "end_to_end": _percentiles(latencies),
+        "throughput_turns_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "sessions_replayed": replayed,
+        "stages": stage_report(),
+    }
+    if args.memory_sessions:
+        memory_sessions = [sessions[i % len(sessions)] for i in range(args.memory_sessions)]
+        report["memory"] = memory_pass(graphChat, memory_sessions, args.top)
+
+    graphChat.logger.flush()
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
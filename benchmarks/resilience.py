@@ -0,0 +1,252 @@
+"""
+Camada resiliente do LLM (src/llm_client.py) contra um servidor local
+compatível com a API de chat da OpenAI que injeta latência e erros. O chat
+usa o ChatOpenAI de verdade (LLM_BACKEND=openai) apontado para o servidor.
+
+Fases:
+  1. baseline: --calls chamadas direto no chat model (sem retries), com
+     --error-rate de respostas 500/429 e --slow-rate de respostas lentas;
+  2. resiliente: as mesmas chamadas pelo llm_client (retries com jitter e
+     hedge no p95): p50/p95/p99, erros, hedges disparados/vencedores;
+     mais um turno por agentic_reply_stream (texto exibido = texto salvo);
+  3. queda: o servidor responde 503 em tudo; turnos por agentic_reply e
+     agentic_reply_stream devem sair degradados (trechos do material ou
+     aviso), rápidos e sem exceção, com o circuito aberto;
+  4. volta: o servidor se recupera; depois de LLM_BREAKER_RESET o circuito
+     fecha e as respostas voltam a vir do LLM.
+Sai com código 1 se alguma dessas expectativas falhar.
+
+    python -m benchmarks.resilience
+    python -m benchmarks.resilience --calls 400 --error-rate 0.2 --slow-rate 0.05 --slow-latency 3
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_REPLY = "Em HTML5 a estrutura básica começa com <!DOCTYPE html>, seguida de <html>, <head> e <body>."
+
+
+class FaultyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server = self.server
+        server.count("requests")
+        status, latency = server.fault()
+        time.sleep(latency)
+        if status != 200:
+            server.count(f"status_{status}")
+            self._json(status, {"error": {"message": "falha injetada", "type": "server_error", "code": None}})
+            return
+
+        first = str((request.get("messages") or [{}])[0].get("content", ""))
+        text = "YES" if "classificador" in first else STUB_REPLY
+        usage = {"prompt_tokens": 50, "completion_tokens": 20, "total_tokens": 70}
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": request.get("model", "stub")}
+        if not request.get("stream"):
+            self._json(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word + ("" if i == len(words) - 1 else " ")}
+            if i == 0:
+                delta["role"] = "assistant"
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        final = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self.wfile.write(f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class FaultyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency, slow_rate, slow_latency, error_rate, seed):
+        super().__init__(("127.0.0.1", 0), FaultyHandler)
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.outage = False
+        self.counts = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def fault(self):
+        with self._lock:
+            if self.outage:
+                return 503, self.latency
+            roll = self._rng.random()
+            if roll < self.error_rate:
+                return (429 if roll < self.error_rate / 2 else 500), self.latency
+            slow = self._rng.random() < self.slow_rate
+        return 200, self.slow_latency if slow else self.latency
+
+
+def _summary(latencies, errors):
+    ordered = sorted(latencies)
+
+    def q(p):
+        return round(1000 * ordered[min(len(ordered) - 1, int(p * len(ordered)))], 1) if ordered else None
+
+    return {"ok": len(ordered), "errors": errors, "p50_ms": q(0.5), "p95_ms": q(0.95), "p99_ms": q(0.99), "max_ms": q(1.0)}
+
+
+def run_calls(fn, n, concurrency):
+    def one(_):
+        start = time.perf_counter()
+        try:
+            fn()
+            return time.perf_counter() - start
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(n)))
+    return _summary([r for r in results if r is not None], sum(r is None for r in results))
+
+
+def stream_turn(graphChat, question):
+    session = f"bench-{uuid.uuid4().hex}"
+    shown = "".join(graphChat.agentic_reply_stream(question, session_id=session))
+    saved = str(graphChat.graph.get_state(graphChat._thread_config(session)).values["messages"][-1].content)
+    return shown, saved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="latência normal do servidor (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--outage-turns", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    server = FaultyServer(args.latency, args.slow_rate, args.slow_latency, args.error_rate, args.seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    tmpdir = tempfile.mkdtemp(prefix="resilience-bench-")
+    os.environ.update({
+        "LLM_BACKEND": "openai",
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{server.server_address[1]}/v1",
+        "EMBEDDINGS_BACKEND": "stub",
+        "VECTOR_BACKEND": "stub",
+        "ANSWER_CACHE_ENABLED": "0",
+        "ANSWER_BANK_ENABLED": "0",
+        "COALESCE_ENABLED": "0",
+        "LLM_DEADLINE_CLASSIFY": "3",
+        "LLM_DEADLINE_ANSWER": "5",
+        "LLM_RETRY_BACKOFF": "0.05",
+        "LLM_BREAKER_FAILURES": "5",
+        "LLM_BREAKER_RESET": "1",
+        "PROFILES_DIR": os.path.join(tmpdir, "profiles"),
+        "LOG_FILE": os.path.join(tmpdir, "agent_llm_calls.txt"),
+    })
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    from src import graphChat
+    from src.llm_client import LLM_ATTEMPTS, LLM_HEDGES
+    from src.prompt import extractive_answer_intro, unavailable_message
+
+    msgs = [SystemMessage(content="Você é uma professora."), HumanMessage(content="O que é <ol>?")]
+    llm = graphChat.get_llm()
+    checks = {}
+    report = {"server": {k: getattr(args, k) for k in ("latency", "slow_rate", "slow_latency", "error_rate")}}
+
+    # aquecimento: enche a janela de latência do hedge (p95) com chamadas bem-sucedidas
+    server.error_rate, server.slow_rate = 0.0, 0.0
+    run_calls(lambda: graphChat.llm_client.invoke("answer_direct", msgs), 40, args.concurrency)
+    server.error_rate, server.slow_rate = args.error_rate, args.slow_rate
+
+    report["baseline"] = run_calls(lambda: llm.invoke(msgs), args.calls, args.concurrency)
+    report["resilient"] = run_calls(lambda: graphChat.llm_client.invoke("answer_direct", msgs), args.calls, args.concurrency)
+    report["resilient"]["hedges_fired"] = LLM_HEDGES.value(node="answer_direct", result="fired")
+    report["resilient"]["hedges_won"] = LLM_HEDGES.value(node="answer_direct", result="won")
+    report["resilient"]["failed_attempts"] = LLM_ATTEMPTS.value(node="answer_direct", outcome="error")
+    checks["fewer_errors"] = report["resilient"]["errors"] < max(1, report["baseline"]["errors"])
+
+    shown, saved = stream_turn(graphChat, "Como faço uma lista ordenada com <ol>?")
+    checks["stream_matches_saved"] = shown == saved
+
+    server.outage = True
+    degraded, failures, latencies = 0, 0, []
+    for i in range(args.outage_turns):
+        start = time.perf_counter()
+        try:
+            text = graphChat.agentic_reply("Como faço uma tabela em HTML5?", session_id=f"bench-{uuid.uuid4().hex}")
+            degraded += text.startswith(extractive_answer_intro) or text == unavailable_message
+        except Exception as e:
+            failures += 1
+            print("Exceção na queda:", repr(e))
+        latencies.append(time.perf_counter() - start)
+    shown, saved = stream_turn(graphChat, "Como faço uma tabela em HTML5?")
+    report["outage"] = {
+        **_summary(latencies, failures),
+        "degraded": degraded,
+        "breaker": graphChat.llm_client.breaker.stats(),
+        "stream_degraded": shown.startswith(extractive_answer_intro) and shown == saved,
+    }
+    checks["outage_no_exceptions"] = failures == 0
+    checks["outage_all_degraded"] = degraded == args.outage_turns
+    checks["breaker_opened"] = report["outage"]["breaker"]["trips"] >= 1
+    checks["outage_stream_degraded"] = report["outage"]["stream_degraded"]
+
+    server.outage = False
+    server.error_rate, server.slow_rate = 0.0, 0.0
+    time.sleep(float(os.environ["LLM_BREAKER_RESET"]) + 0.2)
+    recovered = [graphChat.agentic_reply("Como faço uma tabela em HTML5?", session_id=f"bench-{uuid.uuid4().hex}") for _ in range(5)]
+    report["recovery"] = {"answers_from_llm": sum(t == STUB_REPLY for t in recovered), "breaker": graphChat.llm_client.breaker.stats()}
+    checks["recovered"] = report["recovery"]["answers_from_llm"] == len(recovered) and report["recovery"]["breaker"]["state"] == "closed"
+
+    report["server_counts"] = server.counts
+    report["checks"] = checks
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    server.shutdown()
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Recall@k, MRR e latência dos modos de busca (denso, BM25, híbrido RRF e
+híbrido + reranker) sobre o corpus do curso.
+
+As perguntas saem de resources/Exercícios.json; para cada questão:
+  - "enunciado": o texto da questão;
+  - "alternativa": só o texto da alternativa correta;
+  - "comentario": o comentário (feedback) da alternativa correta.
+Um acerto é qualquer documento da mesma questão (question_id) entre os k
+primeiros. Com --qrels arquivo.jsonl ({"question": ..., "relevant_titles": [...]})
+usa um conjunto rotulado à mão no lugar das perguntas derivadas.
+
+    python -m benchmarks.retrieval
+    python -m benchmarks.retrieval --reranker cross-encoder/mmarco-mMiniLMv2-L12-H384-v1
+    python -m benchmarks.retrieval --stub-embeddings --paths resources/Exercícios.json
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from src.hybrid_retrieval import BM25Index, CrossEncoderReranker, HybridRetriever
+from src.ingest import Ingestor, html_to_text
+from src.vector_index import LocalVectorIndex
+
+EXERCISES = os.path.join("resources", "Exercícios.json")
+
+
+def derived_questions(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    queries = []
+    for exercise in data if isinstance(data, list) else [data]:
+        for question in exercise.get("content") or []:
+            qid = str(question.get("external_questionId") or "")
+            content = question.get("content") or {}
+            queries.append({"kind": "enunciado", "query": html_to_text(content.get("html", "")), "question_id": qid})
+            for option in content.get("options") or []:
+                if not option.get("correct"):
+                    continue
+                queries.append({
+                    "kind": "alternativa",
+                    "query": html_to_text((option.get("content") or {}).get("html", "")),
+                    "question_id": qid,
+                })
+                feedback = html_to_text((option.get("feedback") or {}).get("html", ""))
+                if feedback:
+                    queries.append({"kind": "comentario", "query": feedback, "question_id": qid})
+    return [q for q in queries if q["query"]]
+
+
+def labeled_questions(path):
+    with open(path, encoding="utf-8") as f:
+        return [dict(json.loads(line), kind="rotulada") for line in f if line.strip()]
+
+
+def is_relevant(query, doc):
+    if "relevant_titles" in query:
+        return doc.metadata.get("title") in query["relevant_titles"]
+    return doc.metadata.get("question_id") == query["question_id"]
+
+
+def evaluate(rank_fn, documents, queries, ks):
+    hits = {k: 0 for k in ks}
+    reciprocal_ranks, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        ranking = rank_fn(query["query"])
+        latencies.append(time.perf_counter() - start)
+        first = next((i for i, pos in enumerate(ranking) if is_relevant(query, documents[pos])), None)
+        reciprocal_ranks.append(0.0 if first is None else 1.0 / (first + 1))
+        for k in ks:
+            hits[k] += first is not None and first < k
+    latencies.sort()
+    return {
+        **{f"recall@{k}": hits[k] / len(queries) for k in ks},
+        "mrr": statistics.mean(reciprocal_ranks),
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", nargs="*", default=["resources"])
+    parser.add_argument("--qrels", help="perguntas rotuladas (JSONL) no lugar das derivadas")
+    parser.add_argument("--reranker", help="modelo cross-encoder para o modo hybrid+rerank")
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--stub-embeddings", action="store_true", help="embeddings falsos (só o BM25 é significativo)")
+    args = parser.parse_args(argv)
+
+    from src.indexing import iter_source_files
+    from src.ingest import supported_extensions
+
+    ingestor = Ingestor()
+    documents = [d for f in iter_source_files(args.paths, supported_extensions()) for d in ingestor.load(f) or []]
+
+    if args.stub_embeddings:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+
+        embeddings = DeterministicFakeEmbedding(size=384)
+    else:
+        from src.helper import downloald_hugging_face_embeddings
+
+        embeddings = downloald_hugging_face_embeddings()
+
+    index = LocalVectorIndex.from_documents(documents, embeddings)
+    lexical = BM25Index(documents)
+    queries = labeled_questions(args.qrels) if args.qrels else derived_questions(EXERCISES)
+    ks = (1, 2, 5, 10)
+    depth = max(ks)
+
+    hybrid = HybridRetriever(index=index, lexical=lexical, embeddings=embeddings, k=depth, candidates=args.candidates)
+    modes = {
+        "dense": lambda q: [p for p, _ in index.search(embeddings.embed_query(q), k=depth)],
+        "bm25": lambda q: [p for p, _ in lexical.search(q, k=depth)],
+        "hybrid": hybrid.rank,
+    }
+    if args.reranker:
+        reranked = hybrid.model_copy(update={"reranker": CrossEncoderReranker(args.reranker)})
+        modes["hybrid+rerank"] = reranked.rank
+
+    report = {"documents": len(documents), "queries": len(queries), "loaders": ingestor.report()}
+    for kind in sorted({q["kind"] for q in queries}) + ["todas"]:
+        subset = queries if kind == "todas" else [q for q in queries if q["kind"] == kind]
+        report[kind] = {name: evaluate(fn, documents, subset, ks) for name, fn in modes.items()}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Mede o custo de subir um worker: tempo de `import src.graphChat`, do
+warm_up() e da primeira resposta, cada execução num processo Python novo
+(sem cache de módulos).
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --real     # backends configurados no .env
+
+Por padrão usa LLM, embeddings e retriever stub (sem rede); com --real o
+número inclui o carregamento do modelo de embeddings e a conexão ao índice.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = r"""
+import json, time, uuid
+t0 = time.perf_counter()
+import src.graphChat as graphChat
+t1 = time.perf_counter()
+if WARM:
+    graphChat.warm_up()
+t2 = time.perf_counter()
+session = str(uuid.uuid4())
+graphChat.agentic_reply(session_id=session)
+graphChat.agentic_reply("O que é uma fração?", session_id=session)
+t3 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "warm_up_s": t2 - t1, "first_reply_s": t3 - t2}))
+"""
+
+STUB_ENV = {
+    "LLM_BACKEND": "stub",
+    "EMBEDDINGS_BACKEND": "stub",
+    "VECTOR_BACKEND": "stub",
+    "STUB_LLM_LATENCY": "0",
+    "ANSWER_CACHE_ENABLED": "0",
+}
+
+
+def _run_child(warm: bool, env: dict) -> dict:
+    code = f"WARM = {warm!r}\n" + CHILD
+    out = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _summary(samples, key):
+    values = [s[key] for s in samples]
+    return {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--real", action="store_true", help="usa os backends do ambiente em vez dos stubs")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    if not args.real:
+        env.update(STUB_ENV)
+    # os turnos dos processos filhos não vão para o trace versionado nem para data/profiles
+    tmpdir = tempfile.mkdtemp(prefix="startup-bench-")
+    env["LOG_FILE"] = os.path.join(tmpdir, "agent_llm_calls.txt")
+    env["PROFILES_DIR"] = os.path.join(tmpdir, "profiles")
+
+    report = {}
+    for label, warm in (("lazy", False), ("warm_up", True)):
+        samples = [_run_child(warm, env) for _ in range(args.runs)]
+        report[label] = {key: _summary(samples, key) for key in ("import_s", "warm_up_s", "first_reply_s")}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Gera offline o banco de respostas pré-computadas (src/answer_bank.py): uma
+explicação canônica por seção, por keyword e por questão dos exercícios,
+com o mesmo prompt do primeiro turno ao vivo.
+
+    python precompute_answers.py                   # fontes de SOURCE_PATHS (padrão: resources/)
+    python precompute_answers.py resources/ --concurrency 8
+    python precompute_answers.py --dry-run         # só conta o que falta gerar
+    python precompute_answers.py --course logica   # curso do catálogo (src/courses.py)
+
+Cada resposta é gravada assim que fica pronta: depois de uma falha (ou
+Ctrl-C) basta rodar de novo, só as pendentes são geradas. Entradas de
+fontes removidas ou alteradas são apagadas no fim (só debaixo dos
+caminhos lidos; arquivos que falharam ao carregar mantêm as entradas). O banco fica no
+answer_bank_path do curso (curso padrão: ANSWER_BANK_PATH) e é usado por
+agentic_reply no primeiro turno.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+from src.answer_bank import AnswerBank, bank_items, bank_messages
+from src.indexing import iter_source_files, source_key, under_roots
+from src.ingest import Ingestor, supported_extensions
+
+load_dotenv()
+
+# chamadas simultâneas ao LLM (limite de taxa do provedor)
+ANSWER_BANK_CONCURRENCY = int(os.getenv("ANSWER_BANK_CONCURRENCY", "4"))
+ANSWER_BANK_RETRIES = int(os.getenv("ANSWER_BANK_RETRIES", "2"))
+PROGRESS_EVERY = 25
+
+
+def generate(llm, course, item, retries: int = ANSWER_BANK_RETRIES, backoff: float = 2.0) -> str:
+    messages = bank_messages(item, course.system_prompt, course.welcome_message)
+    for attempt in range(retries + 1):
+        try:
+            return str(llm.invoke(messages).content)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="arquivos ou diretórios (padrão: fontes do curso)")
+    parser.add_argument("--course", help="id do curso no catálogo (padrão: curso padrão)")
+    parser.add_argument("--concurrency", type=int, default=ANSWER_BANK_CONCURRENCY)
+    parser.add_argument("--limit", type=int, help="gera no máximo N respostas nesta execução")
+    parser.add_argument("--keep-stale", action="store_true", help="não apaga entradas de fontes removidas")
+    parser.add_argument("--dry-run", action="store_true", help="mostra o plano sem gerar nada")
+    args = parser.parse_args(argv)
+
+    # os recursos (LLM, embedder) são os mesmos do chat, com os mesmos backends
+    from src import graphChat
+
+    course = graphChat.courses.get(args.course)
+    start = time.perf_counter()
+    ingestor = Ingestor()
+    roots = args.paths or course.sources
+    extensions = supported_extensions()
+    documents, failed = [], set()
+    for f in iter_source_files(roots, extensions):
+        docs = ingestor.load(f)
+        if docs is None:
+            failed.add(f)
+        documents.extend(docs or [])
+    items = list({item["id"]: item for item in bank_items(documents)}.values())
+
+    bank = AnswerBank(course.answer_bank_path, graphChat.embedding_model_name())
+    done = bank.done_ids()
+    pending = [item for item in items if item["id"] not in done]
+    print(json.dumps({"items": len(items), "done": len(items) - len(pending), "pending": len(pending)}))
+    pending = pending[:args.limit]
+    if args.dry_run:
+        return
+
+    failures = []
+    generated = 0
+    if pending:
+        vectors = graphChat.get_embeddings().embed_documents([item["question"] for item in pending])
+        llm = graphChat.get_llm()
+        pool = ThreadPoolExecutor(max_workers=max(1, args.concurrency), thread_name_prefix="answer-bank")
+        futures = {pool.submit(generate, llm, course, item): (item, vector) for item, vector in zip(pending, vectors)}
+        try:
+            for future in as_completed(futures):
+                item, vector = futures[future]
+                try:
+                    answer = future.result()
+                except Exception as e:
+                    failures.append({"id": item["id"], "question": item["question"][:80], "error": repr(e)})
+                    continue
+                bank.put(item, answer, vector)
+                generated += 1
+                if generated % PROGRESS_EVERY == 0:
+                    print(f"{generated}/{len(pending)} respostas geradas...")
+        except KeyboardInterrupt:
+            print(f"Interrompido: {generated} respostas gravadas; rode de novo para continuar.")
+            pool.shutdown(wait=False, cancel_futures=True)
+            sys.exit(130)
+        pool.shutdown()
+
+    def in_scope(source: str) -> bool:
+        # fontes fora dos caminhos lidos (ou que falharam agora) não perdem as respostas
+        return (
+            source.lower().endswith(extensions) and source_key(source) not in failed and under_roots(source, roots)
+        )
+
+    removed = 0 if args.keep_stale else bank.retain((item["id"] for item in items), in_scope=in_scope)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "generated": generated,
+        "failed": len(failures),
+        "removed": removed,
+        "bank_size": len(bank),
+        "elapsed_s": round(elapsed, 1),
+        "answers_per_min": round(60 * generated / elapsed, 1) if elapsed else 0.0,
+    }))
+    bank.close()
+    if failures:
+        print(json.dumps(failures[:10], ensure_ascii=False, indent=1))
+        print(f"{len(failures)} falhas; rode de novo para gerar só as pendentes.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
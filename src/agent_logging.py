@@ -1,33 +1,68 @@
 # src/agent_logging.py
+import atexit
+import contextvars
+import gzip
+import hashlib
 import json
 import os
+import queue
 import threading
-from collections import defaultdict
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Sequence
 
 from langchain_core.messages import BaseMessage
 
+# sessão do chat (session_id da página) associada à requisição/tarefa atual
+_current_session: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("agent_session_id", default=None)
+
 class AgentLogger:
     """
     Logger thread-safe para fluxos LangGraph: turnos, nós, chamadas LLM e retrieve.
+
+    As threads de requisição só enfileiram o evento; uma thread de escrita em
+    background serializa e grava em lotes por um único arquivo aberto, com
+    rotação por tamanho e saída gzip opcional. System prompts são gravados uma
+    vez (registro "prompt" com o hash) e referenciados por "prompt_ref".
+
+    Variáveis de ambiente: LOG_FILE, LOG_QUEUE_SIZE, LOG_BATCH_SIZE,
+    LOG_FLUSH_INTERVAL, LOG_MAX_BYTES (0 = sem rotação), LOG_BACKUPS,
+    LOG_COMPRESS (1 = gzip) e LOG_ON_FULL ("drop" ou "block").
     """
 
     def __init__(self, log_file: Optional[str] = None) -> None:
         self.LOG_FILE = log_file or os.getenv("LOG_FILE", "agent_llm_calls.txt")
         self._log_lock = threading.Lock()
-        self._turn_counters = defaultdict(int)  # por sessão/thread
+
+        self.batch_size = int(os.getenv("LOG_BATCH_SIZE", "256"))
+        self.flush_interval = float(os.getenv("LOG_FLUSH_INTERVAL", "0.5"))
+        self.max_bytes = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+        self.backups = int(os.getenv("LOG_BACKUPS", "5"))
+        self.compress = os.getenv("LOG_COMPRESS", "0") == "1"
+        self.block_when_full = os.getenv("LOG_ON_FULL", "drop").lower() == "block"
+        if self.compress and not self.LOG_FILE.endswith(".gz"):
+            self.LOG_FILE += ".gz"
+
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        self._file = None
+        self._bytes_written = 0
+        self._prompt_hashes = set()  # prompts já gravados no arquivo atual
+        self._writer = threading.Thread(target=self._writer_loop, name="agent-logger", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
 
     # ---------- utilitários internos ----------
-    def _session_id(self) -> str:
-        # usa thread id como "sessão" para alinhar com RunnableConfig(thread_id)
-        return str(threading.get_ident())
+    @staticmethod
+    def bind_session(session_id: str) -> None:
+        """
+        Associa os próximos eventos do contexto atual (thread ou tarefa asyncio)
+        à sessão informada; o mesmo valor é usado como thread_id do LangGraph.
+        """
+        _current_session.set(session_id)
 
-    def next_turn(self) -> int:
-        sid = self._session_id()
-        with self._log_lock:
-            self._turn_counters[sid] += 1
-            return self._turn_counters[sid]
+    def _session_id(self) -> str:
+        # sem sessão associada, usa o thread id (compatível com o CLI)
+        return _current_session.get() or str(threading.get_ident())
 
     @staticmethod
     def _now_iso() -> str:
@@ -49,10 +84,127 @@ class AgentLogger:
             "ts": self._now_iso(),
             "session_id": self._session_id(),
         }
-        line = json.dumps({**event_base, **event}, ensure_ascii=False)
-        with self._log_lock:
-            with open(self.LOG_FILE, "a", encoding="utf-8") as f:
-                f.write(line + "\n")
+        record = {**event_base, **event}
+        if self.block_when_full:
+            self._queue.put(record)
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._log_lock:
+                self.dropped += 1
+
+    # ---------- thread de escrita ----------
+    def _open(self) -> None:
+        if self.compress:
+            self._file = gzip.open(self.LOG_FILE, "at", encoding="utf-8")
+        else:
+            self._file = open(self.LOG_FILE, "a", encoding="utf-8")
+        self._bytes_written = os.path.getsize(self.LOG_FILE) if os.path.exists(self.LOG_FILE) else 0
+        self._prompt_hashes = set()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        if self.backups > 0:
+            for i in range(self.backups - 1, 0, -1):
+                src = f"{self.LOG_FILE}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.LOG_FILE}.{i + 1}")
+            os.replace(self.LOG_FILE, f"{self.LOG_FILE}.1")
+        else:
+            os.remove(self.LOG_FILE)
+        self._open()
+
+    def _serialize(self, record: Dict[str, Any]) -> List[str]:
+        """
+        Converte o evento em linha(s) JSON. As mensagens do llm_call chegam
+        como objetos e são serializadas aqui, fora da thread da requisição.
+        """
+        lines: List[str] = []
+        messages_in = record.pop("_messages_in", None)
+        if messages_in is not None:
+            prompt_messages = []
+            for m in self.safe_serialize_messages(messages_in):
+                if m["role"] == "system":
+                    digest = hashlib.sha1(m["content"].encode("utf-8")).hexdigest()[:16]
+                    if digest not in self._prompt_hashes:
+                        self._prompt_hashes.add(digest)
+                        lines.append(json.dumps(
+                            {"ts": record["ts"], "type": "prompt", "hash": digest, "content": m["content"]},
+                            ensure_ascii=False,
+                        ))
+                    m = {"role": "system", "prompt_ref": digest}
+                prompt_messages.append(m)
+            record["prompt_messages"] = prompt_messages
+        message_out = record.pop("_message_out", None)
+        if message_out is not None:
+            record["response_message"] = {
+                "role": getattr(message_out, "type", "ai"),
+                "content": str(getattr(message_out, "content", "")),
+            }
+            # tokens de prompt/resposta/cache informados pelo provedor
+            usage = getattr(message_out, "usage_metadata", None)
+            if usage:
+                record["usage"] = dict(usage)
+        lines.append(json.dumps(record, ensure_ascii=False, default=str))
+        return lines
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        if self._file is None:
+            self._open()
+        lines: List[str] = []
+        for record in batch:
+            lines.extend(self._serialize(record))
+        data = "\n".join(lines) + "\n"
+        self._file.write(data)
+        self._file.flush()
+        self._bytes_written += len(data.encode("utf-8"))
+        if self.max_bytes and self._bytes_written >= self.max_bytes:
+            self._rotate()
+
+    def _writer_loop(self) -> None:
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch, stop = [], first is None
+            if first is not None:
+                batch.append(first)
+            while len(batch) < self.batch_size and not stop:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                else:
+                    batch.append(record)
+            try:
+                if batch:
+                    self._write_batch(batch)
+            except Exception as e:
+                print("Erro ao gravar log do agente:", e)
+            finally:
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self._queue.task_done()
+            if stop:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def flush(self) -> None:
+        """
+        Bloqueia até todos os eventos enfileirados estarem gravados.
+        """
+        self._queue.join()
+
+    def close(self) -> None:
+        if not self._writer.is_alive():
+            return
+        self._queue.put(None)
+        self._writer.join(timeout=5)
 
     def log_turn_start(self, turn_id: int, user_text: str) -> None:
         self._append_log({"type": "turn_start", "turn_id": turn_id, "user_text": user_text})
@@ -66,8 +218,44 @@ class AgentLogger:
     def log_node_exit(self, turn_id: int, node_name: str, result_snapshot: Dict[str, Any]) -> None:
         self._append_log({"type": "node_exit", "turn_id": turn_id, "node": node_name, "result": result_snapshot})
 
-    def log_route_decision(self, turn_id: int, needs_search: bool) -> None:
-        self._append_log({"type": "route_decision", "turn_id": turn_id, "needs_search": needs_search})
+    def log_route_decision(
+        self, turn_id: int, needs_search: bool, source: str = "llm", score: Optional[float] = None
+    ) -> None:
+        event = {"type": "route_decision", "turn_id": turn_id, "needs_search": needs_search, "source": source}
+        if score is not None:
+            event["router_score"] = round(score, 4)
+        self._append_log(event)
+
+    def log_speculation(
+        self,
+        turn_id: int,
+        used: bool,
+        classify_ms: float,
+        retrieve_ms: float,
+        saved_ms: float,
+        wasted_ms: float,
+    ) -> None:
+        self._append_log({
+            "type": "speculation",
+            "turn_id": turn_id,
+            "used": used,
+            "classify_ms": round(classify_ms, 2),
+            "retrieve_ms": round(retrieve_ms, 2),
+            "saved_ms": round(saved_ms, 2),
+            "wasted_ms": round(wasted_ms, 2),
+        })
+
+    def log_answer_cache(self, turn_id: int, hit: bool, similarity: float) -> None:
+        self._append_log({"type": "answer_cache", "turn_id": turn_id, "hit": hit, "similarity": round(similarity, 4)})
+
+    def log_answer_bank(self, turn_id: int, hit: bool, similarity: float) -> None:
+        self._append_log({"type": "answer_bank", "turn_id": turn_id, "hit": hit, "similarity": round(similarity, 4)})
+
+    def log_degraded(self, turn_id: int, node_name: str, reason: str, answer_source: str) -> None:
+        # LLM indisponível (src/llm_client.py): de onde saiu a resposta do nó
+        self._append_log({
+            "type": "llm_degraded", "turn_id": turn_id, "node": node_name, "reason": reason, "answer_source": answer_source,
+        })
 
     def log_llm_call(
         self,
@@ -76,15 +264,13 @@ class AgentLogger:
         messages_in: Sequence[BaseMessage],
         message_out: BaseMessage,
     ) -> None:
+        # serializado na thread de escrita (ver _serialize)
         self._append_log({
             "type": "llm_call",
             "turn_id": turn_id,
             "node": node_name,
-            "prompt_messages": self.safe_serialize_messages(messages_in),
-            "response_message": {
-                "role": getattr(message_out, "type", "ai"),
-                "content": str(getattr(message_out, "content", "")),
-            },
+            "_messages_in": list(messages_in),
+            "_message_out": message_out,
         })
 
     def log_retrieve(self, turn_id: int, query: str, docs) -> None:
@@ -0,0 +1,227 @@
+# src/answer_bank.py
+"""
+Banco de respostas pré-computadas (gerado offline por precompute_answers.py).
+
+Cada entrada é uma explicação canônica para uma pergunta típica do aluno:
+  - "section": "Explique <título>" com o texto da seção;
+  - "keyword": "O que é <keyword>?" com o texto da seção em que ela aparece;
+  - "exercise": o enunciado de uma questão com as alternativas e comentários.
+As entradas ficam num SQLite (texto + embedding da pergunta em float32) e
+são carregadas numa matriz NumPy para a busca por similaridade de cosseno.
+O id depende do tipo, da pergunta e do contexto, então uma fonte alterada
+gera uma entrada nova e a geração pode ser retomada de onde parou.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from src.prompt import context_prompt, general_system_prompt, welcome_message
+
+
+def _item_id(kind: str, question: str, context: str) -> str:
+    h = hashlib.sha256()
+    for part in (kind, question, context):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:32]
+
+
+def _item(kind: str, question: str, context: str, source: str) -> Dict[str, str]:
+    return {"id": _item_id(kind, question, context), "kind": kind, "question": question, "context": context, "source": source}
+
+
+def bank_items(documents: Iterable[Document]) -> List[Dict[str, str]]:
+    """
+    Perguntas canônicas a partir dos documentos do src.ingest: uma por seção,
+    uma por keyword (a primeira seção que a cita) e uma por questão de
+    exercício (enunciado + todas as alternativas como contexto).
+    """
+    items: List[Dict[str, str]] = []
+    seen_keywords: Set[str] = set()
+    questions: Dict[str, Document] = {}
+    options: Dict[str, List[Document]] = defaultdict(list)
+
+    for doc in documents:
+        meta = doc.metadata or {}
+        kind = meta.get("type")
+        if kind == "exercise_question":
+            questions[meta.get("question_id", "")] = doc
+            continue
+        if kind == "exercise_option":
+            options[meta.get("question_id", "")].append(doc)
+            continue
+
+        title = str(meta.get("title", "")).strip()
+        source = str(meta.get("source", ""))
+        if title:
+            items.append(_item("section", f"Explique {title}", doc.page_content, source))
+        for keyword in meta.get("keywords") or []:
+            keyword = str(keyword).strip()
+            if not keyword or keyword == title or keyword.casefold() in seen_keywords:
+                continue
+            seen_keywords.add(keyword.casefold())
+            items.append(_item("keyword", f"O que é {keyword}?", doc.page_content, source))
+
+    for question_id, doc in questions.items():
+        # o enunciado sem o título "<exercício> — Questão n" é o que o aluno colaria no chat
+        statement = doc.page_content.split("\n\n", 1)[-1]
+        context = "\n\n".join([doc.page_content] + [o.page_content for o in options.get(question_id, [])])
+        items.append(_item("exercise", statement, context, str(doc.metadata.get("source", ""))))
+    return items
+
+
+def bank_messages(
+    item: Dict[str, str], system_prompt: str = general_system_prompt, welcome: str = welcome_message
+) -> List[BaseMessage]:
+    """
+    Mesmo prompt do primeiro turno ao vivo (answer_with_context): a resposta
+    do banco é a que o aluno receberia do grafo. Os prompts são os do curso.
+    """
+    return [
+        SystemMessage(content=system_prompt),
+        AIMessage(content=welcome),
+        HumanMessage(content=item["question"]),
+        SystemMessage(content=context_prompt.format(context=item["context"])),
+    ]
+
+
+class AnswerBank:
+    """
+    Armazenamento (SQLite) e busca das respostas pré-computadas.
+
+    lookup() carrega as entradas numa matriz de vetores unitários na primeira
+    chamada; hit quando o cosseno com a pergunta for >= threshold.
+    """
+
+    def __init__(self, path: str, embedding_model: str, threshold: float = 0.92) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answers (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                source TEXT NOT NULL,
+                embedding_model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._answers: List[str] = []
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm else v
+
+    def done_ids(self) -> Set[str]:
+        """
+        Ids já gerados com o modelo de embeddings atual (para retomar a geração).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM answers WHERE embedding_model = ?", (self.embedding_model,)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def put(self, item: Dict[str, str], answer: str, vector: Sequence[float]) -> None:
+        row = (
+            item["id"], item["kind"], item["question"], answer, item.get("source", ""),
+            self.embedding_model, self._unit(vector).tobytes(), time.time(),
+        )
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+            self._matrix = None
+
+    def retain(self, ids: Iterable[str], in_scope: Optional[Callable[[str], bool]] = None) -> int:
+        """
+        Apaga as entradas fora de ids (fontes removidas/alteradas, outro modelo).
+        in_scope(source) limita a limpeza às fontes que a execução leu (None: todas);
+        entradas de outro modelo de embeddings saem de qualquer forma.
+        """
+        keep = set(ids)
+        with self._lock:
+            stale = [
+                row[0] for row in self._conn.execute("SELECT id, embedding_model, source FROM answers").fetchall()
+                if row[1] != self.embedding_model or (row[0] not in keep and (in_scope is None or in_scope(row[2])))
+            ]
+            self._conn.execute("BEGIN")
+            self._conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in stale])
+            self._conn.execute("COMMIT")
+            self._matrix = None
+        return len(stale)
+
+    def _load(self) -> None:
+        rows = self._conn.execute(
+            "SELECT answer, vector FROM answers WHERE embedding_model = ?", (self.embedding_model,)
+        ).fetchall()
+        self._answers = [answer for answer, _ in rows]
+        if rows:
+            self._matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+        else:
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._matrix is None:
+                self._load()
+            return len(self._answers)
+
+    def lookup(
+        self, query_vector: Sequence[float], threshold: Optional[float] = None, count: bool = True
+    ) -> Tuple[Optional[str], float]:
+        """
+        Retorna (resposta, similaridade) do melhor candidato; resposta é None em caso de miss.
+        threshold substitui o do banco (respostas degradadas aceitam menos similaridade);
+        count=False não mexe em hits/misses (consulta de fallback, fora da taxa de acerto).
+        """
+        q = self._unit(query_vector)
+        with self._lock:
+            if self._matrix is None:
+                self._load()
+            if not self._answers:
+                self.misses += count
+                return None, 0.0
+            scores = self._matrix @ q
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity < (self.threshold if threshold is None else threshold):
+                self.misses += count
+                return None, similarity
+            self.hits += count
+            return self._answers[best], similarity
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._answers),
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,95 @@
+# src/answer_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Cache de respostas indexado pelo embedding da pergunta.
+
+    - Hit quando a similaridade de cosseno com uma pergunta já respondida
+      for >= threshold e a entrada tiver o mesmo fingerprint de índice
+      (respostas antigas caem sozinhas quando o índice é reconstruído).
+    - Despejo LRU (max_entries) + expiração por TTL (ttl_seconds).
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 512, ttl_seconds: float = 3600.0) -> None:
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm else v
+
+    def _evict_expired(self, now: float) -> None:
+        expired = [k for k, e in self._entries.items() if now - e["created_at"] > self.ttl_seconds]
+        for k in expired:
+            del self._entries[k]
+
+    def lookup(
+        self, query_vector: Sequence[float], fingerprint: str, threshold: Optional[float] = None, count: bool = True
+    ) -> Tuple[Optional[str], float]:
+        """
+        Retorna (resposta, similaridade) do melhor candidato; resposta é None em caso de miss.
+        threshold substitui o do cache (respostas degradadas aceitam menos similaridade);
+        count=False não mexe em hits/misses (consulta de fallback, fora da taxa de acerto).
+        """
+        q = self._unit(query_vector)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            candidates = [(k, e) for k, e in self._entries.items() if e["fingerprint"] == fingerprint]
+            if not candidates:
+                self.misses += count
+                return None, 0.0
+
+            matrix = np.stack([e["vector"] for _, e in candidates])
+            scores = matrix @ q
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity < (self.threshold if threshold is None else threshold):
+                self.misses += count
+                return None, similarity
+
+            key, entry = candidates[best]
+            self._entries.move_to_end(key)
+            self.hits += count
+            return entry["answer"], similarity
+
+    def store(self, query_vector: Sequence[float], answer: str, fingerprint: str) -> None:
+        with self._lock:
+            self._entries[self._next_key] = {
+                "vector": self._unit(query_vector),
+                "answer": answer,
+                "fingerprint": fingerprint,
+                "created_at": time.monotonic(),
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
@@ -0,0 +1,246 @@
+# src/checkpoint_store.py
+import os
+import sqlite3
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+
+
+class SQLiteLatestSaver(BaseCheckpointSaver):
+    """
+    Checkpointer LangGraph em SQLite que guarda só o checkpoint mais recente
+    de cada thread (sessão). Sobrevive a reinícios do processo e o arquivo
+    cresce com o número de sessões, não com o número de turnos.
+
+    O histórico de versões (time travel / get_state_history) não é mantido.
+    Os métodos assíncronos reutilizam os síncronos: cada operação é uma
+    escrita local curta no SQLite.
+    """
+
+    def __init__(self, path: str, serde=None) -> None:
+        super().__init__(serde=serde)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                checkpoint_type TEXT NOT NULL,
+                checkpoint BLOB NOT NULL,
+                metadata_type TEXT NOT NULL,
+                metadata BLOB NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns)
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                task_path TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                value_type TEXT NOT NULL,
+                value BLOB NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            )
+            """
+        )
+        self._lock = threading.Lock()
+
+    # ---------- leitura ----------
+    def _pending_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str):
+        rows = self._conn.execute(
+            "SELECT task_id, channel, value_type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return [(task_id, channel, self.serde.loads_typed((vtype, value))) for task_id, channel, vtype, value in rows]
+
+    def _to_tuple(self, row: Tuple[Any, ...]) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, ctype, cblob, mtype, mblob = row
+        parent_config = None
+        if parent_id:
+            parent_config = {
+                "configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}
+            }
+        return CheckpointTuple(
+            config={
+                "configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}
+            },
+            checkpoint=self.serde.loads_typed((ctype, cblob)),
+            metadata=self.serde.loads_typed((mtype, mblob)),
+            parent_config=parent_config,
+            pending_writes=self._pending_writes(thread_id, checkpoint_ns, checkpoint_id),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        thread_id = str(configurable["thread_id"])
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        wanted_id = get_checkpoint_id(config)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint_type, "
+                "checkpoint, metadata_type, metadata FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?",
+                (thread_id, checkpoint_ns),
+            ).fetchone()
+            if row is None or (wanted_id and row[2] != wanted_id):
+                return None
+            return self._to_tuple(row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint_type, "
+            "checkpoint, metadata_type, metadata FROM checkpoints"
+        )
+        params: Tuple[Any, ...] = ()
+        if config is not None:
+            query += " WHERE thread_id = ?"
+            params = (str(config["configurable"]["thread_id"]),)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            tuples = [self._to_tuple(row) for row in rows]
+
+        before_id = get_checkpoint_id(before) if before else None
+        count = 0
+        for tup in tuples:
+            if before_id and tup.config["configurable"]["checkpoint_id"] >= before_id:
+                continue
+            if filter and not all(tup.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None and count >= limit:
+                return
+            count += 1
+            yield tup
+
+    # ---------- escrita ----------
+    def _transaction(self, statements: Sequence[Tuple[str, Tuple[Any, ...]]]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for sql, params in statements:
+                    self._conn.execute(sql, params)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        configurable = config["configurable"]
+        thread_id = str(configurable["thread_id"])
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        parent_id = configurable.get("checkpoint_id")
+        ctype, cblob = self.serde.dumps_typed(checkpoint)
+        mtype, mblob = self.serde.dumps_typed(dict(metadata))
+        self._transaction([
+            (
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], parent_id, ctype, cblob, mtype, mblob),
+            ),
+            # writes pendentes de checkpoints anteriores não servem mais
+            (
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+                (thread_id, checkpoint_ns, checkpoint["id"]),
+            ),
+        ])
+        return {
+            "configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        configurable = config["configurable"]
+        thread_id = str(configurable["thread_id"])
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        checkpoint_id = configurable["checkpoint_id"]
+        # canais especiais (erro, interrupção) sobrescrevem; os demais só entram uma vez
+        verb = "INSERT OR REPLACE" if all(w[0] in WRITES_IDX_MAP for w in writes) else "INSERT OR IGNORE"
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            vtype, vblob = self.serde.dumps_typed(value)
+            rows.append((
+                thread_id, checkpoint_ns, checkpoint_id, task_id, task_path,
+                WRITES_IDX_MAP.get(channel, idx), channel, vtype, vblob,
+            ))
+        with self._lock:
+            self._conn.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._transaction([
+            ("DELETE FROM checkpoints WHERE thread_id = ?", (str(thread_id),)),
+            ("DELETE FROM writes WHERE thread_id = ?", (str(thread_id),)),
+        ])
+
+    # ---------- versões assíncronas ----------
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        for tup in self.list(config, filter=filter, before=before, limit=limit):
+            yield tup
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
@@ -0,0 +1,315 @@
+# src/courses.py
+"""
+Catálogo de cursos: um processo atende vários cursos, cada um com seus
+prompts, seu índice (diretório local e/ou namespace no Pinecone) e seus
+parâmetros de busca. O LLM e o modelo de embeddings são compartilhados
+(ficam em graphChat); o que é do curso (retriever, roteador, banco de
+respostas) é carregado no primeiro uso pelo CourseRegistry e descartado
+quando o curso fica ocioso.
+
+COURSES_FILE (padrão: courses.json) no formato:
+
+    {
+      "default": "php-html5",
+      "courses": [
+        {"id": "php-html5", "name": "Desenvolvimento de Sistemas PHP"},
+        {"id": "logica", "name": "Lógica de Programação",
+         "system_prompt_file": "prompts/logica/system.md",
+         "classifier_prompt_file": "prompts/logica/classifier.md",
+         "welcome_message": "Olá! ...", "sources": ["resources/logica"],
+         "retrieve_k": 3}
+      ]
+    }
+
+Campos omitidos herdam do curso padrão (prompts de src/prompt.py e as
+variáveis de ambiente de sempre), exceto o índice: index_dir vira
+index/<id>, pinecone_namespace vira <id> e o banco de respostas fica em
+index/<id>/answer_bank.sqlite. Sem o arquivo, existe só o curso padrão,
+com o comportamento de antes.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.prompt import classifier_prompt, general_system_prompt, off_topic_examples, welcome_message
+from src.singleflight import SingleFlight
+
+COURSES_FILE = os.getenv("COURSES_FILE", "courses.json")
+
+_PROMPT_FIELDS = ("system_prompt", "classifier_prompt", "welcome_message")
+_COURSE_FIELDS = (
+    "name",
+    "system_prompt",
+    "classifier_prompt",
+    "welcome_message",
+    "off_topic_examples",
+    "sources",
+    "index_dir",
+    "pinecone_index",
+    "pinecone_namespace",
+    "retrieve_k",
+    "retriever_mode",
+    "candidates",
+    "reranker_model",
+    "rerank_top_n",
+    "answer_bank_path",
+)
+
+
+class Course:
+    """
+    Configuração de um curso (imutável depois de carregada).
+    """
+
+    def __init__(
+        self,
+        course_id: str,
+        name: str = "",
+        system_prompt: str = general_system_prompt,
+        classifier_prompt: str = classifier_prompt,
+        welcome_message: str = welcome_message,
+        off_topic_examples: List[str] = off_topic_examples,
+        sources: Optional[List[str]] = None,
+        index_dir: Optional[str] = None,
+        pinecone_index: str = "chatbot",
+        pinecone_namespace: Optional[str] = None,
+        retrieve_k: int = 2,
+        retriever_mode: str = "hybrid",
+        candidates: int = 20,
+        reranker_model: Optional[str] = None,
+        rerank_top_n: int = 10,
+        answer_bank_path: Optional[str] = None,
+    ) -> None:
+        self.course_id = course_id
+        self.name = name or course_id
+        self.system_prompt = system_prompt
+        self.classifier_prompt = classifier_prompt
+        self.welcome_message = welcome_message
+        self.off_topic_examples = list(off_topic_examples)
+        self.sources = list(sources or [os.path.join("resources", course_id)])
+        self.index_dir = index_dir or os.path.join("index", course_id)
+        self.pinecone_index = pinecone_index
+        self.pinecone_namespace = pinecone_namespace
+        self.retrieve_k = int(retrieve_k)
+        self.retriever_mode = retriever_mode.lower()
+        self.candidates = int(candidates)
+        self.reranker_model = reranker_model or None
+        self.rerank_top_n = int(rerank_top_n)
+        self.answer_bank_path = answer_bank_path or os.path.join(self.index_dir, "answer_bank.sqlite")
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], base: "Course", base_dir: str = ".") -> "Course":
+        """
+        Curso do catálogo; prompts podem vir no próprio JSON ou em "<campo>_file"
+        (caminho relativo ao catálogo). O resto herda de base, menos o índice.
+        """
+        course_id = str(data["id"])
+        values = {field: getattr(base, field) for field in _COURSE_FIELDS}
+        values.update(name=course_id, sources=None, index_dir=None, pinecone_namespace=course_id, answer_bank_path=None)
+        for field in _PROMPT_FIELDS:
+            path = data.get(f"{field}_file")
+            if path:
+                with open(os.path.join(base_dir, path), encoding="utf-8") as f:
+                    values[field] = f.read()
+        values.update({field: data[field] for field in _COURSE_FIELDS if field in data})
+        return cls(course_id, **values)
+
+
+def default_course() -> Course:
+    """
+    O curso de sempre, configurado pelas variáveis de ambiente do chat.
+    """
+    index_name = os.getenv("PINECONE_INDEX_NAME", "chatbot")
+    return Course(
+        os.getenv("DEFAULT_COURSE", "default"),
+        name="Desenvolvimento de Sistemas PHP",
+        sources=os.getenv("SOURCE_PATHS", "resources").split(os.pathsep),
+        index_dir=os.getenv("LOCAL_INDEX_DIR", os.path.join("index", index_name)),
+        pinecone_index=index_name,
+        retriever_mode=os.getenv("RETRIEVER_MODE", "hybrid"),
+        candidates=int(os.getenv("RETRIEVE_CANDIDATES", "20")),
+        reranker_model=os.getenv("RERANKER_MODEL") or None,
+        rerank_top_n=int(os.getenv("RERANK_TOP_N", "10")),
+        answer_bank_path=os.getenv("ANSWER_BANK_PATH", os.path.join("index", "answer_bank.sqlite")),
+    )
+
+
+def load_courses(path: str = COURSES_FILE) -> Tuple[Dict[str, Course], str]:
+    """
+    Retorna ({id: Course}, id do curso padrão).
+    """
+    base = default_course()
+    if not os.path.exists(path):
+        return {base.course_id: base}, base.course_id
+
+    with open(path, encoding="utf-8") as f:
+        catalogue = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    default_id = str(catalogue.get("default") or base.course_id)
+
+    courses: Dict[str, Course] = {}
+    for data in catalogue.get("courses") or []:
+        if str(data["id"]) == default_id:
+            # o curso padrão mantém o índice e o banco de respostas das variáveis de ambiente
+            data = {"index_dir": base.index_dir, "pinecone_namespace": base.pinecone_namespace,
+                    "sources": base.sources, "answer_bank_path": base.answer_bank_path, **data}
+        course = Course.from_dict(data, base, base_dir)
+        courses[course.course_id] = course
+    if default_id not in courses:
+        base.course_id = default_id
+        courses[default_id] = base
+    return courses, default_id
+
+
+def _rss_bytes() -> int:
+    # memória residente do processo (Linux); 0 onde /proc não existe
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+_MISSING = object()
+
+
+class CourseRegistry:
+    """
+    Catálogo + recursos carregados por curso (retriever, roteador, banco de
+    respostas), thread-safe e limitado como o SessionStore:
+      - cursos sem uso há mais de idle_ttl segundos têm os recursos descartados;
+      - acima de max_loaded cursos carregados, o usado há mais tempo sai (LRU).
+    O curso padrão e os cursos com recursos trocados via set() ficam fixos.
+    Chamadas simultâneas para o mesmo recurso carregam uma vez só.
+    on_evict(course_id, recursos) roda fora do lock para cada curso descartado
+    (fechar arquivos, gravar o que está pendente).
+
+    rss_bytes de cada curso é o crescimento da memória residente durante os
+    carregamentos (aproximado: outras threads alocam ao mesmo tempo).
+    """
+
+    def __init__(
+        self,
+        courses: Dict[str, Course],
+        default_id: str,
+        max_loaded: int = 16,
+        idle_ttl: float = 1800.0,
+        on_evict: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> None:
+        if default_id not in courses:
+            raise ValueError(f"Curso padrão fora do catálogo: {default_id}")
+        self.courses = courses
+        self.default_id = default_id
+        self.max_loaded = max(1, max_loaded)
+        self.idle_ttl = idle_ttl
+        self.on_evict = on_evict
+        self._slots: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = SingleFlight("course_load")
+        self.loads = 0
+        self.evictions = 0
+
+    def __contains__(self, course_id: str) -> bool:
+        return course_id in self.courses
+
+    def get(self, course_id: Optional[str] = None) -> Course:
+        course = self.courses.get(course_id or self.default_id)
+        if course is None:
+            raise ValueError(f"Curso desconhecido: {course_id}")
+        return course
+
+    def _evict(self, now: float) -> List[Tuple[str, Dict[str, Any]]]:
+        evicted = []
+        evictable = [cid for cid, slot in self._slots.items() if not slot["pinned"]]
+        # ordenado por último uso: os ociosos ficam no início
+        for course_id in evictable:
+            if now - self._slots[course_id]["last_used"] <= self.idle_ttl:
+                break
+            evicted.append((course_id, self._slots.pop(course_id)["resources"]))
+        for course_id in evictable:
+            if len(self._slots) <= self.max_loaded:
+                break
+            if course_id in self._slots:
+                evicted.append((course_id, self._slots.pop(course_id)["resources"]))
+        self.evictions += len(evicted)
+        return evicted
+
+    def _slot(self, course_id: str) -> Tuple[Dict[str, Any], List[Tuple[str, Dict[str, Any]]]]:
+        now = time.monotonic()
+        slot = self._slots.get(course_id)
+        if slot is None:
+            slot = {"resources": {}, "pinned": course_id == self.default_id, "rss_bytes": 0, "load_seconds": 0.0}
+            self._slots[course_id] = slot
+        slot["last_used"] = now
+        self._slots.move_to_end(course_id)
+        return slot, self._evict(now)
+
+    def _notify(self, evicted: List[Tuple[str, Dict[str, Any]]]) -> None:
+        if self.on_evict is None:
+            return
+        for course_id, resources in evicted:
+            try:
+                self.on_evict(course_id, resources)
+            except Exception as e:
+                print(f"Erro ao descartar o curso {course_id}:", e)
+
+    def resource(self, course_id: str, name: str, factory: Callable[[Course], Any]) -> Any:
+        course = self.get(course_id)
+        with self._lock:
+            slot, evicted = self._slot(course.course_id)
+            value = slot["resources"].get(name, _MISSING)
+        self._notify(evicted)
+        if value is not _MISSING:
+            return value
+        value, _ = self._loading.do((course.course_id, name), lambda: self._load(slot, course, name, factory))
+        return value
+
+    def _load(self, slot: Dict[str, Any], course: Course, name: str, factory: Callable[[Course], Any]) -> Any:
+        with self._lock:
+            if name in slot["resources"]:
+                return slot["resources"][name]
+        rss, start = _rss_bytes(), time.perf_counter()
+        value = factory(course)
+        with self._lock:
+            slot["resources"][name] = value
+            slot["rss_bytes"] += max(0, _rss_bytes() - rss)
+            slot["load_seconds"] += time.perf_counter() - start
+            self.loads += 1
+        return value
+
+    def set(self, course_id: str, name: str, value: Any) -> None:
+        course = self.get(course_id)
+        with self._lock:
+            slot, evicted = self._slot(course.course_id)
+            slot["resources"][name] = value
+            slot["pinned"] = True
+        self._notify(evicted)
+
+    def loaded(self, name: str) -> List[Tuple[str, Any]]:
+        """
+        (curso, recurso) dos cursos em memória que já carregaram o recurso.
+        """
+        with self._lock:
+            return [(cid, slot["resources"][name]) for cid, slot in self._slots.items() if name in slot["resources"]]
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "courses": len(self.courses),
+                "loaded": len(self._slots),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "per_course": {
+                    course_id: {
+                        "resources": sorted(slot["resources"]),
+                        "rss_bytes": slot["rss_bytes"],
+                        "load_seconds": round(slot["load_seconds"], 3),
+                        "idle_seconds": round(now - slot["last_used"], 1),
+                    }
+                    for course_id, slot in self._slots.items()
+                },
+            }
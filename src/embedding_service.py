@@ -0,0 +1,337 @@
+# src/embedding_service.py
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# runtime -> kwargs do SentenceTransformer
+#   torch     : PyTorch em CPU (mesmos vetores do HuggingFaceEmbeddings)
+#   onnx      : ONNX Runtime (precisa de optimum[onnxruntime])
+#   onnx-int8 : modelo ONNX quantizado em int8; gere com
+#               sentence_transformers.export_dynamic_quantized_onnx_model
+RUNTIMES = ("torch", "onnx", "onnx-int8")
+DEFAULT_INT8_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+
+def _load_model(model_name: str, runtime: str, onnx_file: Optional[str] = None):
+    from sentence_transformers import SentenceTransformer
+
+    if runtime not in RUNTIMES:
+        raise ValueError(f"runtime deve ser um de {RUNTIMES}, não {runtime!r}")
+    if runtime == "torch":
+        return SentenceTransformer(model_name, device="cpu")
+    model_kwargs = {}
+    if runtime == "onnx-int8" or onnx_file:
+        model_kwargs["file_name"] = onnx_file or DEFAULT_INT8_FILE
+    return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+
+# ---------- processos de embedding (um modelo por processo) ----------
+_worker_model = None
+_worker_batch_size = 32
+
+
+def _init_worker(model_name: str, runtime: str, onnx_file: Optional[str], batch_size: int) -> None:
+    global _worker_model, _worker_batch_size
+    # cada processo usa um núcleo; sem isso os processos disputam as threads do torch
+    try:
+        import torch
+
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    _worker_model = _load_model(model_name, runtime, onnx_file)
+    _worker_batch_size = batch_size
+
+
+def _worker_encode(texts: List[str]) -> np.ndarray:
+    return np.asarray(_worker_model.encode(texts, batch_size=_worker_batch_size), dtype=np.float32)
+
+
+class EmbeddingCache:
+    """
+    Cache persistente (SQLite) de embeddings, chave (modelo, sha256 do texto).
+    """
+
+    # limite de variáveis por consulta do SQLite
+    LOOKUP_CHUNK = 500
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for start in range(0, len(unique), self.LOOKUP_CHUNK):
+                chunk = unique[start:start + self.LOOKUP_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    (model, *chunk),
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, items: Dict[str, np.ndarray]) -> None:
+        rows = [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingService(Embeddings):
+    """
+    Embeddings do LangChain sobre sentence-transformers, para indexação e consultas.
+
+    - embed_documents: consulta o cache, ordena os textos que faltam por
+      tamanho (lotes com comprimentos parecidos = menos padding) e codifica
+      em lotes de batch_size, opcionalmente distribuídos em num_workers processos.
+    - embed_query: consultas concorrentes que chegam dentro de
+      micro_batch_ms são codificadas juntas em um único forward. As consultas
+      (perguntas dos alunos) não vão para o cache em disco: ficam num LRU em
+      memória de query_cache_size vetores (chave: sha256 do texto).
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        runtime: str = "torch",
+        batch_size: int = 32,
+        num_workers: int = 0,
+        cache_path: Optional[str] = None,
+        micro_batch_ms: float = 2.0,
+        max_micro_batch: int = 32,
+        onnx_file: Optional[str] = None,
+        query_cache_size: int = 1024,
+    ) -> None:
+        self.model_name = model_name
+        self.runtime = runtime
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.onnx_file = onnx_file
+        self.micro_batch_ms = micro_batch_ms
+        self.max_micro_batch = max_micro_batch
+        # vetores de runtimes diferentes não são intercambiáveis no cache
+        self.cache_key = f"{model_name}:{runtime}" + (f":{onnx_file}" if onnx_file else "")
+        self.cache = EmbeddingCache(cache_path) if cache_path else None
+        self.query_cache_size = query_cache_size
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+
+        self._model = _load_model(model_name, runtime, onnx_file)
+        self._encode_lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+        self._pending: List[tuple] = []
+        self._pending_cond = threading.Condition()
+        self._batcher: Optional[threading.Thread] = None
+        self._closed = False
+
+        self.stats_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.encoded = 0
+        self.query_batches = 0
+        self.queries = 0
+
+    # ---------- codificação ----------
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            import multiprocessing
+
+            # spawn: fork com o torch já carregado pode travar
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.runtime, self.onnx_file, self.batch_size),
+            )
+        return self._pool
+
+    def _encode_local(self, texts: List[str]) -> np.ndarray:
+        with self._encode_lock:
+            return np.asarray(self._model.encode(texts, batch_size=self.batch_size), dtype=np.float32)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Codifica em ordem de tamanho e devolve na ordem original.
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        ordered = [texts[i] for i in order]
+        if self.num_workers > 1 and len(texts) > self.batch_size:
+            # um lote por tarefa: cada processo recebe textos de tamanho parecido
+            chunks = [ordered[i:i + self.batch_size] for i in range(0, len(ordered), self.batch_size)]
+            vectors = np.vstack(list(self._get_pool().map(_worker_encode, chunks)))
+        else:
+            vectors = self._encode_local(ordered)
+        result = np.empty_like(vectors)
+        result[order] = vectors
+        with self.stats_lock:
+            self.encoded += len(texts)
+        return result
+
+    def _embed(self, texts: Sequence[str]) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.cache is None:
+            return self._encode(texts)
+
+        hashes = [EmbeddingCache.text_hash(t) for t in texts]
+        found = self.cache.get_many(self.cache_key, hashes)
+        missing = {h: t for h, t in zip(hashes, texts) if h not in found}
+        with self.stats_lock:
+            self.cache_hits += len(texts) - sum(1 for h in hashes if h in missing)
+            self.cache_misses += sum(1 for h in hashes if h in missing)
+        if missing:
+            new_vectors = self._encode(list(missing.values()))
+            fresh = dict(zip(missing.keys(), new_vectors))
+            self.cache.put_many(self.cache_key, fresh)
+            found.update(fresh)
+        return np.vstack([found[h] for h in hashes])
+
+    def _embed_queries(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Como _embed, mas só com o LRU em memória: sem texto do aluno no disco
+        e sem escrita no SQLite no caminho da requisição.
+        """
+        hashes = [EmbeddingCache.text_hash(t) for t in texts]
+        found: Dict[str, np.ndarray] = {}
+        with self._query_cache_lock:
+            for h in hashes:
+                vector = self._query_cache.get(h)
+                if vector is not None:
+                    self._query_cache.move_to_end(h)
+                    found[h] = vector
+        missing = {h: t for h, t in zip(hashes, texts) if h not in found}
+        with self.stats_lock:
+            self.cache_hits += sum(1 for h in hashes if h not in missing)
+            self.cache_misses += sum(1 for h in hashes if h in missing)
+        if missing:
+            fresh = dict(zip(missing.keys(), self._encode(list(missing.values()))))
+            found.update(fresh)
+            if self.query_cache_size > 0:
+                with self._query_cache_lock:
+                    self._query_cache.update(fresh)
+                    while len(self._query_cache) > self.query_cache_size:
+                        self._query_cache.popitem(last=False)
+        return np.vstack([found[h] for h in hashes])
+
+    # ---------- micro-batching de consultas ----------
+    def _ensure_batcher(self) -> None:
+        if self._batcher is None:
+            with self._pending_cond:
+                if self._batcher is None:
+                    self._batcher = threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True)
+                    self._batcher.start()
+
+    def _batch_loop(self) -> None:
+        while True:
+            with self._pending_cond:
+                while not self._pending and not self._closed:
+                    self._pending_cond.wait()
+                if self._closed and not self._pending:
+                    return
+                # espera um pouco por outras consultas, sem passar de max_micro_batch
+                deadline = time.monotonic() + self.micro_batch_ms / 1000.0
+                while len(self._pending) < self.max_micro_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._pending_cond.wait(remaining)
+                batch = self._pending[:self.max_micro_batch]
+                del self._pending[:self.max_micro_batch]
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self._embed_queries(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self.stats_lock:
+                self.query_batches += 1
+                self.queries += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result([float(x) for x in vector])
+
+    def submit_query(self, text: str) -> Future:
+        future: Future = Future()
+        if self.micro_batch_ms <= 0 or self.max_micro_batch <= 1:
+            future.set_result([float(x) for x in self._embed_queries([text])[0]])
+            return future
+        self._ensure_batcher()
+        with self._pending_cond:
+            if self._closed:
+                raise RuntimeError("EmbeddingService já foi fechado.")
+            self._pending.append((text, future))
+            self._pending_cond.notify_all()
+        return future
+
+    # ---------- interface Embeddings ----------
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.submit_query(text).result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit_query(text))
+
+    def stats(self) -> Dict[str, Any]:
+        with self.stats_lock:
+            return {
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "encoded": self.encoded,
+                "queries": self.queries,
+                "query_batches": self.query_batches,
+            }
+
+    def close(self) -> None:
+        with self._pending_cond:
+            self._closed = True
+            self._pending_cond.notify_all()
+        if self._batcher is not None:
+            self._batcher.join(timeout=5)
+        if self._pool is not None:
+            self._pool.shutdown()
+        if self.cache is not None:
+            self.cache.close()
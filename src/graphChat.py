@@ -1,30 +1,332 @@
+import asyncio
+import atexit
+import contextvars
+import re
 import threading
+import time
 from collections.abc import Sequence
-from typing import Annotated, TypedDict, Literal, Optional, List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, TypedDict, Literal, Optional, List, Dict, Any, Iterator, AsyncIterator, Tuple
 import os
-from src.prompt import classifier_prompt, general_system_prompt, welcome_message
+from src.prompt import context_already_shown, context_prompt, extractive_answer_intro, unavailable_message
 from dotenv import load_dotenv
-from langchain.chat_models import init_chat_model
 from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.graph import END, START, StateGraph, add_messages
 from langgraph.graph.state import RunnableConfig
-from langchain_pinecone import PineconeVectorStore
-from src.helper import downloald_hugging_face_embeddings
+from src.helper import EMBEDDING_MODEL, downloald_hugging_face_embeddings
+from src.hybrid_retrieval import tokenize
+from src.indexing import read_index_version
+from src.vector_index import LocalVectorIndex, LocalVectorRetriever
 from src.agent_logging import AgentLogger
+from src.answer_bank import AnswerBank
+from src.answer_cache import SemanticAnswerCache
+from src.courses import Course, CourseRegistry, load_courses
+from src.router import EmbeddingRouter, load_index_documents, section_phrases
+from src.session_store import SessionStore
+from src.checkpoint_store import SQLiteLatestSaver
+from src.history import pack_context, prune_history, shown_context_keys, window_messages
+from src.llm_client import CircuitBreaker, LLMUnavailable, ResilientLLM, streaming as llm_streaming
+from src.metrics import TimedEmbeddings, instrument, record_llm_usage, registry, timed
+from src.singleflight import SingleFlight, coalescing_ratio_samples, normalize_question
+from src.student_profiles import StudentProfileStore
 
 load_dotenv()
 os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY", "")
 os.environ["PINECONE_API_KEY"] = os.getenv("PINECONE_API_KEY", "")
 
 GPT_MODEL = "openai:gpt-4.1-mini"
-PINECONE_INDEX_NAME = "chatbot"
+# "pinecone" (padrão), "local" (índice NumPy/HNSW em disco gerado pelo store_index.py) ou "stub"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+# índice, k e modo de busca ("hybrid"/"dense", RERANKER_MODEL) são de cada curso: ver src/courses.py
+# "openai" (padrão) ou "stub" (LLM local com latência simulada, para testes de carga)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai").lower()
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "huggingface").lower()
+# timeout de cada requisição HTTP ao provedor (o prazo de cada nó é do llm_client, abaixo)
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
 
-llm = init_chat_model(GPT_MODEL)
+# -------------------- Recursos (inicialização preguiçosa) --------------------
+# LLM, embedder, índice e roteador só são criados no primeiro uso (ou em warm_up()),
+# para o import do módulo ser rápido em workers novos e em testes.
+# LLM e embedder são do processo; índice, roteador e banco de respostas são
+# de cada curso e ficam no CourseRegistry (descartados quando o curso fica ocioso).
 
-embeddings = downloald_hugging_face_embeddings()
-docsearch = PineconeVectorStore.from_existing_index(index_name=PINECONE_INDEX_NAME, embedding=embeddings)
-retriever = docsearch.as_retriever(search_type="similarity", search_kwargs={"k": 2})
+def _build_llm():
+    if LLM_BACKEND == "stub":
+        from src.stubs import StubChatModel
+
+        return StubChatModel(latency=float(os.getenv("STUB_LLM_LATENCY", "0.5")))
+    from langchain.chat_models import init_chat_model
+
+    # stream_usage: usage_metadata (tokens) também quando a resposta é transmitida por streaming;
+    # retries ficam com o llm_client, e o timeout só libera a thread de tentativas abandonadas
+    return init_chat_model(GPT_MODEL, stream_usage=True, max_retries=0, timeout=LLM_REQUEST_TIMEOUT)
+
+def _build_embeddings():
+    if EMBEDDINGS_BACKEND == "stub":
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+
+        return DeterministicFakeEmbedding(size=384)
+    return downloald_hugging_face_embeddings()
+
+def embedding_model_name() -> str:
+    # identifica os vetores gravados em disco (banco de respostas) pelo modelo que os gerou
+    return "stub" if EMBEDDINGS_BACKEND == "stub" else EMBEDDING_MODEL
+
+def _build_retriever(course: Course):
+    """
+    Retorna (retriever, fingerprint do índice). O fingerprint identifica o
+    conteúdo indexado (e o curso) e invalida o cache de respostas quando o índice muda.
+    """
+    if VECTOR_BACKEND == "stub":
+        from src.stubs import StubRetriever
+
+        retriever = StubRetriever(k=course.retrieve_k, latency=float(os.getenv("STUB_RETRIEVE_LATENCY", "0")))
+        return retriever, f"{course.course_id}:stub"
+
+    if VECTOR_BACKEND == "local":
+        local_index = LocalVectorIndex.load(course.index_dir, backend=os.getenv("LOCAL_INDEX_TYPE"))
+        fingerprint = f"{course.course_id}:{local_index.fingerprint()}"
+        if course.retriever_mode == "hybrid":
+            from src.hybrid_retrieval import build_hybrid_retriever
+
+            hybrid = build_hybrid_retriever(
+                local_index,
+                get_embeddings(),
+                k=course.retrieve_k,
+                candidates=course.candidates,
+                reranker_model=course.reranker_model,
+                rerank_top_n=course.rerank_top_n,
+            )
+            return hybrid, fingerprint
+        dense = LocalVectorRetriever(
+            index=local_index, embeddings=get_embeddings(), k=course.retrieve_k, candidates=course.candidates
+        )
+        return dense, fingerprint
+
+    from langchain_pinecone import PineconeVectorStore
+
+    docsearch = PineconeVectorStore.from_existing_index(
+        index_name=course.pinecone_index, embedding=get_embeddings(), namespace=course.pinecone_namespace
+    )
+    # o conteúdo do Pinecone muda com o servidor no ar: a versão do índice entra em get_index_fingerprint
+    fingerprint = f"{course.course_id}:{course.pinecone_index}:{course.pinecone_namespace or ''}"
+    return docsearch.as_retriever(search_type="similarity", search_kwargs={"k": course.retrieve_k}), fingerprint
+
+# Cache semântico de respostas do primeiro turno (perguntas independentes de histórico)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+answer_cache = SemanticAnswerCache(
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+    max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512")),
+    ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+)
+
+# Banco de respostas pré-computadas (precompute_answers.py) para o primeiro turno
+ANSWER_BANK_ENABLED = os.getenv("ANSWER_BANK_ENABLED", "1") == "1"
+
+def _build_answer_bank(course: Course) -> Optional[AnswerBank]:
+    if not ANSWER_BANK_ENABLED or not os.path.exists(course.answer_bank_path):
+        return None
+    bank = AnswerBank(
+        course.answer_bank_path,
+        embedding_model_name(),
+        threshold=float(os.getenv("ANSWER_BANK_THRESHOLD", "0.92")),
+    )
+    return bank if len(bank) else None
+
+# Roteador local por embeddings: evita a chamada ao classificador LLM quando a decisão é clara
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "1") == "1"
+
+def _build_router(course: Course) -> Optional[EmbeddingRouter]:
+    if not ROUTER_ENABLED:
+        return None
+    phrases = section_phrases(load_index_documents(course.index_dir))
+    if not phrases:
+        return None
+    return EmbeddingRouter(
+        get_embeddings(),
+        on_topic=phrases,
+        off_topic=course.off_topic_examples,
+        yes_margin=float(os.getenv("ROUTER_YES_MARGIN", "0.05")),
+        no_margin=float(os.getenv("ROUTER_NO_MARGIN", "-0.05")),
+    )
+
+# Perfil de cada aluno (domínio por seção): promove na busca as seções em que ele tem dificuldade
+PROFILES_ENABLED = os.getenv("PROFILES_ENABLED", "1") == "1"
+PROFILES_DIR = os.getenv("PROFILES_DIR", os.path.join("data", "profiles"))
+
+def _build_profiles(course: Course) -> Optional[StudentProfileStore]:
+    if not PROFILES_ENABLED:
+        return None
+    # colunas na ordem do índice local; sem ele (Pinecone/stub) as seções entram conforme aparecem
+    sections = [str(d.metadata["title"]) for d in load_index_documents(course.index_dir) if d.metadata.get("title")]
+    return StudentProfileStore(
+        os.path.join(PROFILES_DIR, f"{course.course_id}.sqlite"),
+        sections=list(dict.fromkeys(sections)),
+        penalty=float(os.getenv("PROFILE_PENALTY", "0.3")),
+        recovery=float(os.getenv("PROFILE_RECOVERY", "0.02")),
+        max_shift=float(os.getenv("PROFILE_MAX_SHIFT", "3")),
+        batch_size=int(os.getenv("PROFILE_FLUSH_BATCH", "512")),
+        flush_interval=float(os.getenv("PROFILE_FLUSH_INTERVAL", "5")),
+        max_resident=int(os.getenv("PROFILE_MAX_RESIDENT", "10000")),
+    )
+
+_resources: Dict[str, Any] = {}
+_resources_lock = threading.RLock()
+
+def _lazy(name: str, factory):
+    if name not in _resources:
+        with _resources_lock:
+            if name not in _resources:
+                _resources[name] = factory()
+    return _resources[name]
+
+def get_llm():
+    return _lazy("llm", _build_llm)
+
+# nós cujos tokens do LLM são enviados ao navegador (o classificador fica de fora)
+STREAMED_NODES = ("answer_with_context", "answer_direct")
+
+# Chamadas ao LLM dos nós: prazo por nó, retries com jitter, hedge no p95 e circuit breaker.
+# Com o LLM indisponível o classificador vira "busca" e as respostas saem do cache/banco ou dos trechos.
+LLM_ANSWER_DEADLINE = float(os.getenv("LLM_DEADLINE_ANSWER", "45"))
+llm_client = ResilientLLM(
+    get_llm,
+    deadlines={
+        "classify": float(os.getenv("LLM_DEADLINE_CLASSIFY", "8")),
+        "answer_with_context": LLM_ANSWER_DEADLINE,
+        "answer_direct": LLM_ANSWER_DEADLINE,
+    },
+    retries=int(os.getenv("LLM_RETRIES", "2")),
+    backoff=float(os.getenv("LLM_RETRY_BACKOFF", "0.25")),
+    hedge=os.getenv("LLM_HEDGE", "1") == "1",
+    hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.05")),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("LLM_BREAKER_RESET", "30")),
+    ),
+    streamed_nodes=STREAMED_NODES,
+)
+# similaridade mínima para servir uma resposta do cache/banco com o LLM fora do ar
+DEGRADED_MATCH_THRESHOLD = float(os.getenv("DEGRADED_MATCH_THRESHOLD", "0.85"))
+
+def get_embeddings():
+    return _lazy("embeddings", lambda: TimedEmbeddings(_build_embeddings()))
+
+_COURSE_RESOURCES = {
+    "retriever": _build_retriever,
+    "router": _build_router,
+    "answer_bank": _build_answer_bank,
+    "profiles": _build_profiles,
+}
+
+def _close_course(course_id: str, resources: Dict[str, Any]) -> None:
+    # o banco de respostas pode estar em uso por um turno em andamento; os perfis só gravam o pendente
+    if resources.get("profiles") is not None:
+        resources["profiles"].close()
+
+courses = CourseRegistry(
+    *load_courses(),
+    max_loaded=int(os.getenv("COURSE_MAX_LOADED", "16")),
+    idle_ttl=float(os.getenv("COURSE_IDLE_TTL", "1800")),
+    on_evict=_close_course,
+)
+
+@atexit.register
+def _close_profiles() -> None:
+    for _, profiles in courses.loaded("profiles"):
+        if profiles is not None:
+            profiles.close()
+
+def get_retriever(course_id: Optional[str] = None):
+    return courses.resource(courses.get(course_id).course_id, "retriever", _build_retriever)[0]
+
+def get_index_fingerprint(course_id: Optional[str] = None) -> str:
+    course = courses.get(course_id)
+    fingerprint = courses.resource(course.course_id, "retriever", _build_retriever)[1]
+    if VECTOR_BACKEND == "pinecone":
+        # index_version do manifesto gravado pelo store_index.py (relido quando muda)
+        fingerprint += ":" + read_index_version(course.index_dir)
+    return fingerprint
+
+def get_router(course_id: Optional[str] = None) -> Optional[EmbeddingRouter]:
+    return courses.resource(courses.get(course_id).course_id, "router", _build_router)
+
+def get_answer_bank(course_id: Optional[str] = None) -> Optional[AnswerBank]:
+    return courses.resource(courses.get(course_id).course_id, "answer_bank", _build_answer_bank)
+
+def get_profiles(course_id: Optional[str] = None) -> Optional[StudentProfileStore]:
+    return courses.resource(courses.get(course_id).course_id, "profiles", _build_profiles)
+
+def set_resource(name: str, value: Any, course_id: Optional[str] = None) -> None:
+    """
+    Troca um recurso preguiçoso ("llm", "embeddings", "router", "answer_bank",
+    "profiles" ou "retriever", este como (retriever, fingerprint)) antes do uso;
+    para benchmarks e testes. Os quatro últimos são do curso (padrão: o curso padrão).
+    """
+    if name in _COURSE_RESOURCES:
+        courses.set(courses.get(course_id).course_id, name, value)
+        return
+    if name not in ("llm", "embeddings"):
+        raise ValueError(f"Recurso desconhecido: {name}")
+    with _resources_lock:
+        _resources[name] = value
+
+def warm_up(course_ids: Sequence[str] = ()) -> None:
+    """
+    Carrega tudo antes do primeiro aluno (opcional: WARMUP_ON_START=1 em app.py/asgi.py).
+    O embed de teste força o carregamento dos pesos do modelo. Além do curso
+    padrão, carrega os cursos de course_ids.
+    """
+    get_llm()
+    get_embeddings().embed_query("aquecimento")
+    for course_id in [courses.default_id, *course_ids]:
+        get_retriever(course_id)
+        get_router(course_id)
+        get_answer_bank(course_id)
+        get_profiles(course_id)
+
+# compatibilidade: graphChat.llm, graphChat.retriever etc. continuam funcionando
+_LAZY_ATTRIBUTES = {
+    "llm": get_llm,
+    "embeddings": get_embeddings,
+    "retriever": get_retriever,
+    "router": get_router,
+    "answer_bank": get_answer_bank,
+    "profiles": get_profiles,
+    "INDEX_FINGERPRINT": get_index_fingerprint,
+}
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Modo especulativo: o retrieve começa junto com o classificador e é descartado se a rota for answer_direct
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "0") == "1"
+_speculation_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SPECULATION_WORKERS", "8")),
+    thread_name_prefix="speculative-retrieve",
+)
+
+# Coalescência: perguntas idênticas (normalizadas) em andamento dividem a mesma chamada
+# ao classificador, ao retriever e ao LLM do primeiro turno
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "1") == "1"
+_flights = {
+    stage: SingleFlight(stage) for stage in ("classify", "retrieve", "answer_with_context", "answer_direct")
+}
+
+# Histórico: tokens máximos do histórico enviado ao LLM e mensagens mantidas no checkpoint
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "3000"))
+HISTORY_MAX_MESSAGES = max(4, int(os.getenv("HISTORY_MAX_MESSAGES", "40")))
+# a janela e a poda andam em blocos de HISTORY_WINDOW_STEP mensagens (prefixo estável para o cache de prompt)
+HISTORY_WINDOW_STEP = max(1, int(os.getenv("HISTORY_WINDOW_STEP", "8")))
+# tokens máximos de trechos novos por mensagem de contexto
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+# "memory" (padrão) ou "sqlite" (só o último checkpoint de cada sessão, em CHECKPOINT_DB)
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "memory").lower()
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", os.path.join("data", "checkpoints.sqlite"))
 
 logger = AgentLogger()
 
@@ -33,18 +335,37 @@ class AgentState(TypedDict, total=False):
     messages: Annotated[Sequence[BaseMessage], add_messages]
     needs_search: bool
     context_chunks: Optional[List[str]]
+    prefetched: bool
     turn_id: Optional[int]
+    course_id: Optional[str]
+    student_id: Optional[str]
 
 # -------------------- Helpers --------------------
-def _thread_config() -> RunnableConfig:
-    return RunnableConfig(configurable={"thread_id": threading.get_ident()})
+def _thread_config(session_id: Optional[str] = None) -> RunnableConfig:
+    return RunnableConfig(configurable={"thread_id": _session_key(session_id)})
 
 def _last_user_text(messages: Sequence[BaseMessage]) -> str:
     return str(messages[-1].content) if messages else ""
 
-_SESSION_PRIMED = {}
-def _session_key() -> str:
-    return str(threading.get_ident())
+def _course(state: AgentState) -> Course:
+    return courses.get(state.get("course_id"))
+
+def _session_key(session_id: Optional[str] = None) -> str:
+    # sem session_id explícito (CLI) a thread atual é a sessão
+    return session_id or str(threading.get_ident())
+
+def _evict_session(session_id: str) -> None:
+    # em memória, descarta os checkpoints da sessão removida para a memória não crescer
+    # ao longo do dia; no SQLite a conversa persistida fica (só a entrada do SessionStore sai)
+    if isinstance(checkpointer, InMemorySaver):
+        checkpointer.delete_thread(session_id)
+
+sessions = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX", "10000")),
+    idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "1800")),
+    on_evict=_evict_session,
+    sweep_interval=float(os.getenv("SESSION_SWEEP_INTERVAL", "60")),
+)
 
 def _state_snapshot_for_log(state: AgentState) -> Dict[str, Any]:
     snap: Dict[str, Any] = {}
@@ -61,141 +382,895 @@ def _state_snapshot_for_log(state: AgentState) -> Dict[str, Any]:
     return snap
 
 # -------------------- Nós --------------------
+# Cada nó tem uma versão síncrona (graph.invoke/stream) e uma assíncrona
+# (graph.ainvoke/astream); a lógica comum fica nos helpers "_..." abaixo.
+
+def _follower_copy(resp):
+    # cópia sem id: o add_messages de cada sessão atribui um id próprio
+    return resp.model_copy(update={"id": None}) if isinstance(resp, BaseMessage) else resp
+
+def _coalesced(stage: str, key, fn):
+    if not COALESCE_ENABLED or key is None:
+        return fn()
+    result, shared = _flights[stage].do(key, fn)
+    return _follower_copy(result) if shared else result
+
+async def _acoalesced(stage: str, key, fn):
+    if not COALESCE_ENABLED or key is None:
+        return await fn()
+    result, shared = await _flights[stage].ado(key, fn)
+    return _follower_copy(result) if shared else result
+
+def _invoke_llm(node_name: str, msgs: List[BaseMessage], coalesce_key=None) -> BaseMessage:
+    def call() -> BaseMessage:
+        with timed(f"llm_{node_name}"):
+            resp = llm_client.invoke(node_name, msgs)
+        record_llm_usage(node_name, resp)
+        return resp
+
+    return _coalesced(node_name, coalesce_key, call)
+
+async def _ainvoke_llm(node_name: str, msgs: List[BaseMessage], coalesce_key=None) -> BaseMessage:
+    async def call() -> BaseMessage:
+        with timed(f"llm_{node_name}"):
+            resp = await llm_client.ainvoke(node_name, msgs)
+        record_llm_usage(node_name, resp)
+        return resp
+
+    return await _acoalesced(node_name, coalesce_key, call)
+
+def _question_key(course: Course, user_utterance: str):
+    # chave de coalescência: a mesma pergunta em cursos diferentes não é a mesma chamada
+    return course.course_id, normalize_question(user_utterance)
+
+def _query_vectors(course: Course, user_utterance: str):
+    """
+    Candidatos em ordem de relevância, iguais para todos os alunos (coalescidos);
+    _personalize corta em k. Com perfis, retrievers locais devolvem todos os
+    candidatos; os demais já vêm cortados em k e o perfil só os reordena.
+    """
+    def call():
+        retriever = get_retriever(course.course_id)
+        # inclui o embedding da pergunta quando o retriever o calcula internamente
+        with timed("vector_query"):
+            if PROFILES_ENABLED and hasattr(retriever, "candidate_documents"):
+                return retriever.candidate_documents(user_utterance)
+            return retriever.invoke(user_utterance)
+
+    return _coalesced("retrieve", _question_key(course, user_utterance), call)
+
+async def _aquery_vectors(course: Course, user_utterance: str):
+    async def call():
+        retriever = get_retriever(course.course_id)
+        with timed("vector_query"):
+            if PROFILES_ENABLED and hasattr(retriever, "candidate_documents"):
+                return await asyncio.to_thread(retriever.candidate_documents, user_utterance)
+            return await retriever.ainvoke(user_utterance)
+
+    return await _acoalesced("retrieve", _question_key(course, user_utterance), call)
+
+def _section_title(doc) -> str:
+    return str((doc.metadata or {}).get("title") or "")
+
+def _personalize(state: AgentState, docs):
+    """
+    Os k trechos do turno: as seções fracas do aluno sobem entre os candidatos
+    e o perfil registra as k seções mais relevantes para a pergunta, antes da
+    reordenação (sem LLM, O(seções)).
+    """
+    course = _course(state)
+    student_id = state.get("student_id")
+    profiles = get_profiles(course.course_id) if PROFILES_ENABLED and student_id else None
+    if profiles is None:
+        return list(docs[:course.retrieve_k])
+    profiles.record_retrieval(student_id, [t for t in map(_section_title, docs[:course.retrieve_k]) if t])
+    return profiles.rerank(student_id, docs, course.retrieve_k, _section_title)
+
+def _classifier_messages(course: Course, user_utterance: str) -> List[BaseMessage]:
+    sys = SystemMessage(content=course.classifier_prompt.format(context=user_utterance))
+    return [sys, HumanMessage(content=user_utterance)]
+
+def _judge_says_yes(judge: BaseMessage) -> bool:
+    return str(judge.content or "").strip().upper().startswith("Y")
+
+def _parse_judge(turn_id: int, msgs: List[BaseMessage], judge: BaseMessage) -> bool:
+    logger.log_llm_call(turn_id, "classify", msgs, judge)
+    return _judge_says_yes(judge)
+
+def _classify_fallback(turn_id: int, error: LLMUnavailable) -> Tuple[bool, str]:
+    # sem classificador, busca: a resposta com o material do curso é a mais segura (e tem saída extrativa)
+    logger.log_degraded(turn_id, "classify", error.reason, "retrieve")
+    return True, "fallback"
+
+def _route_locally(course: Course, user_utterance: str):
+    router = get_router(course.course_id)
+    if router is None:
+        return None, None
+    return router.route(user_utterance)
+
+@instrument("classify_need_search")
 def classify_need_search(state: AgentState) -> AgentState:
     turn_id = state.get("turn_id") or 0
     logger.log_node_enter(turn_id, "classify", _state_snapshot_for_log(state))
 
     user_utterance = _last_user_text(state["messages"])
-    sys = SystemMessage(content=classifier_prompt.format(context=user_utterance))
-    msgs = [sys, HumanMessage(content=user_utterance)]
-    judge = llm.invoke(msgs)
+    course = _course(state)
 
-    logger.log_llm_call(turn_id, "classify", msgs, judge)
+    speculation = None
+    if SPECULATIVE_RETRIEVAL:
+        speculation = _speculation_pool.submit(
+            contextvars.copy_context().run, _timed_retrieve, course, user_utterance
+        )
+    classify_start = time.perf_counter()
 
-    decision_text = (judge.content or "").strip().upper()
-    needs = decision_text.startswith("Y")
+    needs, margin = _route_locally(course, user_utterance)
 
-    logger.log_route_decision(turn_id, needs)
+    source = "router"
+    if needs is None:
+        source = "llm"
+        msgs = _classifier_messages(course, user_utterance)
+        try:
+            needs = _parse_judge(turn_id, msgs, _invoke_llm("classify", msgs, _question_key(course, user_utterance)))
+        except LLMUnavailable as e:
+            needs, source = _classify_fallback(turn_id, e)
+
+    logger.log_route_decision(turn_id, needs, source=source, score=margin)
+
+    result = {"needs_search": needs, "prefetched": False}
+    if speculation is not None:
+        classify_elapsed = time.perf_counter() - classify_start
+        if needs:
+            try:
+                outcome = speculation.result()
+            except Exception as e:
+                outcome = e
+            result.update(_use_speculation(state, turn_id, user_utterance, outcome, classify_elapsed))
+        else:
+            _discard_speculation(turn_id, speculation, classify_start, classify_elapsed)
 
-    result = {"needs_search": needs}
     logger.log_node_exit(turn_id, "classify", result)
     return result
 
-def retrieve_docs(state: AgentState) -> AgentState:
+@instrument("classify_need_search")
+async def aclassify_need_search(state: AgentState) -> AgentState:
     turn_id = state.get("turn_id") or 0
-    logger.log_node_enter(turn_id, "retrieve", _state_snapshot_for_log(state))
+    logger.log_node_enter(turn_id, "classify", _state_snapshot_for_log(state))
 
     user_utterance = _last_user_text(state["messages"])
-    docs = retriever.invoke(user_utterance) 
+    course = _course(state)
+
+    speculation = None
+    if SPECULATIVE_RETRIEVAL:
+        speculation = asyncio.ensure_future(_atimed_retrieve(course, user_utterance))
+    classify_start = time.perf_counter()
+
+    needs, margin = _route_locally(course, user_utterance)
+
+    source = "router"
+    if needs is None:
+        source = "llm"
+        msgs = _classifier_messages(course, user_utterance)
+        try:
+            needs = _parse_judge(
+                turn_id, msgs, await _ainvoke_llm("classify", msgs, _question_key(course, user_utterance))
+            )
+        except LLMUnavailable as e:
+            needs, source = _classify_fallback(turn_id, e)
+
+    logger.log_route_decision(turn_id, needs, source=source, score=margin)
+
+    result = {"needs_search": needs, "prefetched": False}
+    if speculation is not None:
+        classify_elapsed = time.perf_counter() - classify_start
+        if needs:
+            try:
+                outcome = await speculation
+            except Exception as e:
+                outcome = e
+            result.update(_use_speculation(state, turn_id, user_utterance, outcome, classify_elapsed))
+        else:
+            _discard_speculation(turn_id, speculation, classify_start, classify_elapsed)
+
+    logger.log_node_exit(turn_id, "classify", result)
+    return result
+
+def _timed_retrieve(course: Course, user_utterance: str):
+    start = time.perf_counter()
+    docs = _query_vectors(course, user_utterance)
+    return docs, time.perf_counter() - start
+
+async def _atimed_retrieve(course: Course, user_utterance: str):
+    start = time.perf_counter()
+    docs = await _aquery_vectors(course, user_utterance)
+    return docs, time.perf_counter() - start
+
+def _use_speculation(
+    state: AgentState, turn_id: int, user_utterance: str, outcome, classify_elapsed: float
+) -> Dict[str, Any]:
+    """
+    Aproveita o retrieve especulativo quando a rota é "retrieve".
+    outcome: (docs, duração) ou a exceção levantada pelo retrieve.
+    saved_ms: tempo de retrieve que ficou escondido atrás do classificador.
+    """
+    if isinstance(outcome, Exception):
+        # falha no retrieve especulativo: o nó "retrieve" tenta de novo no caminho normal
+        print("Erro no retrieve especulativo:", outcome)
+        return {}
+
+    docs, retrieve_elapsed = outcome
+    docs = _personalize(state, docs)
+
+    chunks = [d.page_content for d in docs]
+    logger.log_retrieve(turn_id, user_utterance, docs)
+    logger.log_speculation(
+        turn_id,
+        used=True,
+        classify_ms=classify_elapsed * 1000,
+        retrieve_ms=retrieve_elapsed * 1000,
+        saved_ms=min(retrieve_elapsed, classify_elapsed) * 1000,
+        wasted_ms=0.0,
+    )
+    return {"context_chunks": chunks, "prefetched": True}
+
+def _discard_speculation(turn_id: int, speculation, started: float, classify_elapsed: float) -> None:
+    """
+    Descarta o retrieve especulativo (Future ou asyncio.Task) sem bloquear a
+    resposta direta; wasted_ms é registrado quando o retrieve terminar. O
+    Future da thread só é cancelado se nem começou (nada desperdiçado); a
+    Task é interrompida no meio e desperdiçou o tempo desde `started`.
+    """
+    classify_ms = classify_elapsed * 1000
+
+    def _log_discarded(fut) -> None:
+        retrieve_ms = 0.0
+        if fut.cancelled():
+            if isinstance(fut, asyncio.Future):
+                retrieve_ms = (time.perf_counter() - started) * 1000
+        elif fut.exception() is None:
+            retrieve_ms = fut.result()[1] * 1000
+        logger.log_speculation(
+            turn_id, used=False, classify_ms=classify_ms, retrieve_ms=retrieve_ms, saved_ms=0.0, wasted_ms=retrieve_ms
+        )
+
+    # o callback roda na thread do retrieve: preserva a sessão do turno para o log
+    ctx = contextvars.copy_context()
+    speculation.cancel()
+    speculation.add_done_callback(lambda fut: ctx.run(_log_discarded, fut))
+
+def _retrieve_result(turn_id: int, user_utterance: str, docs) -> AgentState:
     chunks = [d.page_content for d in docs]
-    
+
     logger.log_retrieve(turn_id, user_utterance, docs)
     logger.log_node_exit(turn_id, "retrieve",{"docs_count": len(docs), "chunks_len": len(chunks)})
-    
+
     return {"context_chunks": chunks}
 
-def answer_with_context(state: AgentState) -> AgentState:
+@instrument("retrieve_docs")
+def retrieve_docs(state: AgentState) -> AgentState:
     turn_id = state.get("turn_id") or 0
-    logger.log_node_enter(turn_id, "answer_with_context", _state_snapshot_for_log(state))
+    logger.log_node_enter(turn_id, "retrieve", _state_snapshot_for_log(state))
 
     user_utterance = _last_user_text(state["messages"])
-    context = "\n\n".join(state.get("context_chunks") or [])
-    sys = SystemMessage(content=(
-        general_system_prompt
-        + "\n\nUse APENAS as informações a seguir como contexto quando forem relevantes."
-        + " Se o contexto não contiver a resposta, seja honesto."
-        + f"\n\n[CONTEXT]\n{context}\n[/CONTEXT]"
-    ))
-    msgs = [sys] + state.get("messages", [])
-    resp = llm.invoke(msgs)
-
-    logger.log_llm_call(turn_id, "answer_with_context", msgs, resp)
-
-    result = {"messages": [resp]}
-    logger.log_node_exit(turn_id, "answer_with_context", {"assistant_preview": str(resp.content)[:200]})
+    docs = _personalize(state, _query_vectors(_course(state), user_utterance))
+    return _retrieve_result(turn_id, user_utterance, docs)
+
+@instrument("retrieve_docs")
+async def aretrieve_docs(state: AgentState) -> AgentState:
+    turn_id = state.get("turn_id") or 0
+    logger.log_node_enter(turn_id, "retrieve", _state_snapshot_for_log(state))
+
+    user_utterance = _last_user_text(state["messages"])
+    docs = _personalize(state, await _aquery_vectors(_course(state), user_utterance))
+    return _retrieve_result(turn_id, user_utterance, docs)
+
+def _history(state: AgentState) -> List[BaseMessage]:
+    return window_messages(state.get("messages", []), HISTORY_MAX_TOKENS, step=HISTORY_WINDOW_STEP)
+
+def _context_messages(state: AgentState) -> Tuple[List[BaseMessage], SystemMessage]:
+    """
+    Layout para o cache de prompt: [system estático] + histórico (com os
+    contextos dos turnos anteriores) + pergunta + contexto novo. O contexto
+    novo só traz trechos que ainda não estão na janela do histórico e é
+    salvo no checkpoint, então o prompt do próximo turno estende este.
+    """
+    history = _history(state)
+    chunks, keys = pack_context(state.get("context_chunks") or [], CONTEXT_MAX_TOKENS, shown_context_keys(history))
+    context = "\n\n".join(chunks) if chunks else context_already_shown
+    context_msg = SystemMessage(content=context_prompt.format(context=context), additional_kwargs={"context_keys": keys})
+    return history + [context_msg], context_msg
+
+def _first_turn_key(state: AgentState, *parts: str):
+    """
+    Chave de coalescência da resposta: só no primeiro turno ([system, boas-vindas,
+    pergunta]) o prompt depende apenas da pergunta (e do contexto recuperado).
+    """
+    messages = state.get("messages") or []
+    if sum(isinstance(m, HumanMessage) for m in messages) != 1:
+        return None
+    return _question_key(_course(state), _last_user_text(messages)) + parts
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?:])\s+|\n+")
+
+def _extractive_answer(question: str, chunks: Sequence[str], max_sentences: int = 4, max_chars: int = 400) -> List[str]:
+    """
+    As frases dos trechos que mais dividem termos (tokenize) com a pergunta,
+    na ordem do material; sem nenhuma em comum, o começo do primeiro trecho.
+    """
+    terms = set(tokenize(question))
+    sentences = [s.strip() for chunk in chunks for s in _SENTENCE_RE.split(chunk) if s.strip()]
+    scored = [(len(terms & set(tokenize(s))), i) for i, s in enumerate(sentences)]
+    best = sorted(i for score, i in sorted(scored, key=lambda item: -item[0])[:max_sentences] if score > 0)
+    if not best:
+        best = list(range(min(max_sentences, len(sentences))))
+    return [s if len(s) <= max_chars else s[:max_chars].rsplit(" ", 1)[0] + "…" for s in (sentences[i] for i in best)]
+
+def _degraded_answer(state: AgentState, turn_id: int, node_name: str, error: LLMUnavailable) -> AIMessage:
+    """
+    Resposta sem LLM: a mais parecida do banco/cache (limiar mais baixo que o
+    normal), senão as frases dos trechos recuperados que mais batem com a
+    pergunta, senão um aviso. Marcada em response_metadata["degraded"] para
+    não entrar no cache de respostas.
+    """
+    course = _course(state)
+    question = _last_user_text(state.get("messages") or [])
+    text, answer_source = None, "unavailable"
+    try:
+        vector = get_embeddings().embed_query(question)
+        bank = get_answer_bank(course.course_id) if ANSWER_BANK_ENABLED else None
+        if bank is not None:
+            text, _ = bank.lookup(vector, threshold=DEGRADED_MATCH_THRESHOLD, count=False)
+            answer_source = "bank"
+        if text is None and ANSWER_CACHE_ENABLED:
+            text, _ = answer_cache.lookup(
+                vector, get_index_fingerprint(course.course_id), threshold=DEGRADED_MATCH_THRESHOLD, count=False
+            )
+            answer_source = "cache"
+    except Exception as e:
+        print("Erro ao buscar resposta degradada:", e)
+        text = None
+    if text is None and state.get("context_chunks"):
+        sentences = _extractive_answer(question, state["context_chunks"])
+        text, answer_source = extractive_answer_intro + "\n\n" + "\n".join(f"- {s}" for s in sentences), "extractive"
+    if text is None:
+        text, answer_source = unavailable_message, "unavailable"
+    logger.log_degraded(turn_id, node_name, error.reason, answer_source)
+    return AIMessage(content=text, response_metadata={"degraded": answer_source})
+
+def _answer_result(
+    state: AgentState,
+    turn_id: int,
+    node_name: str,
+    msgs: List[BaseMessage],
+    resp: BaseMessage,
+    persist: Sequence[BaseMessage] = (),
+) -> AgentState:
+    if not resp.response_metadata.get("degraded"):
+        logger.log_llm_call(turn_id, node_name, msgs, resp)
+
+    # mantém o checkpoint com no máximo HISTORY_MAX_MESSAGES mensagens (persist e a resposta entram agora)
+    removals = prune_history(
+        state.get("messages", []), HISTORY_MAX_MESSAGES - 1 - len(persist), step=HISTORY_WINDOW_STEP
+    )
+    result = {"messages": removals + list(persist) + [resp]}
+    logger.log_node_exit(turn_id, node_name, {"assistant_preview": str(resp.content)[:200]})
     return result
 
+@instrument("answer_with_context")
+def answer_with_context(state: AgentState) -> AgentState:
+    turn_id = state.get("turn_id") or 0
+    logger.log_node_enter(turn_id, "answer_with_context", _state_snapshot_for_log(state))
+
+    msgs, context_msg = _context_messages(state)
+    try:
+        resp = _invoke_llm("answer_with_context", msgs, _first_turn_key(state, str(context_msg.content)))
+    except LLMUnavailable as e:
+        resp = _degraded_answer(state, turn_id, "answer_with_context", e)
+    return _answer_result(state, turn_id, "answer_with_context", msgs, resp, persist=[context_msg])
+
+@instrument("answer_with_context")
+async def aanswer_with_context(state: AgentState) -> AgentState:
+    turn_id = state.get("turn_id") or 0
+    logger.log_node_enter(turn_id, "answer_with_context", _state_snapshot_for_log(state))
+
+    msgs, context_msg = _context_messages(state)
+    try:
+        resp = await _ainvoke_llm("answer_with_context", msgs, _first_turn_key(state, str(context_msg.content)))
+    except LLMUnavailable as e:
+        resp = await asyncio.to_thread(_degraded_answer, state, turn_id, "answer_with_context", e)
+    return _answer_result(state, turn_id, "answer_with_context", msgs, resp, persist=[context_msg])
+
+@instrument("answer_direct")
 def answer_direct(state: AgentState) -> AgentState:
     turn_id = state.get("turn_id") or 0
     logger.log_node_enter(turn_id, "answer_direct", _state_snapshot_for_log(state))
 
-    msgs = state.get("messages", [])
-    resp = llm.invoke(msgs)
+    msgs = _history(state)
+    try:
+        resp = _invoke_llm("answer_direct", msgs, _first_turn_key(state))
+    except LLMUnavailable as e:
+        resp = _degraded_answer(state, turn_id, "answer_direct", e)
+    return _answer_result(state, turn_id, "answer_direct", msgs, resp)
 
-    logger.log_llm_call(turn_id, "answer_direct", msgs, resp)
-    result = {"messages": [resp]}
-    logger.log_node_exit(turn_id, "answer_direct", {"assistant_preview": str(resp.content)[:200]})
-    return result
+@instrument("answer_direct")
+async def aanswer_direct(state: AgentState) -> AgentState:
+    turn_id = state.get("turn_id") or 0
+    logger.log_node_enter(turn_id, "answer_direct", _state_snapshot_for_log(state))
+
+    msgs = _history(state)
+    try:
+        resp = await _ainvoke_llm("answer_direct", msgs, _first_turn_key(state))
+    except LLMUnavailable as e:
+        resp = await asyncio.to_thread(_degraded_answer, state, turn_id, "answer_direct", e)
+    return _answer_result(state, turn_id, "answer_direct", msgs, resp)
 
 # -------------------- Grafo --------------------
 builder = StateGraph(AgentState, context_schema=None, input_schema=AgentState, output_schema=AgentState)
 
-builder.add_node("classify", classify_need_search)
-builder.add_node("retrieve", retrieve_docs)
-builder.add_node("answer_with_context", answer_with_context)
-builder.add_node("answer_direct", answer_direct)
+builder.add_node("classify", RunnableLambda(classify_need_search, afunc=aclassify_need_search))
+builder.add_node("retrieve", RunnableLambda(retrieve_docs, afunc=aretrieve_docs))
+builder.add_node("answer_with_context", RunnableLambda(answer_with_context, afunc=aanswer_with_context))
+builder.add_node("answer_direct", RunnableLambda(answer_direct, afunc=aanswer_direct))
 
 builder.add_edge(START, "classify")
 
-def route_after_classify(state: AgentState) -> Literal["retrieve", "answer_direct"]:
-    return "retrieve" if state.get("needs_search") else "answer_direct"
+def route_after_classify(state: AgentState) -> Literal["retrieve", "answer_with_context", "answer_direct"]:
+    if not state.get("needs_search"):
+        return "answer_direct"
+    # no modo especulativo o contexto já veio junto com a classificação
+    return "answer_with_context" if state.get("prefetched") else "retrieve"
 
 builder.add_conditional_edges("classify", route_after_classify)
 builder.add_edge("retrieve", "answer_with_context")
 builder.add_edge("answer_with_context", END)
 builder.add_edge("answer_direct", END)
 
-checkpointer = InMemorySaver()
+def _build_checkpointer():
+    if CHECKPOINT_BACKEND == "sqlite":
+        return SQLiteLatestSaver(CHECKPOINT_DB)
+    return InMemorySaver()
+
+checkpointer = _build_checkpointer()
 graph = builder.compile(checkpointer=checkpointer)
 
+# -------------------- Métricas (/metrics) --------------------
+registry.collector(
+    "tutor_answer_cache_total", "Consultas ao cache semântico de respostas.", "counter",
+    lambda: [({"result": k}, v) for k, v in answer_cache.stats().items() if k in ("hits", "misses")],
+)
+# banco e roteador: só dos cursos carregados (o scrape não carrega nada)
+registry.collector(
+    "tutor_answer_bank_total", "Consultas ao banco de respostas pré-computadas.", "counter",
+    lambda: [
+        ({"course": course_id, "result": k}, v)
+        for course_id, bank in courses.loaded("answer_bank") if bank is not None
+        for k, v in bank.stats().items() if k in ("hits", "misses")
+    ],
+)
+registry.collector(
+    "tutor_router_decisions_total", "Decisões do roteador local (llm_fallback = classificador LLM).", "counter",
+    lambda: [
+        ({"course": course_id, "route": k}, v)
+        for course_id, router in courses.loaded("router") if router is not None
+        for k, v in router.stats().items()
+    ],
+)
+registry.collector("tutor_courses_loaded", "Cursos com recursos (índice, roteador) em memória.", "gauge",
+                   lambda: [({}, courses.stats()["loaded"])])
+registry.collector(
+    "tutor_course_memory_bytes", "Memória residente acrescentada pelo carregamento de cada curso (aproximada).", "gauge",
+    lambda: [({"course": course_id}, c["rss_bytes"]) for course_id, c in courses.stats()["per_course"].items()],
+)
+registry.collector(
+    "tutor_coalescing_ratio", "Fração das chamadas que reaproveitaram uma chamada idêntica em andamento.", "gauge",
+    lambda: coalescing_ratio_samples(list(_flights.values())),
+)
+registry.collector(
+    "tutor_student_profiles", "Alunos com perfil em memória por curso.", "gauge",
+    lambda: [
+        ({"course": course_id}, profiles.stats()["students"])
+        for course_id, profiles in courses.loaded("profiles") if profiles is not None
+    ],
+)
+registry.collector(
+    "tutor_profile_flushed_rows_total", "Perfis de alunos gravados em disco (em lotes).", "counter",
+    lambda: [
+        ({"course": course_id}, profiles.flushed_rows)
+        for course_id, profiles in courses.loaded("profiles") if profiles is not None
+    ],
+)
+registry.collector(
+    "tutor_llm_circuit_open", "1 com o circuit breaker do LLM aberto (respostas degradadas).", "gauge",
+    lambda: [({}, 0 if llm_client.breaker.stats()["state"] == "closed" else 1)],
+)
+registry.collector("tutor_sessions", "Sessões ativas no SessionStore.", "gauge", lambda: [({}, len(sessions))])
+registry.collector("tutor_log_dropped_total", "Eventos de log descartados com a fila cheia.", "counter", lambda: [({}, logger.dropped)])
+
 # -------------------- API de uso (para sua rota POST) --------------------
-def agentic_reply(user_text: Optional[str] = None) -> str:
+
+def _course_session(course_id: Optional[str], session: str) -> Tuple[Course, str]:
+    """
+    (curso, chave da sessão). A chave também é o thread_id do checkpoint: no
+    curso padrão é o próprio session_id; nos demais leva o curso na frente,
+    para o mesmo aluno ter uma conversa separada em cada curso.
+    """
+    course = courses.get(course_id)
+    if course.course_id != courses.default_id:
+        session = f"{course.course_id}:{session}"
+    return course, session
+
+def _first_turn_messages(course: Course, user_text: str) -> List[BaseMessage]:
+    return [
+        SystemMessage(content=course.system_prompt),
+        AIMessage(content=course.welcome_message),
+        HumanMessage(user_text)
+    ]
+
+def _prepare_turn(user_text: Optional[str], session: str, course: Course, student_id: Optional[str]) -> Dict[str, Any]:
+    """
+    Abre o turno e decide se o grafo precisa rodar.
+    Retorna {"reply": str} quando a resposta já está pronta (boas-vindas,
+    banco de respostas ou cache) ou {"session", "course_id", "turn_id",
+    "state_in", "query_vector", "first_turn"} caso contrário.
+    """
+    primed = sessions.is_primed(session) or _has_history(session)
+
+    if not primed and (user_text is None or not user_text.strip()):
+        turn_id = sessions.next_turn(session)
+        logger.log_turn_start(turn_id, "(inicialização do chat)")
+        logger.log_turn_end(turn_id, course.welcome_message)
+        return {"reply": course.welcome_message}
+
+    turn_id = sessions.next_turn(session)
+    logger.log_turn_start(turn_id, user_text)
+    turn = {"session": session, "course_id": course.course_id, "turn_id": turn_id}
+    ids = {"turn_id": turn_id, "course_id": course.course_id, "student_id": student_id}
+
+    if primed:
+        state_in: AgentState = {"messages": [HumanMessage(user_text)], **ids}
+        return {**turn, "state_in": state_in, "query_vector": None, "first_turn": False}
+
+    init_messages = _first_turn_messages(course, user_text)
+
+    query_vector = None
+    bank = get_answer_bank(course.course_id) if ANSWER_BANK_ENABLED else None
+    if bank is not None or ANSWER_CACHE_ENABLED:
+        query_vector = get_embeddings().embed_query(user_text)
+
+    ready = None
+    if bank is not None:
+        ready, similarity = bank.lookup(query_vector)
+        logger.log_answer_bank(turn_id, ready is not None, similarity)
+    if ready is None and ANSWER_CACHE_ENABLED:
+        ready, similarity = answer_cache.lookup(query_vector, get_index_fingerprint(course.course_id))
+        logger.log_answer_cache(turn_id, ready is not None, similarity)
+    if ready is not None:
+        # grava o turno no checkpoint sem passar pelos nós (nenhuma chamada ao LLM)
+        graph.update_state(
+            _thread_config(session),
+            {"messages": list(init_messages) + [AIMessage(content=ready)], **ids},
+            as_node="answer_with_context",
+        )
+        logger.log_turn_end(turn_id, ready)
+        sessions.mark_primed(session)
+        return {"reply": ready}
+    if not ANSWER_CACHE_ENABLED:
+        # o vetor serviu só para o banco; sem cache não há o que gravar em _finish_turn
+        query_vector = None
+
+    state_in: AgentState = {"messages": init_messages, **ids}
+    return {**turn, "state_in": state_in, "query_vector": query_vector, "first_turn": True}
+
+def _has_history(session: str) -> bool:
+    """
+    Sessão já iniciada em outro processo/antes de um restart (checkpointer persistente).
+    """
+    if CHECKPOINT_BACKEND == "memory":
+        return False
+    snapshot = checkpointer.get_tuple(_thread_config(session))
+    if snapshot is None or not snapshot.checkpoint["channel_values"].get("messages"):
+        return False
+    sessions.mark_primed(session)
+    return True
+
+def _finish_turn(prepared: Dict[str, Any], reply: BaseMessage) -> str:
+    assistant_text = str(reply.content)
+    logger.log_turn_end(prepared["turn_id"], assistant_text)
+
+    # respostas degradadas (LLM fora do ar) não entram no cache
+    if prepared["query_vector"] is not None and not reply.response_metadata.get("degraded"):
+        answer_cache.store(prepared["query_vector"], assistant_text, get_index_fingerprint(prepared["course_id"]))
+
+    if prepared["first_turn"]:
+        sessions.mark_primed(prepared["session"])
+    return assistant_text
+
+def _abort_turn(prepared: Dict[str, Any], config: Dict[str, Any]) -> None:
+    """
+    Turno transmitido que não terminou (aluno desconectou, erro no meio).
+    Se o checkpoint já tem o início da conversa, a sessão fica marcada: o
+    próximo turno não reenvia [System, boas-vindas] para a mesma thread.
+    Nada vai para o cache.
+    """
+    if prepared["first_turn"] and graph.get_state(config).values.get("messages"):
+        sessions.mark_primed(prepared["session"])
+    logger.log_turn_end(prepared["turn_id"], "(turno interrompido)")
+
+def _stream_tail(streamed: List[str], assistant_text: str) -> str:
+    """
+    O que falta enviar ao navegador para o texto exibido terminar igual à
+    resposta salva: nada no caso normal, a resposta inteira quando nada foi
+    transmitido (coalescida, degradada ou vinda de uma nova tentativa).
+    """
+    shown = "".join(streamed)
+    if assistant_text.startswith(shown):
+        return assistant_text[len(shown):]
+    # a tentativa transmitida falhou no meio: a resposta salva vem em seguida
+    return "\n\n" + assistant_text
+
+def agentic_reply(
+    user_text: Optional[str] = None,
+    session_id: Optional[str] = None,
+    course_id: Optional[str] = None,
+    student_id: Optional[str] = None,
+) -> str:
     """
     Regra:
       - Se a sessão acabou de iniciar e ainda não houve input do usuário,
         mostra a mensagem de boas-vindas (NÃO roda o grafo ainda).
       - Na PRIMEIRA mensagem do usuário, enviamos [System, AI(welcome), Human]
         para o grafo, de modo que a saudação faça parte do contexto.
+        Se uma pergunta equivalente está no banco de respostas pré-computadas
+        ou já foi respondida (cache semântico), a resposta sai sem nenhuma
+        chamada ao LLM.
       - Nos turnos seguintes, apenas a HumanMessage é adicionada; o histórico
         completo já está salvo pelo checkpointer do LangGraph.
+    course_id escolhe o curso do catálogo (src/courses.py); None = curso padrão.
+    Um id desconhecido levanta ValueError. student_id identifica o perfil do
+    aluno (src/student_profiles.py), estável entre visitas (cookie, login do
+    LMS); None = sem perfil (uma sessão avulsa não acumula perfil).
     """
-    session = _session_key()
-    primed = _SESSION_PRIMED.get(session, False)
+    course, session = _course_session(course_id, _session_key(session_id))
+    logger.bind_session(session)
+    prepared = _prepare_turn(user_text, session, course, student_id)
+    if "reply" in prepared:
+        return prepared["reply"]
 
-    if not primed and (user_text is None or not user_text.strip()):
-        turn_id = logger.next_turn()
-        logger.log_turn_start(turn_id, "(inicialização do chat)")
-        logger.log_turn_end(turn_id, welcome_message)
-        return welcome_message
+    result = graph.invoke(prepared["state_in"], config=_thread_config(prepared["session"]))
+    return _finish_turn(prepared, result["messages"][-1])
 
-    if not primed:
-        turn_id = logger.next_turn()
-        logger.log_turn_start(turn_id, user_text)
+def agentic_reply_stream(
+    user_text: Optional[str] = None,
+    session_id: Optional[str] = None,
+    course_id: Optional[str] = None,
+    student_id: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Mesmas regras de agentic_reply, mas produz os tokens da resposta à medida
+    que o LLM os gera (graph.stream com stream_mode="messages").
+    Respostas prontas (boas-vindas/cache) saem em um único pedaço.
+    """
+    course, session = _course_session(course_id, _session_key(session_id))
+    logger.bind_session(session)
+    prepared = _prepare_turn(user_text, session, course, student_id)
+    if "reply" in prepared:
+        yield prepared["reply"]
+        return
 
-        init_messages: Sequence[BaseMessage] = [
-            SystemMessage(content=general_system_prompt),
-            AIMessage(content=welcome_message),
-            HumanMessage(user_text)
-        ]
+    config = _thread_config(prepared["session"])
+    streamed: List[str] = []
+    # avisa o llm_client: sem hedge nem novas tentativas visíveis nos nós transmitidos
+    streaming_token = llm_streaming.set(True)
+    finished = False
+    try:
+        try:
+            for chunk, metadata in graph.stream(prepared["state_in"], config=config, stream_mode="messages"):
+                # só a resposta do LLM (a mensagem de contexto salva pelo nó também passa por aqui)
+                if metadata.get("langgraph_node") not in STREAMED_NODES or not isinstance(chunk, AIMessage):
+                    continue
+                token = chunk.content if isinstance(chunk.content, str) else ""
+                if token:
+                    streamed.append(token)
+                    yield token
+        finally:
+            llm_streaming.reset(streaming_token)
 
-        state_in: AgentState = {"messages": init_messages, "turn_id": turn_id}
-        result = graph.invoke(state_in, config=_thread_config())
+        # a mensagem completa (a mesma registrada em log_llm_call) vem do checkpoint
+        reply = graph.get_state(config).values["messages"][-1]
+        tail = _stream_tail(streamed, str(reply.content))
+        if tail:
+            yield tail
+        _finish_turn(prepared, reply)
+        finished = True
+    finally:
+        # GeneratorExit (cliente desconectou) para o gerador num yield
+        if not finished:
+            _abort_turn(prepared, config)
 
-        assistant_text = str(result["messages"][-1].content)
-        logger.log_turn_end(turn_id, assistant_text)
+async def agentic_reply_async(
+    user_text: Optional[str], session_id: str, course_id: Optional[str] = None, student_id: Optional[str] = None
+) -> str:
+    """
+    Versão assíncrona de agentic_reply para servidores ASGI (asgi.py).
+    Os nós rodam com llm.ainvoke/retriever.ainvoke via graph.ainvoke; o
+    session_id é obrigatório porque todas as requisições dividem a mesma thread.
+    """
+    course, session = _course_session(course_id, session_id)
+    logger.bind_session(session)
+    prepared = await asyncio.to_thread(_prepare_turn, user_text, session, course, student_id)
+    if "reply" in prepared:
+        return prepared["reply"]
 
-        _SESSION_PRIMED[session] = True
-        return assistant_text
+    result = await graph.ainvoke(prepared["state_in"], config=_thread_config(prepared["session"]))
+    return _finish_turn(prepared, result["messages"][-1])
 
-    turn_id = logger.next_turn()
-    logger.log_turn_start(turn_id, user_text)
+async def agentic_reply_astream(
+    user_text: Optional[str], session_id: str, course_id: Optional[str] = None, student_id: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Versão assíncrona de agentic_reply_stream (graph.astream).
+    """
+    course, session = _course_session(course_id, session_id)
+    logger.bind_session(session)
+    prepared = await asyncio.to_thread(_prepare_turn, user_text, session, course, student_id)
+    if "reply" in prepared:
+        yield prepared["reply"]
+        return
 
-    state_in: AgentState = {"messages": [HumanMessage(user_text)], "turn_id": turn_id}
-    result = graph.invoke(state_in, config=_thread_config())
+    config = _thread_config(prepared["session"])
+    streamed: List[str] = []
+    streaming_token = llm_streaming.set(True)
+    finished = False
+    try:
+        try:
+            async for chunk, metadata in graph.astream(prepared["state_in"], config=config, stream_mode="messages"):
+                # só a resposta do LLM (a mensagem de contexto salva pelo nó também passa por aqui)
+                if metadata.get("langgraph_node") not in STREAMED_NODES or not isinstance(chunk, AIMessage):
+                    continue
+                token = chunk.content if isinstance(chunk.content, str) else ""
+                if token:
+                    streamed.append(token)
+                    yield token
+        finally:
+            llm_streaming.reset(streaming_token)
 
-    assistant_text = str(result["messages"][-1].content)
-    logger.log_turn_end(turn_id, assistant_text)
-    return assistant_text
+        state = await graph.aget_state(config)
+        reply = state.values["messages"][-1]
+        tail = _stream_tail(streamed, str(reply.content))
+        if tail:
+            yield tail
+        _finish_turn(prepared, reply)
+        finished = True
+    finally:
+        # cancelamento da tarefa (cliente desconectou) ou aclose() do gerador
+        if not finished:
+            _abort_turn(prepared, config)
+
+
+def _batch_llm(stage: str, nodes: List[str], prompts: List[List[BaseMessage]], concurrency: int) -> List[Any]:
+    # llm.batch: o provedor usa o envio em lote quando tem; senão, chamadas paralelas limitadas
+    if not prompts:
+        return []
+    # etapa própria: o lote inteiro não é uma amostra de latência de llm_<nó>
+    with timed(f"batch_{stage}"):
+        replies = get_llm().batch(prompts, config={"max_concurrency": concurrency}, return_exceptions=True)
+        failed = [i for i, resp in enumerate(replies) if isinstance(resp, Exception)]
+        if failed:
+            # o provedor não tenta de novo (max_retries=0): as falhas passam pelos retries do llm_client
+            def retry(i: int):
+                try:
+                    return llm_client.invoke(nodes[i], prompts[i])
+                except LLMUnavailable as e:
+                    return e
+
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-retry") as pool:
+                for i, resp in zip(failed, pool.map(retry, failed)):
+                    replies[i] = resp
+    for node_name, resp in zip(nodes, replies):
+        if not isinstance(resp, Exception):
+            record_llm_usage(node_name, resp)
+    return replies
+
+def agentic_reply_batch(
+    questions: Sequence[str],
+    course_id: Optional[str] = None,
+    concurrency: int = 8,
+    use_bank: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Responde perguntas independentes (primeiro turno, sem sessão) para
+    avaliações e geração offline. Roda as etapas do grafo para o conjunto
+    todo de uma vez, com os mesmos prompts e recursos do curso:
+      1. embeddings de todas as perguntas numa chamada (embed_documents);
+      2. banco de respostas (use_bank) e roteador local sobre esses vetores;
+      3. classificador LLM das perguntas ambíguas via llm.batch;
+      4. busca com os vetores prontos (índice local) ou retriever.batch;
+      5. respostas via llm.batch, até concurrency chamadas simultâneas.
+    Perguntas iguais (normalizadas) rodam uma vez. Sem perfis de aluno, cache
+    de respostas nem checkpoint. Retorna, na ordem das perguntas,
+    {"answer", "route", "needs_search", "sources"} ou {"error"}.
+    """
+    course = courses.get(course_id)
+    concurrency = max(1, concurrency)
+    keys = [normalize_question(q) for q in questions]
+    items: Dict[str, Dict[str, Any]] = {}
+    for key, question in zip(keys, questions):
+        items.setdefault(key, {"question": question})
+    batch = list(items.values())
+
+    vectors = get_embeddings().embed_documents([item["question"] for item in batch])
+
+    bank = get_answer_bank(course.course_id) if use_bank and ANSWER_BANK_ENABLED else None
+    router = get_router(course.course_id)
+    for item, vector in zip(batch, vectors):
+        item["vector"] = vector
+        if bank is not None:
+            answer, _ = bank.lookup(vector)
+            if answer is not None:
+                item.update(answer=answer, route="bank")
+                continue
+        if router is not None:
+            needs, _ = router.route_vector(vector)
+            if needs is not None:
+                item.update(needs_search=needs, route="router")
+
+    classify = [item for item in batch if "answer" not in item and "needs_search" not in item]
+    prompts = [_classifier_messages(course, item["question"]) for item in classify]
+    judges = _batch_llm("classify", ["classify"] * len(prompts), prompts, concurrency)
+    for item, judge in zip(classify, judges):
+        if isinstance(judge, Exception):
+            item["error"] = repr(judge)
+        else:
+            item.update(needs_search=_judge_says_yes(judge), route="llm")
+
+    search = [item for item in batch if item.get("needs_search") and "error" not in item]
+    retriever = get_retriever(course.course_id)
+    with timed("batch_retrieve"):
+        if hasattr(retriever, "candidate_documents"):
+            found = [retriever.candidate_documents(item["question"], query_vector=item["vector"]) for item in search]
+        else:
+            found = retriever.batch(
+                [item["question"] for item in search], config={"max_concurrency": concurrency}, return_exceptions=True
+            ) if search else []
+    for item, docs in zip(search, found):
+        if isinstance(docs, Exception):
+            item["error"] = repr(docs)
+        else:
+            item["docs"] = list(docs[:course.retrieve_k])
+
+    # as duas rotas de resposta num lote só (uma espera a menos)
+    answer = [item for item in batch if "answer" not in item and "error" not in item]
+    nodes, prompts = [], []
+    for item in answer:
+        state: AgentState = {"messages": _first_turn_messages(course, item["question"])}
+        if item["needs_search"]:
+            state["context_chunks"] = [d.page_content for d in item["docs"]]
+            nodes.append("answer_with_context")
+            prompts.append(_context_messages(state)[0])
+        else:
+            nodes.append("answer_direct")
+            prompts.append(_history(state))
+    for item, resp in zip(answer, _batch_llm("answer", nodes, prompts, concurrency)):
+        if isinstance(resp, Exception):
+            item["error"] = repr(resp)
+        else:
+            item["answer"] = str(resp.content)
+
+    results = []
+    for key in keys:
+        item = items[key]
+        if "error" in item:
+            results.append({"error": item["error"]})
+            continue
+        results.append({
+            "answer": item["answer"],
+            "route": item["route"],
+            "needs_search": item.get("needs_search"),
+            "sources": [
+                {"title": (d.metadata or {}).get("title"), "source": (d.metadata or {}).get("source")}
+                for d in item.get("docs", [])
+            ],
+        })
+    return results
 
 
 # -------------------- CLI --------------------
@@ -1,45 +1,90 @@
-from langchain_huggingface import HuggingFaceEmbeddings
-from typing import List
+import os
+from typing import Iterator, List
 from langchain_core.documents import Document
-from collections import Counter
-import fitz
+
+# fitz (PyMuPDF) e langchain_huggingface (torch) são importados dentro das funções:
+# importar src.helper não deve custar o carregamento do torch.
+
+EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
 
 BLACK_FONT = "MyriadPro-Black"
 SEMIBOLD_FONT = "MyriadPro-Semibold"
 
+# páginas por tarefa no pool de processos; PDF_WORKERS=0 extrai no processo atual
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
 def _dominant_font(spanList):
     """
     Retorna a fonte dominante (mais frequente) dentre os spans com texto.
+    Empate: a que aparece primeiro (mesmo critério de Counter.most_common).
     """
-    fonts = []
+    counts = {}
     for span in spanList:
-        text = span.get("text", "").strip()
-        if text:
-            fonts.append(span.get("font", ""))
-    if not fonts:
+        if span["text"].strip():
+            font = span.get("font", "")
+            counts[font] = counts.get(font, 0) + 1
+    if not counts:
         return ""
-    return Counter(fonts).most_common(1)[0][0]      
+    if len(counts) == 1:
+        return next(iter(counts))
+    return max(counts.items(), key=lambda item: item[1])[0]
 
-def _iter_lines(doc):
+def _page_lines(page, flags):
     """
-    Itera todas as linhas do PDF na ordem de leitura,
-    retornando tuplas (text, font).
+    Linhas (text, font) de uma página na ordem de leitura.
     """
-    for page in doc:
-        data = page.get_text("dict")
-        for block in data.get("blocks", []):
-            if "lines" not in block:
+    for block in page.get_text("dict", flags=flags)["blocks"]:
+        for line in block.get("lines", ()):
+            spansList = line["spans"]
+            text = "".join(span["text"] for span in spansList).strip()
+            if not text:
                 continue
-            for line in block["lines"]:
-                spansList = line.get("spans", [])
-                text = ""
-                for span in spansList:
-                    text += span.get("text", "")
-                text = text.strip()
-                if not text:
-                    continue
-                font = _dominant_font(spansList)
-                yield text, font
+            yield text, _dominant_font(spansList)
+
+def _text_flags():
+    import fitz
+
+    # sem imagens: o "dict" padrão inclui o conteúdo binário de cada imagem da página
+    return fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+def _extract_page_range(pdf_path: str, start: int, stop: int):
+    """
+    Tarefa do pool: abre o PDF no processo filho e devolve as linhas das páginas [start, stop).
+    """
+    import fitz
+
+    flags = _text_flags()
+    with fitz.open(pdf_path) as doc:
+        return [line for page_number in range(start, stop) for line in _page_lines(doc[page_number], flags)]
+
+def iter_pdf_lines(pdf_path: str, workers: int = PDF_WORKERS, pages_per_task: int = PDF_PAGES_PER_TASK):
+    """
+    Itera as linhas (text, font) do PDF em ordem. Com workers > 1 as faixas de
+    páginas são extraídas em paralelo e consumidas na ordem original.
+    """
+    import fitz
+
+    if workers <= 1:
+        flags = _text_flags()
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                yield from _page_lines(page, flags)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+    ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for lines in pool.map(
+            _extract_page_range,
+            [pdf_path] * len(ranges),
+            [start for start, _ in ranges],
+            [stop for _, stop in ranges],
+        ):
+            yield from lines
 
 def _is_black(font: str) -> bool:
     return font and BLACK_FONT.lower() in font.lower()
@@ -47,68 +92,84 @@ def _is_black(font: str) -> bool:
 def _is_semibold(font: str) -> bool:
     return font and SEMIBOLD_FONT.lower() in font.lower()
 
-def extract_sections_as_documents(pdf_path: str) -> List[Document]:
+def _section_document(pdf_path: str, title_parts, content_lines, keywords) -> Document:
+    title = " ".join(part.strip() for part in title_parts).strip()
+    keywords.add(title)
+    section_text = title + "\n\n" + "\n".join(content_lines).strip()
+    return Document(
+        page_content=section_text,
+        metadata={
+            "source": pdf_path,
+            "title": title,
+            "keywords": sorted(list(keywords)),
+        },
+    )
+
+def iter_sections_as_documents(pdf_path: str, workers: int = PDF_WORKERS) -> Iterator[Document]:
     """
-    Divide o PDF em seções:
+    Divide o PDF em seções, emitindo cada Document assim que a seção termina:
       - Seção começa em linha(s) com fonte MyriadPro-Black (título pode ter várias linhas seguidas).
       - Conteúdo vai até a próxima ocorrência de título (MyriadPro-Black) ou fim.
       - Keywords = subseções (MyriadPro-Semibold) encontradas dentro da seção + o próprio título.
-    Retorna uma lista de langchain.schema.Document.
+    Linhas antes do primeiro título são ignoradas.
     """
-    doc = fitz.open(pdf_path)
-    lines = list(_iter_lines(doc))
-    i = 0
-    number_of_lines = len(lines)
-    docs: List[Document] = []
-
-    while i < number_of_lines:
-        text, font = lines[i]
- 
+    title_parts = None
+    content_lines: List[str] = []
+    keywords = set()
+    in_title = False
+
+    for text, font in iter_pdf_lines(pdf_path, workers=workers):
         if _is_black(font):
-            title_parts = [text]
-            j = i + 1
-            while j < number_of_lines and _is_black(lines[j][1]):
-                title_parts.append(lines[j][0])
-                j += 1
-            title = " ".join(part.strip() for part in title_parts).strip()
-
-            content_lines = []
-            keywords = set()
-            keywords.add(title)
-
-            k = j
-            while k < number_of_lines and not _is_black(lines[k][1]):
-                line_text, line_font = lines[k]
-                if _is_semibold(line_font):
-                    keywords.add(line_text.strip())
-                content_lines.append(line_text)
-                k += 1
-
-            section_text = title + "\n\n" + "\n".join(content_lines).strip()
-            docs.append(
-                Document(
-                    page_content=section_text,
-                    metadata={
-                        "source": pdf_path,
-                        "title": title,
-                        "keywords": sorted(list(keywords)),
-                    },
-                )
-            )
-            i = k 
-        else:
-            i += 1
-
-    doc.close()
-    return docs
+            if not in_title:
+                if title_parts is not None:
+                    yield _section_document(pdf_path, title_parts, content_lines, keywords)
+                title_parts, content_lines, keywords = [], [], set()
+                in_title = True
+            title_parts.append(text)
+            continue
+        if title_parts is None:
+            continue
+        in_title = False
+        if _is_semibold(font):
+            keywords.add(text.strip())
+        content_lines.append(text)
+
+    if title_parts is not None:
+        yield _section_document(pdf_path, title_parts, content_lines, keywords)
+
+def extract_sections_as_documents(pdf_path: str) -> List[Document]:
+    """
+    Lista de langchain.schema.Document com as seções do PDF (ver iter_sections_as_documents).
+    """
+    return list(iter_sections_as_documents(pdf_path))
 
 def downloald_embeddings():
-    model_name = "BAAI/bge-small-en-v1.5"
-    embeddings = HuggingFaceEmbeddings(model_name=model_name, model_kwargs={"device": "cpu"})
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL, model_kwargs={"device": "cpu"})
     return embeddings
 
 def downloald_hugging_face_embeddings():
-    model_name = "BAAI/bge-small-en-v1.5"
-    embeddings = HuggingFaceEmbeddings(model_name=model_name, model_kwargs={"device": "cpu"})
-    return embeddings
+    """
+    EmbeddingService (lotes, cache em disco, micro-batching de consultas) configurado por ambiente:
+      EMBEDDINGS_RUNTIME       torch (padrão) | onnx | onnx-int8
+      EMBEDDINGS_ONNX_FILE     arquivo .onnx dentro do repositório do modelo (opcional)
+      EMBEDDINGS_BATCH_SIZE    textos por forward (padrão 32)
+      EMBEDDINGS_WORKERS       processos para indexação; 0 = só o processo atual
+      EMBEDDINGS_CACHE         caminho do cache SQLite dos documentos; vazio desliga
+      EMBEDDINGS_QUERY_CACHE   consultas guardadas em memória, nunca em disco (padrão 1024; 0 desliga)
+      EMBEDDINGS_MICROBATCH_MS janela para juntar consultas concorrentes (padrão 2; 0 desliga)
+    """
+    from src.embedding_service import EmbeddingService
+
+    return EmbeddingService(
+        EMBEDDING_MODEL,
+        runtime=os.getenv("EMBEDDINGS_RUNTIME", "torch"),
+        batch_size=int(os.getenv("EMBEDDINGS_BATCH_SIZE", "32")),
+        num_workers=int(os.getenv("EMBEDDINGS_WORKERS", "0")),
+        cache_path=os.getenv("EMBEDDINGS_CACHE", os.path.join("index", "embeddings_cache.sqlite")) or None,
+        micro_batch_ms=float(os.getenv("EMBEDDINGS_MICROBATCH_MS", "2")),
+        onnx_file=os.getenv("EMBEDDINGS_ONNX_FILE") or None,
+        query_cache_size=int(os.getenv("EMBEDDINGS_QUERY_CACHE", "1024")),
+    )
 
@@ -0,0 +1,110 @@
+# src/history.py
+import hashlib
+from typing import Iterable, List, Sequence, Set, Tuple
+
+from langchain_core.messages import BaseMessage, RemoveMessage, SystemMessage
+
+# aproximação usual para modelos OpenAI (~4 caracteres por token)
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    return len(str(getattr(message, "content", ""))) // CHARS_PER_TOKEN + 4
+
+
+def _system_prefix_len(messages: Sequence[BaseMessage]) -> int:
+    n = 0
+    while n < len(messages) and isinstance(messages[n], SystemMessage):
+        n += 1
+    return n
+
+
+def _round_up(value: int, step: int) -> int:
+    return -(-value // step) * step
+
+
+def window_messages(messages: Sequence[BaseMessage], max_tokens: int, step: int = 1) -> List[BaseMessage]:
+    """
+    Janela de histórico para o prompt: mantém as SystemMessages iniciais e as
+    mensagens mais recentes que cabem em max_tokens (a última mensagem, a
+    pergunta do aluno, entra sempre).
+
+    Com step > 1 o início da janela só anda em saltos de step mensagens:
+    o começo do prompt fica igual por vários turnos e o cache de prompt do
+    provedor continua acertando.
+    """
+    messages = list(messages)
+    prefix_len = _system_prefix_len(messages)
+    prefix, rest = messages[:prefix_len], messages[prefix_len:]
+    if not rest:
+        return prefix
+
+    budget = max_tokens - sum(estimate_tokens(m) for m in prefix)
+    window: List[BaseMessage] = [rest[-1]]
+    budget -= estimate_tokens(rest[-1])
+    for message in reversed(rest[:-1]):
+        cost = estimate_tokens(message)
+        if cost > budget:
+            break
+        window.append(message)
+        budget -= cost
+    window.reverse()
+    start = len(rest) - len(window)
+    if step > 1 and start:
+        start = min(_round_up(start, step), len(rest) - 1)
+    return prefix + rest[start:]
+
+
+def prune_history(messages: Sequence[BaseMessage], max_messages: int, step: int = 1) -> List[RemoveMessage]:
+    """
+    Remoções (add_messages + RemoveMessage) que limitam o histórico salvo no
+    checkpoint a max_messages mensagens além das SystemMessages iniciais.
+    Com step > 1 remove em blocos de step mensagens (mesmo motivo de window_messages).
+    """
+    messages = list(messages)
+    prefix_len = _system_prefix_len(messages)
+    rest = messages[prefix_len:]
+    excess = len(rest) - max_messages if max_messages > 0 else 0
+    if excess <= 0:
+        return []
+    stale = rest[:min(_round_up(excess, step), len(rest))]
+    return [RemoveMessage(id=m.id) for m in stale if m.id]
+
+
+# -------------------- contexto recuperado --------------------
+def chunk_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def shown_context_keys(messages: Iterable[BaseMessage]) -> Set[str]:
+    """
+    Trechos já presentes nas mensagens de contexto do histórico visível.
+    """
+    keys: Set[str] = set()
+    for message in messages:
+        keys.update(message.additional_kwargs.get("context_keys") or ())
+    return keys
+
+
+def pack_context(chunks: Sequence[str], max_tokens: int, shown: Set[str] = frozenset()) -> Tuple[List[str], List[str]]:
+    """
+    Seleciona, na ordem do retrieve, os trechos que ainda não estão no
+    histórico e cabem em max_tokens; o primeiro que não couber é cortado.
+    Retorna (trechos, chaves dos trechos enviados por inteiro).
+    """
+    packed, keys = [], []
+    budget = max_tokens
+    for chunk in chunks:
+        key = chunk_key(chunk)
+        if key in shown or key in keys:
+            continue
+        cost = len(chunk) // CHARS_PER_TOKEN + 1
+        if cost > budget:
+            if budget * CHARS_PER_TOKEN >= 256:
+                # cortado não conta como mostrado: volta inteiro num próximo turno
+                packed.append(chunk[:budget * CHARS_PER_TOKEN])
+            break
+        packed.append(chunk)
+        keys.append(key)
+        budget -= cost
+    return packed, keys
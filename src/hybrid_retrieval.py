@@ -0,0 +1,189 @@
+# src/hybrid_retrieval.py
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# reranker multilíngue pequeno (MiniLM, ~120 MB), roda em CPU
+DEFAULT_RERANKER = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+STOPWORDS = frozenset(
+    "a o as os um uma uns umas de do da dos das em no na nos nas por pelo pela pelos pelas para com sem "
+    "e ou que se ao aos como mais menos mas ja nao sim sao ser esta este essa esse isso isto qual quais "
+    "sobre entre tambem muito muita seu sua seus suas ele ela eles elas the of and to in is".split()
+)
+
+# <thead>, </ol>, < !DOCTYPE html > viram também o token "<thead>", "<ol>", "<!doctype>"
+_TAG_RE = re.compile(r"<\s*/?\s*(!?[a-zA-Z][a-zA-Z0-9]*)")
+_WORD_RE = re.compile(r"\w+")
+
+
+def _fold(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokens para o BM25: palavras sem acento e em minúsculas (stopwords fora)
+    mais um token por tag HTML citada, para que "<ol>" não se perca.
+    """
+    tokens = [f"<{tag.lower()}>" for tag in _TAG_RE.findall(text)]
+    tokens.extend(w for w in _WORD_RE.findall(_fold(text)) if w not in STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """
+    Índice invertido em memória com ranking BM25 sobre o texto das seções e
+    as keywords dos metadados (peso keyword_boost). As posições são as mesmas
+    dos documentos recebidos, alinhadas com o LocalVectorIndex.
+    """
+
+    def __init__(self, documents: Sequence[Document], k1: float = 1.5, b: float = 0.75, keyword_boost: int = 2) -> None:
+        self.k1 = k1
+        self.b = b
+        postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        lengths = []
+        for pos, doc in enumerate(documents):
+            tokens = tokenize(doc.page_content)
+            for keyword in (doc.metadata or {}).get("keywords") or []:
+                tokens.extend(tokenize(str(keyword)) * keyword_boost)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings[term][pos] = tf
+
+        self.size = len(lengths)
+        doc_lengths = np.asarray(lengths, dtype=np.float32)
+        avg_length = float(doc_lengths.mean()) if self.size else 0.0
+        self._norm = k1 * (1 - b + b * doc_lengths / (avg_length or 1.0))
+        self._postings = {
+            term: (np.fromiter(p.keys(), dtype=np.int32), np.fromiter(p.values(), dtype=np.float32))
+            for term, p in postings.items()
+        }
+        self._idf = {
+            term: math.log(1 + (self.size - len(p) + 0.5) / (len(p) + 0.5)) for term, p in postings.items()
+        }
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        if not self.size:
+            return []
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            entry = self._postings.get(term)
+            if entry is None:
+                continue
+            positions, tf = entry
+            scores[positions] += self._idf[term] * tf * (self.k1 + 1) / (tf + self._norm[positions])
+        candidates = np.flatnonzero(scores)
+        if not len(candidates):
+            return []
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(int(i), float(scores[i])) for i in candidates]
+
+
+def reciprocal_rank_fusion(
+    rankings: Iterable[Sequence[int]], k: int = 60, weights: Optional[Sequence[float]] = None
+) -> List[Tuple[int, float]]:
+    """
+    RRF: score(d) = soma de peso / (k + posição de d em cada ranking).
+    """
+    scores: Dict[int, float] = {}
+    for i, ranking in enumerate(rankings):
+        weight = weights[i] if weights else 1.0
+        for rank, pos in enumerate(ranking):
+            scores[pos] = scores.get(pos, 0.0) + weight / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+class CrossEncoderReranker:
+    """
+    Reordena (pergunta, trecho) com um cross-encoder local do sentence-transformers.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_RERANKER, max_length: int = 512) -> None:
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, device="cpu", max_length=max_length)
+
+    def score(self, query: str, documents: Sequence[Document]) -> List[float]:
+        if not documents:
+            return []
+        return [float(s) for s in self.model.predict([(query, d.page_content) for d in documents])]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Busca densa (LocalVectorIndex) + BM25 fundidas por RRF; opcionalmente
+    o top rerank_top_n passa por um cross-encoder antes de cortar em k.
+    """
+
+    index: Any
+    lexical: Any
+    embeddings: Any
+    k: int = 2
+    candidates: int = 20
+    rrf_k: int = 60
+    reranker: Any = None
+    rerank_top_n: int = 10
+
+    def ranked_candidates(self, query: str, query_vector: Optional[Sequence[float]] = None) -> List[int]:
+        """
+        Posições de todos os candidatos em ordem final (sem o corte em k):
+        o top rerank_top_n reordenado pelo cross-encoder e o resto da fusão.
+        query_vector evita recalcular o embedding da pergunta (lotes).
+        """
+        if query_vector is None:
+            query_vector = self.embeddings.embed_query(query)
+        dense = self.index.search(query_vector, k=self.candidates)
+        lexical = self.lexical.search(query, k=self.candidates)
+        fused = [pos for pos, _ in reciprocal_rank_fusion([[p for p, _ in dense], [p for p, _ in lexical]], k=self.rrf_k)]
+        if self.reranker is None:
+            return fused
+        head = fused[:self.rerank_top_n]
+        scores = self.reranker.score(query, [self.index.documents[p] for p in head])
+        reranked = [pos for _, pos in sorted(zip(scores, head), key=lambda item: -item[0])]
+        return reranked + fused[self.rerank_top_n:]
+
+    def rank(self, query: str) -> List[int]:
+        """
+        Posições dos documentos em ordem final (já cortada em k).
+        """
+        return self.ranked_candidates(query)[:self.k]
+
+    def candidate_documents(self, query: str, query_vector: Optional[Sequence[float]] = None) -> List[Document]:
+        # para reordenar por aluno (src/student_profiles.py) antes do corte em k
+        return [self.index.documents[pos] for pos in self.ranked_candidates(query, query_vector)]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return [self.index.documents[pos] for pos in self.rank(query)]
+
+
+def build_hybrid_retriever(
+    local_index: Any,
+    embeddings: Any,
+    k: int = 2,
+    candidates: int = 20,
+    reranker_model: Optional[str] = None,
+    rerank_top_n: int = 10,
+) -> HybridRetriever:
+    return HybridRetriever(
+        index=local_index,
+        lexical=BM25Index(local_index.documents),
+        embeddings=embeddings,
+        k=k,
+        candidates=candidates,
+        reranker=CrossEncoderReranker(reranker_model) if reranker_model else None,
+        rerank_top_n=rerank_top_n,
+    )
@@ -0,0 +1,266 @@
+# src/indexing.py
+"""
+Indexação incremental das seções extraídas das fontes (PDFs e demais formatos de src.ingest).
+
+O manifesto (manifest.json, ao lado do índice local) guarda o hash de cada
+arquivo-fonte e os ids/hashes das seções que ele gerou. Numa nova execução:
+  - arquivos com o mesmo hash nem são reabertos;
+  - seções novas ou com conteúdo alterado são embedadas e enviadas (upsert);
+  - seções que sumiram são apagadas do índice.
+Os ids são estáveis (arquivo + título + ordem do título no arquivo), então
+repetir a indexação é idempotente. O manifesto também guarda index_version,
+um hash do conteúdo indexado que o servidor usa no fingerprint do cache de
+respostas (read_index_version).
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+SOURCE_EXTENSIONS = (".pdf",)
+
+
+def _sha256(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def section_hash(doc: Document) -> str:
+    """
+    Hash do que vai para o índice: texto e metadados da seção.
+    """
+    return _sha256(doc.page_content, json.dumps(doc.metadata, sort_keys=True, ensure_ascii=False))
+
+
+def section_ids(source: str, docs: Sequence[Document]) -> List[str]:
+    """
+    Ids estáveis: não dependem do conteúdo, para que uma seção editada
+    substitua a versão anterior em vez de duplicar.
+    """
+    seen: Dict[str, int] = {}
+    ids = []
+    for doc in docs:
+        title = str(doc.metadata.get("title", ""))
+        ordinal = seen.get(title, 0)
+        seen[title] = ordinal + 1
+        ids.append(_sha256(source, title, str(ordinal))[:32])
+    return ids
+
+
+def source_key(path: str) -> str:
+    """
+    Forma canônica de um caminho de fonte (chave do manifesto e base dos ids):
+    relativa ao diretório atual, então "resources/x.pdf", "./resources/x.pdf"
+    e o caminho absoluto dão a mesma chave.
+    """
+    return os.path.relpath(os.path.abspath(path))
+
+
+def under_roots(path: str, roots: Iterable[str]) -> bool:
+    """
+    O arquivo está num dos caminhos (arquivos ou diretórios) de roots?
+    """
+    key = source_key(path)
+    return any(
+        root == os.curdir or key == root or key.startswith(root + os.sep) for root in map(source_key, roots)
+    )
+
+
+def iter_source_files(paths: Iterable[str], extensions: Sequence[str] = SOURCE_EXTENSIONS) -> List[str]:
+    """
+    Expande arquivos e diretórios (recursivamente) em uma lista ordenada de
+    arquivos-fonte, com os caminhos em source_key.
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.update(
+                    source_key(os.path.join(root, name))
+                    for name in names
+                    if name.lower().endswith(tuple(extensions))
+                )
+        elif os.path.isfile(path):
+            files.add(source_key(path))
+        else:
+            raise FileNotFoundError(f"Fonte não encontrada: {path}")
+    return sorted(files)
+
+
+def load_manifest(directory: str) -> Dict[str, Any]:
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"version": MANIFEST_VERSION, "files": {}}
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "files": {}}
+    return manifest
+
+
+def index_version(manifest: Dict[str, Any]) -> str:
+    """
+    Hash das seções indexadas (ids e conteúdo) e do modelo de embeddings: muda sempre que o índice muda.
+    """
+    sections = sorted(
+        f"{doc_id}:{digest}" for entry in manifest.get("files", {}).values() for doc_id, digest in entry["sections"].items()
+    )
+    return _sha256(str(manifest.get("embedding_model", "")), *sections)[:16]
+
+
+# caminho do manifesto -> (mtime, index_version)
+_versions: Dict[str, Tuple[int, str]] = {}
+
+
+def read_index_version(directory: str) -> str:
+    """
+    index_version do manifesto do índice; relido só quando o arquivo muda
+    (o store_index.py pode rodar com o servidor no ar). "0" sem manifesto.
+    """
+    path = os.path.join(directory, MANIFEST_FILE)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return "0"
+    cached = _versions.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    manifest = load_manifest(directory)
+    # manifestos anteriores ao index_version: calculado na hora
+    version = manifest.get("index_version") or index_version(manifest)
+    _versions[path] = (mtime, version)
+    return version
+
+
+def save_manifest(directory: str, manifest: Dict[str, Any]) -> None:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, MANIFEST_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+class IndexPlan:
+    """
+    Resultado da comparação entre as fontes atuais e o manifesto.
+    """
+
+    def __init__(self) -> None:
+        self.upsert_ids: List[str] = []
+        self.upsert_docs: List[Document] = []
+        self.delete_ids: List[str] = []
+        self.unchanged = 0
+        self.parsed_files: List[str] = []
+        self.skipped_files: List[str] = []
+        self.files: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.upsert_ids or self.delete_ids)
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "files": len(self.files),
+            "parsed_files": len(self.parsed_files),
+            "skipped_files": len(self.skipped_files),
+            "upsert": len(self.upsert_ids),
+            "delete": len(self.delete_ids),
+            "unchanged": self.unchanged,
+        }
+
+
+def plan_update(
+    paths: Iterable[str],
+    manifest: Dict[str, Any],
+    extract: Callable[[str], Optional[List[Document]]],
+    force: bool = False,
+    extensions: Sequence[str] = SOURCE_EXTENSIONS,
+    max_workers: int = 1,
+) -> IndexPlan:
+    """
+    Decide o que reembedar e o que apagar. Com force=True todas as seções
+    atuais vão para upsert (troca de modelo de embeddings, índice perdido),
+    mas as removidas continuam sendo apagadas.
+
+    Os arquivos alterados são lidos por extract em até max_workers threads;
+    o plano sai na ordem dos arquivos, independente de quem terminar primeiro.
+    Se extract retorna None (arquivo pulado), o arquivo fica como estava no
+    manifesto: nada é apagado e ele é lido de novo na próxima execução.
+
+    paths pode ser só parte das fontes: apagar, só o que sumiu ou mudou
+    debaixo deles; os outros arquivos do manifesto continuam no plano. Com
+    force=True os arquivos do manifesto fora de paths também são relidos
+    (o índice é refeito do zero).
+    """
+    plan = IndexPlan()
+    old_files = {source_key(path): entry for path, entry in manifest.get("files", {}).items()}
+    paths = list(paths)
+    files = iter_source_files(paths, extensions)
+    if force:
+        files = sorted(set(files).union(
+            path for path in old_files if path.lower().endswith(tuple(extensions)) and os.path.isfile(path)
+        ))
+
+    to_parse = []
+    for path in files:
+        digest = file_sha256(path)
+        old = old_files.get(path)
+        if not force and old and old.get("sha256") == digest:
+            plan.files[path] = old
+            plan.unchanged += len(old.get("sections", {}))
+            continue
+        to_parse.append((path, digest))
+
+    if max_workers > 1 and len(to_parse) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            parsed = list(pool.map(extract, [path for path, _ in to_parse]))
+    else:
+        parsed = [extract(path) for path, _ in to_parse]
+
+    for (path, digest), docs in zip(to_parse, parsed):
+        if docs is None:
+            plan.skipped_files.append(path)
+            if path in old_files:
+                plan.files[path] = old_files[path]
+                plan.unchanged += len(old_files[path].get("sections", {}))
+            continue
+        plan.parsed_files.append(path)
+        old_sections = (old_files.get(path) or {}).get("sections", {})
+        sections = {}
+        for doc_id, doc in zip(section_ids(path, docs), docs):
+            digest_section = section_hash(doc)
+            sections[doc_id] = digest_section
+            if not force and old_sections.get(doc_id) == digest_section:
+                plan.unchanged += 1
+                continue
+            plan.upsert_ids.append(doc_id)
+            plan.upsert_docs.append(doc)
+        plan.files[path] = {"sha256": digest, "sections": sections}
+
+    if not force:
+        for path, entry in old_files.items():
+            in_scope = path.lower().endswith(tuple(extensions)) and under_roots(path, paths)
+            if path not in plan.files and not in_scope:
+                plan.files[path] = entry
+
+    current = {doc_id for entry in plan.files.values() for doc_id in entry["sections"]}
+    for entry in old_files.values():
+        plan.delete_ids.extend(doc_id for doc_id in entry.get("sections", {}) if doc_id not in current)
+    return plan
@@ -0,0 +1,205 @@
+# src/ingest.py
+"""
+Loaders por formato para a indexação (store_index.py).
+
+Cada loader recebe o caminho de um arquivo e gera Documents com metadados
+"source", "title" e "keywords" (o mesmo formato de extract_sections_as_documents),
+mais campos próprios do formato. Novos formatos entram com @register_loader.
+"""
+import html
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from src.helper import iter_sections_as_documents
+
+LoaderFn = Callable[[str], Iterator[Document]]
+
+# extensão -> (nome do loader, função)
+LOADERS: Dict[str, Tuple[str, LoaderFn]] = {}
+
+
+class LoaderUnavailable(RuntimeError):
+    """
+    Dependência opcional do loader ausente (ex.: OCR sem pytesseract/Pillow).
+    """
+
+
+def register_loader(name: str, extensions: Sequence[str]):
+    def decorator(fn: LoaderFn) -> LoaderFn:
+        for ext in extensions:
+            LOADERS[ext.lower()] = (name, fn)
+        return fn
+    return decorator
+
+
+def loader_for(path: str) -> Tuple[str, LoaderFn]:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in LOADERS:
+        raise ValueError(f"Nenhum loader para arquivos {ext!r}: {path}")
+    return LOADERS[ext]
+
+
+def supported_extensions() -> Tuple[str, ...]:
+    return tuple(sorted(LOADERS))
+
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def html_to_text(value: str) -> str:
+    return _SPACE_RE.sub(" ", html.unescape(_TAG_RE.sub(" ", value or ""))).strip()
+
+
+# -------------------- loaders --------------------
+@register_loader("pdf", (".pdf",))
+def load_pdf(path: str) -> Iterator[Document]:
+    return iter_sections_as_documents(path)
+
+
+@register_loader("exercises", (".json",))
+def load_exercises(path: str) -> Iterator[Document]:
+    """
+    Exercícios no formato da plataforma (Exercícios.json): um Document por
+    questão (enunciado) e um por alternativa (enunciado + alternativa +
+    correção + comentário), para que a busca encontre tanto a pergunta
+    quanto a explicação de cada opção.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    exercises = data if isinstance(data, list) else [data]
+
+    for exercise in exercises:
+        name = str(exercise.get("name") or exercise.get("title") or os.path.basename(path))
+        subjects = sorted({
+            str(tag[key]["name"])
+            for tag in exercise.get("tags") or []
+            for key in ("subject", "course")
+            if isinstance(tag.get(key), dict) and tag[key].get("name")
+        })
+        base = {
+            "source": path,
+            "exercise_id": str(exercise.get("external_id") or ""),
+            "topic_id": str(exercise.get("external_topicId") or ""),
+            "subjects": subjects,
+        }
+
+        for question in exercise.get("content") or []:
+            q_title = f"{name} — {question.get('title', 'Questão')}"
+            statement = html_to_text((question.get("content") or {}).get("html", ""))
+            if not statement:
+                continue
+            keywords = sorted({name, *subjects})
+            question_meta = {**base, "question_id": str(question.get("external_questionId") or "")}
+            yield Document(
+                page_content=f"{q_title}\n\n{statement}",
+                metadata={**question_meta, "type": "exercise_question", "title": q_title, "keywords": keywords},
+            )
+
+            options = (question.get("content") or {}).get("options") or []
+            for number, option in enumerate(sorted(options, key=lambda o: o.get("position", 0)), start=1):
+                text = html_to_text((option.get("content") or {}).get("html", ""))
+                feedback = html_to_text((option.get("feedback") or {}).get("html", ""))
+                correct = bool(option.get("correct"))
+                o_title = f"{q_title}, alternativa {number}"
+                body = [
+                    o_title,
+                    "",
+                    f"Enunciado: {statement}",
+                    f"Alternativa: {text}",
+                    "Correta." if correct else "Incorreta.",
+                ]
+                if feedback:
+                    body.append(f"Comentário: {feedback}")
+                yield Document(
+                    page_content="\n".join(body),
+                    metadata={
+                        **question_meta,
+                        "type": "exercise_option",
+                        "title": o_title,
+                        "keywords": keywords,
+                        "option": number,
+                        "correct": correct,
+                    },
+                )
+
+
+@register_loader("text", (".txt", ".md"))
+def load_text(path: str) -> Iterator[Document]:
+    with open(path, encoding="utf-8") as f:
+        content = f.read().strip()
+    if content:
+        title = os.path.splitext(os.path.basename(path))[0]
+        yield Document(
+            page_content=f"{title}\n\n{content}",
+            metadata={"source": path, "type": "text", "title": title, "keywords": [title]},
+        )
+
+
+@register_loader("image_ocr", (".jpg", ".jpeg", ".png"))
+def load_image(path: str) -> Iterator[Document]:
+    """
+    OCR local com Tesseract (pytesseract + binário tesseract com o idioma "por").
+    Opcional: sem as dependências a imagem é pulada (ver Ingestor.load).
+    """
+    try:
+        import pytesseract
+        from PIL import Image
+    except ImportError as e:
+        raise LoaderUnavailable(f"OCR indisponível ({e.name} não instalado; pip install pytesseract Pillow)") from e
+
+    with Image.open(path) as image:
+        text = pytesseract.image_to_string(image, lang=os.getenv("OCR_LANG", "por"))
+    text = "\n".join(line.strip() for line in text.splitlines() if line.strip())
+    if text:
+        title = os.path.splitext(os.path.basename(path))[0]
+        yield Document(
+            page_content=f"{title}\n\n{text}",
+            metadata={"source": path, "type": "image_ocr", "title": title, "keywords": [title]},
+        )
+
+
+# -------------------- execução com métricas --------------------
+class Ingestor:
+    """
+    Executa o loader de cada arquivo e acumula, por loader, arquivos,
+    documentos e tempo gasto. load() é thread-safe: plan_update chama em paralelo.
+    Um arquivo que falha (dependência opcional ausente, arquivo corrompido) é
+    pulado com um aviso e load() retorna None; os demais seguem.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def load(self, path: str) -> Optional[List[Document]]:
+        name, fn = loader_for(path)
+        start = time.perf_counter()
+        try:
+            docs = list(fn(path))
+        except Exception as e:
+            print(f"Aviso: {path} ignorado pelo loader {name}: {e}")
+            docs = None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            stats = self._stats.setdefault(name, {"files": 0, "documents": 0, "seconds": 0.0, "skipped": 0})
+            if docs is None:
+                stats["skipped"] += 1
+                return None
+            stats["files"] += 1
+            stats["documents"] += len(docs)
+            stats["seconds"] += elapsed
+        return docs
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {**stats, "docs_per_s": stats["documents"] / stats["seconds"] if stats["seconds"] else 0.0}
+                for name, stats in self._stats.items()
+            }
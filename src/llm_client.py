@@ -0,0 +1,415 @@
+# src/llm_client.py
+"""
+Camada de chamadas ao LLM usada pelos nós do grafo (classify,
+answer_with_context, answer_direct):
+
+  - prazo por nó (deadline): tempo total da chamada, somando tentativas;
+  - novas tentativas com backoff exponencial e jitter ("full jitter") para
+    erros transitórios (timeout, conexão, 429, 5xx);
+  - hedging: se a resposta demora mais que o p95 recente do nó, uma cópia da
+    requisição é disparada e vale a que chegar primeiro. No assíncrono a
+    perdedora é cancelada; no síncrono ela só sai da fila se ainda não
+    começou, senão termina em segundo plano (sem hedge com o pool cheio);
+  - circuit breaker: depois de N chamadas seguidas que falharam (esgotadas as
+    tentativas) as chamadas falham na hora (LLMUnavailable) por reset_timeout
+    segundos; depois, uma chamada de teste decide se o circuito fecha de novo.
+
+Quem chama trata LLMUnavailable com uma resposta degradada (ver graphChat).
+
+Streaming: a primeira tentativa roda no contexto do nó, então os tokens
+chegam ao graph.stream(stream_mode="messages") como antes. Cópias do hedge
+rodam num contexto vazio (não aparecem no stream). Nos nós transmitidos ao
+aluno (streamed_nodes, durante agentic_reply_stream) não há hedge e as novas
+tentativas também ficam fora do stream, para não misturar duas respostas
+na tela; o texto final vem do checkpoint.
+"""
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
+
+from src.metrics import registry
+
+LLM_ATTEMPTS = registry.counter(
+    "tutor_llm_attempts_total", "Tentativas de chamada ao LLM por resultado.", ("node", "outcome")
+)
+LLM_HEDGES = registry.counter("tutor_llm_hedges_total", "Requisições duplicadas (hedge) disparadas e vencedoras.", ("node", "result"))
+LLM_UNAVAILABLE = registry.counter(
+    "tutor_llm_unavailable_total", "Chamadas ao LLM que terminaram sem resposta (resposta degradada).", ("node", "reason")
+)
+
+# True enquanto os tokens do turno vão para o aluno (agentic_reply_stream/astream)
+streaming = contextvars.ContextVar("llm_streaming", default=False)
+
+
+class LLMUnavailable(RuntimeError):
+    """
+    O LLM não respondeu dentro do prazo/tentativas ou o circuito está aberto.
+    reason: "circuit_open", "deadline" ou "error".
+    """
+
+    def __init__(self, node: str, reason: str, cause: Optional[BaseException] = None) -> None:
+        super().__init__(f"LLM indisponível em {node}: {reason}" + (f" ({cause!r})" if cause else ""))
+        self.node = node
+        self.reason = reason
+        self.cause = cause
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Erros transitórios do provedor. Erros do nosso lado (prompt inválido,
+    chave errada: 400/401/403/404) não melhoram tentando de novo.
+    """
+    status = _status_code(exc)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    return not isinstance(exc, (ValueError, TypeError, KeyError, AttributeError))
+
+
+class CircuitBreaker:
+    """
+    closed -> open depois de failure_threshold falhas seguidas (o ResilientLLM
+    registra uma por chamada, não por tentativa); open -> half_open depois de
+    reset_timeout segundos (uma chamada de teste por vez); half_open -> closed
+    no primeiro sucesso ou -> open de novo na primeira falha.
+    Uma chamada de teste que termina sem nenhum dos dois (cancelada, erro do
+    nosso lado) devolve a vaga com release_probe.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Optional[str]:
+        """
+        "closed" (chamada normal), "probe" (a chamada de teste do half_open) ou None (recusada).
+        """
+        with self._lock:
+            if self.state == "closed":
+                return "closed"
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return "probe"
+            return None
+
+    def allow(self) -> bool:
+        return self.acquire() is not None
+
+    def release_probe(self) -> None:
+        with self._lock:
+            if self.state == "half_open":
+                self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.trips += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "trips": self.trips}
+
+
+class LatencyWindow:
+    """
+    Últimas latências de sucesso de um nó, para o atraso do hedge (p95).
+    """
+
+    def __init__(self, size: int = 200) -> None:
+        self._samples: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 20) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResilientLLM:
+    """
+    Envolve o chat model (get_llm: função que o retorna, para a troca via
+    set_resource continuar valendo) com prazo, retries, hedging e breaker.
+    deadlines: {nó: segundos}; nós sem entrada usam default_deadline.
+    streamed_nodes: nós cujos tokens vão para o aluno quando streaming está ligado.
+    """
+
+    def __init__(
+        self,
+        get_llm: Callable[[], Any],
+        deadlines: Optional[Dict[str, float]] = None,
+        default_deadline: float = 30.0,
+        retries: int = 2,
+        backoff: float = 0.25,
+        max_backoff: float = 4.0,
+        hedge: bool = True,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay: float = 0.05,
+        breaker: Optional[CircuitBreaker] = None,
+        streamed_nodes: Iterable[str] = (),
+        max_workers: int = 64,
+    ) -> None:
+        self.get_llm = get_llm
+        self.deadlines = dict(deadlines or {})
+        self.default_deadline = default_deadline
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.streamed_nodes = frozenset(streamed_nodes)
+        self._latency: Dict[str, LatencyWindow] = {}
+        self._latency_lock = threading.Lock()
+        # no síncrono uma thread não pode ser interrompida: a tentativa abandonada
+        # (prazo/hedge perdedor) que já começou roda até o fim aqui, limitada pelo
+        # timeout da requisição do provedor, e o resultado é descartado
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-call")
+        self._max_workers = max_workers
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+
+    # ---------- políticas ----------
+    def deadline(self, node: str) -> float:
+        return self.deadlines.get(node, self.default_deadline)
+
+    def _window(self, node: str) -> LatencyWindow:
+        with self._latency_lock:
+            return self._latency.setdefault(node, LatencyWindow())
+
+    def _streamed(self, node: str) -> bool:
+        return node in self.streamed_nodes and streaming.get()
+
+    def hedge_delay(self, node: str) -> Optional[float]:
+        """
+        Atraso até a cópia da requisição: o p95 recente do nó (None = sem hedge).
+        """
+        if not self.hedge or self._streamed(node):
+            return None
+        p = self._window(node).quantile(self.hedge_quantile)
+        return None if p is None else max(self.hedge_min_delay, p)
+
+    def _sleep_for(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _timed(self, node: str, fn: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        result = fn()
+        # toda resposta que chega (mesmo de tentativa abandonada) alimenta o p95
+        self._window(node).add(time.perf_counter() - start)
+        return result
+
+    def _failed(self, node: str, exc: BaseException, attempt: int, deadline: float) -> Optional[float]:
+        """
+        Registra a falha de uma tentativa; retorna a espera até a próxima ou None para desistir.
+        """
+        timeout = isinstance(exc, TimeoutError)
+        retryable = timeout or is_retryable(exc)
+        LLM_ATTEMPTS.inc(node=node, outcome="timeout" if timeout else "error")
+        pause = None
+        if retryable and not timeout and attempt < self.retries:
+            pause = self._sleep_for(attempt)
+            if time.monotonic() + pause >= deadline or not self.breaker.allow():
+                pause = None
+        # o circuito conta chamadas, não tentativas: uma falha quando a chamada
+        # desiste. Só falhas do provedor/transporte contam; um prompt ou chave
+        # inválidos (400/401/422) não podem derrubar o LLM para todos os alunos
+        if pause is None and retryable:
+            self.breaker.record_failure()
+        return pause
+
+    @staticmethod
+    def _unavailable(node: str, exc: BaseException) -> LLMUnavailable:
+        reason = "deadline" if isinstance(exc, TimeoutError) else "error"
+        LLM_UNAVAILABLE.inc(node=node, reason=reason)
+        return LLMUnavailable(node, reason, exc)
+
+    def _refuse(self, node: str) -> LLMUnavailable:
+        LLM_UNAVAILABLE.inc(node=node, reason="circuit_open")
+        return LLMUnavailable(node, "circuit_open")
+
+    # ---------- síncrono ----------
+    def invoke(self, node: str, messages: Sequence[Any]) -> Any:
+        admitted = self.breaker.acquire()
+        if admitted is None:
+            raise self._refuse(node)
+        try:
+            deadline = time.monotonic() + self.deadline(node)
+            attempt = 0
+            while True:
+                try:
+                    resp = self._attempt(node, messages, deadline, visible=attempt == 0 or not self._streamed(node))
+                except Exception as e:
+                    pause = self._failed(node, e, attempt, deadline)
+                    if pause is None:
+                        raise self._unavailable(node, e) from e
+                    time.sleep(pause)
+                    attempt += 1
+                    continue
+                LLM_ATTEMPTS.inc(node=node, outcome="ok")
+                self.breaker.record_success()
+                return resp
+        finally:
+            # chamada de teste interrompida sem sucesso nem falha: libera a próxima
+            if admitted == "probe":
+                self.breaker.release_probe()
+
+    def _submit(self, context: contextvars.Context, call: Callable[[], Any]):
+        with self._busy_lock:
+            self._busy += 1
+        future = self._pool.submit(context.run, call)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, _future) -> None:
+        with self._busy_lock:
+            self._busy -= 1
+
+    def _saturated(self) -> bool:
+        # com metade das threads ocupadas (muitas tentativas abandonadas) não há hedge:
+        # a cópia só aumentaria a fila na frente das próximas chamadas
+        with self._busy_lock:
+            return self._busy >= self._max_workers // 2
+
+    def _attempt(self, node: str, messages: Sequence[Any], deadline: float, visible: bool = True) -> Any:
+        llm = self.get_llm()
+        call = lambda: self._timed(node, lambda: llm.invoke(messages))
+        # a tentativa principal herda o contexto do nó (callbacks do LangGraph: streaming e traces)
+        context = contextvars.copy_context() if visible else contextvars.Context()
+        primary = self._submit(context, call)
+        pending = {primary}
+        try:
+            hedge_at = self.hedge_delay(node)
+            if hedge_at is not None and time.monotonic() + hedge_at < deadline:
+                done, _ = wait(pending, timeout=hedge_at)
+                if not done and not self._saturated():
+                    pending.add(self._submit(contextvars.Context(), call))
+                    LLM_HEDGES.inc(node=node, result="fired")
+
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError(f"{node}: prazo de {self.deadline(node):.1f}s esgotado")
+                for future in done:
+                    if future.exception() is None:
+                        if future is not primary:
+                            LLM_HEDGES.inc(node=node, result="won")
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            # só sai da fila o que ainda não começou; o que já roda termina sozinho
+            for future in pending:
+                future.cancel()
+
+    # ---------- assíncrono ----------
+    async def ainvoke(self, node: str, messages: Sequence[Any]) -> Any:
+        admitted = self.breaker.acquire()
+        if admitted is None:
+            raise self._refuse(node)
+        try:
+            deadline = time.monotonic() + self.deadline(node)
+            attempt = 0
+            while True:
+                try:
+                    resp = await self._aattempt(node, messages, deadline, visible=attempt == 0 or not self._streamed(node))
+                except Exception as e:
+                    pause = self._failed(node, e, attempt, deadline)
+                    if pause is None:
+                        raise self._unavailable(node, e) from e
+                    await asyncio.sleep(pause)
+                    attempt += 1
+                    continue
+                LLM_ATTEMPTS.inc(node=node, outcome="ok")
+                self.breaker.record_success()
+                return resp
+        finally:
+            # CancelledError (aluno desconectou, hedge perdedor, prazo) não passa pelos registros acima
+            if admitted == "probe":
+                self.breaker.release_probe()
+
+    async def _acall(self, node: str, llm: Any, messages: Sequence[Any]) -> Any:
+        start = time.perf_counter()
+        resp = await llm.ainvoke(messages)
+        self._window(node).add(time.perf_counter() - start)
+        return resp
+
+    async def _aattempt(self, node: str, messages: Sequence[Any], deadline: float, visible: bool = True) -> Any:
+        llm = self.get_llm()
+        # a task copia o contexto atual: criada dentro de um contexto vazio, fica fora do stream
+        context = contextvars.copy_context() if visible else contextvars.Context()
+        primary = context.run(asyncio.ensure_future, self._acall(node, llm, messages))
+        pending = {primary}
+        try:
+            hedge_at = self.hedge_delay(node)
+            if hedge_at is not None and time.monotonic() + hedge_at < deadline:
+                done, _ = await asyncio.wait(pending, timeout=hedge_at)
+                if not done:
+                    pending.add(contextvars.Context().run(asyncio.ensure_future, self._acall(node, llm, messages)))
+                    LLM_HEDGES.inc(node=node, result="fired")
+
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise TimeoutError(f"{node}: prazo de {self.deadline(node):.1f}s esgotado")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            LLM_HEDGES.inc(node=node, result="won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # no assíncrono a perdedora pode ser cancelada de verdade
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._latency_lock:
+            nodes = list(self._latency)
+        return {
+            "breaker": self.breaker.stats(),
+            "hedge_delay_s": {node: self.hedge_delay(node) for node in nodes},
+        }
+
@@ -0,0 +1,262 @@
+# src/metrics.py
+"""
+Métricas em memória (histogramas e contadores) expostas no formato texto do
+Prometheus pela rota /metrics. p50/p95/p99 por estágio saem de
+histogram_quantile() sobre tutor_stage_seconds.
+"""
+import asyncio
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            # [contagem por bucket..., +Inf, soma]
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def series(self) -> Dict[Tuple[str, ...], Dict[str, float]]:
+        """
+        {valores dos labels: {"count", "sum"}} de cada série.
+        """
+        with self._lock:
+            return {k: {"count": v[-2], "sum": v[-1]} for k, v in self._series.items()}
+
+    def quantile(self, q: float, **labels: Any) -> Optional[float]:
+        """
+        Estimativa do quantil q pela interpolação linear nos buckets
+        (mesma conta do histogram_quantile do Prometheus).
+        """
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            series = list(self._series.get(key, ()))
+        if not series or not series[-2]:
+            return None
+        rank = q * series[-2]
+        lower, previous = 0.0, 0.0
+        for bound, count in zip(self.buckets, series):
+            if count >= rank:
+                return lower + (bound - lower) * ((rank - previous) / (count - previous) if count > previous else 0.0)
+            lower, previous = bound, count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                labels = _format_labels(self.label_names, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {int(count)}")
+            labels = _format_labels(self.label_names, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {int(series[-2])}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_count{labels} {int(series[-2])}")
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def samples(self) -> List[Tuple[Dict[str, str], float]]:
+        with self._lock:
+            return [(dict(zip(self.label_names, key)), value) for key, value in self._values.items()]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: List[Any] = []
+        self._collectors: List[Tuple[str, str, str, Callable[[], Iterable[Tuple[Dict[str, Any], float]]]]] = []
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, name: str, help_text: str, kind: str, fn: Callable[[], Iterable[Tuple[Dict[str, Any], float]]]) -> None:
+        """
+        Métrica lida na hora do scrape: fn() devolve [(labels, valor)].
+        Útil para expor contadores que já existem em outros objetos (cache, roteador).
+        """
+        self._collectors.append((name, help_text, kind, fn))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, help_text, kind, fn in self._collectors:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            try:
+                samples = list(fn())
+            except Exception as e:
+                print("Erro ao coletar métrica", name, e)
+                continue
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "tutor_stage_seconds",
+    "Duração de cada estágio do turno (nós do grafo, embedding, consulta vetorial, LLM).",
+    ("stage",),
+)
+LLM_TOKENS = registry.counter(
+    "tutor_llm_tokens_total",
+    "Tokens reportados pelo provedor do LLM, por nó e tipo (prompt, completion, cached).",
+    ("node", "kind"),
+)
+
+
+def cached_token_ratio() -> Dict[str, float]:
+    """
+    Fração dos tokens de prompt servidos do cache de prompt do provedor, por nó.
+    """
+    totals: Dict[str, Dict[str, float]] = {}
+    for labels, value in LLM_TOKENS.samples():
+        totals.setdefault(labels["node"], {})[labels["kind"]] = value
+    return {
+        node: kinds.get("cached", 0.0) / kinds["prompt"]
+        for node, kinds in totals.items()
+        if kinds.get("prompt")
+    }
+
+
+registry.collector(
+    "tutor_llm_cached_token_ratio",
+    "Tokens de prompt lidos do cache do provedor / tokens de prompt, por nó.",
+    "gauge",
+    lambda: [({"node": node}, ratio) for node, ratio in cached_token_ratio().items()],
+)
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def instrument(stage: str):
+    """
+    Decorator que mede a duração de funções síncronas ou assíncronas.
+    """
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timed(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_llm_usage(node: str, message: Any) -> Optional[Dict[str, Any]]:
+    """
+    Soma os tokens de usage_metadata (padrão LangChain) da resposta do LLM.
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return None
+    LLM_TOKENS.inc(usage.get("input_tokens", 0), node=node, kind="prompt")
+    LLM_TOKENS.inc(usage.get("output_tokens", 0), node=node, kind="completion")
+    cached = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+    LLM_TOKENS.inc(cached, node=node, kind="cached")
+    return usage
+
+
+class TimedEmbeddings(Embeddings):
+    """
+    Envolve um objeto Embeddings do LangChain medindo embed_query/embed_documents.
+    """
+
+    def __init__(self, inner: Any) -> None:
+        self.inner = inner
+
+    def embed_query(self, text: str) -> List[float]:
+        with timed("embed_query"):
+            return self.inner.embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with timed("embed_documents"):
+            return self.inner.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        with timed("embed_query"):
+            return await self.inner.aembed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        with timed("embed_documents"):
+            return await self.inner.aembed_documents(texts)
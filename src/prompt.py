@@ -79,6 +79,17 @@ classifier_prompt = (
     "{context}\n"
 )
 
+# Mensagem de contexto do answer_with_context. Vai depois da pergunta do aluno
+# (o prefixo estático do prompt não muda entre turnos e o cache de prompt do provedor acerta)
+context_prompt = (
+    "Use APENAS as informações a seguir como contexto quando forem relevantes."
+    " Se o contexto não contiver a resposta, seja honesto."
+    " Trechos enviados em mensagens de contexto anteriores continuam valendo."
+    "\n\n[CONTEXT]\n{context}\n[/CONTEXT]"
+)
+
+context_already_shown = "(os trechos relevantes para esta pergunta já foram enviados nas mensagens de contexto acima)"
+
 welcome_message = (
     "👩‍🏫 Olá! Eu sou a **Professora Maísa**, sua mentora em **Desenvolvimento de Sistemas PHP e HTML5**.\n\n"
     "Meu propósito aqui é te apoiar a aprender, passo a passo, como:\n"
@@ -88,3 +99,33 @@ welcome_message = (
     "e também como o **PHP** integra tudo isso para construir **sistemas web dinâmicos**.\n\n"
     "Me diga: por onde você quer começar? Posso sugerir um caminho ou responder diretamente sua dúvida. 😊"
 )
+
+# Exemplos rotulados como fora do tema, usados pelo roteador local (src/router.py)
+off_topic_examples = [
+    "Qual é a capital da França?",
+    "Me conta uma piada",
+    "Quem ganhou o jogo de futebol ontem?",
+    "Qual a previsão do tempo para amanhã?",
+    "Me indique um filme para assistir",
+    "Como faço um bolo de chocolate?",
+    "Quanto é 2 + 2?",
+    "Qual é o sentido da vida?",
+    "Escreva um poema sobre o mar",
+    "Como investir na bolsa de valores?",
+    "Traduza essa frase para o inglês",
+    "Quem é o presidente do Brasil?",
+    "Oi, tudo bem?",
+    "Obrigado!",
+    "Como treinar uma rede neural em Python?",
+    "Me ajude com minha lição de matemática",
+]
+
+# Respostas degradadas quando o LLM está indisponível (src/llm_client.py)
+extractive_answer_intro = (
+    "⚠️ Estou com instabilidade para elaborar uma explicação completa agora. "
+    "Enquanto isso, veja o que o material do curso diz sobre a sua pergunta:"
+)
+unavailable_message = (
+    "⚠️ Estou com instabilidade no momento e não consegui responder. "
+    "Tente enviar a pergunta de novo em alguns instantes."
+)
@@ -0,0 +1,88 @@
+# src/router.py
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.vector_index import DOCS_FILE, _normalize
+
+
+def section_phrases(documents: Iterable[Document]) -> List[str]:
+    """
+    Frases "no tema" a partir dos metadados de extract_sections_as_documents:
+    títulos das seções + keywords (subseções).
+    """
+    phrases = set()
+    for d in documents:
+        meta = d.metadata or {}
+        if meta.get("title"):
+            phrases.add(str(meta["title"]).strip())
+        for kw in meta.get("keywords") or []:
+            if str(kw).strip():
+                phrases.add(str(kw).strip())
+    return sorted(phrases)
+
+
+def load_index_documents(directory: str) -> List[Document]:
+    path = os.path.join(directory, DOCS_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        raw_docs = json.load(f)
+    return [Document(page_content=d["page_content"], metadata=d.get("metadata", {})) for d in raw_docs]
+
+
+class EmbeddingRouter:
+    """
+    Roteador local YES/NO para classify_need_search.
+
+    margem = max cos(pergunta, frases do tema) - max cos(pergunta, exemplos fora do tema)
+      - margem >= yes_margin  -> YES (busca no índice)
+      - margem <= no_margin   -> NO  (resposta direta)
+      - entre os dois         -> None (ambíguo: cai no classificador LLM)
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        on_topic: Sequence[str],
+        off_topic: Sequence[str],
+        yes_margin: float = 0.05,
+        no_margin: float = -0.05,
+    ) -> None:
+        if not on_topic or not off_topic:
+            raise ValueError("O roteador precisa de exemplos dentro e fora do tema.")
+        self.embeddings = embeddings
+        self.yes_margin = yes_margin
+        self.no_margin = no_margin
+        self._on = _normalize(np.array(embeddings.embed_documents(list(on_topic)), dtype=np.float32))
+        self._off = _normalize(np.array(embeddings.embed_documents(list(off_topic)), dtype=np.float32))
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {"router_yes": 0, "router_no": 0, "llm_fallback": 0}
+
+    def score(self, query_vector: Sequence[float]) -> float:
+        q = _normalize(np.asarray(query_vector, dtype=np.float32))
+        return float(np.max(self._on @ q) - np.max(self._off @ q))
+
+    def route(self, text: str) -> Tuple[Optional[bool], float]:
+        return self.route_vector(self.embeddings.embed_query(text))
+
+    def route_vector(self, query_vector: Sequence[float]) -> Tuple[Optional[bool], float]:
+        # mesmo que route() com o embedding já calculado (lotes: graphChat.agentic_reply_batch)
+        margin = self.score(query_vector)
+        if margin >= self.yes_margin:
+            decision, counter = True, "router_yes"
+        elif margin <= self.no_margin:
+            decision, counter = False, "router_no"
+        else:
+            decision, counter = None, "llm_fallback"
+        with self._lock:
+            self.counters[counter] += 1
+        return decision, margin
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
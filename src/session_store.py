@@ -0,0 +1,119 @@
+# src/session_store.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+
+class SessionStore:
+    """
+    Estado por sessão (session_id gerado pela página do chat), thread-safe e limitado:
+      - sessões sem atividade há mais de idle_ttl segundos são removidas;
+      - acima de max_sessions, a sessão usada há mais tempo é removida (LRU).
+    on_evict(session_id) é chamado para cada sessão removida, fora do lock,
+    para liberar recursos associados (checkpoints, contadores de log).
+    Com sweep_interval, uma thread daemon chama sweep() periodicamente: as
+    sessões ociosas saem mesmo sem novos acessos.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        idle_ttl: float = 1800.0,
+        on_evict: Optional[Callable[[str], None]] = None,
+        sweep_interval: Optional[float] = None,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.on_evict = on_evict
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+        self._closed = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+        if sweep_interval:
+            self._sweeper = threading.Thread(
+                target=self._sweep_loop, args=(sweep_interval,), name="session-sweep", daemon=True
+            )
+            self._sweeper.start()
+
+    def _collect_evictions(self, now: float) -> List[str]:
+        evicted = []
+        # ordenado por último acesso: as ociosas ficam no início
+        while self._sessions:
+            session_id, state = next(iter(self._sessions.items()))
+            if now - state["last_seen"] <= self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+            evicted.append(session_id)
+        while len(self._sessions) > self.max_sessions:
+            session_id, _ = self._sessions.popitem(last=False)
+            evicted.append(session_id)
+        self.evicted += len(evicted)
+        return evicted
+
+    def _notify(self, evicted: List[str]) -> None:
+        if not self.on_evict:
+            return
+        for session_id in evicted:
+            try:
+                self.on_evict(session_id)
+            except Exception as e:
+                print("Erro ao liberar sessão", session_id, e)
+
+    def touch(self, session_id: str) -> Dict[str, Any]:
+        """
+        Retorna (criando se preciso) o estado mutável da sessão e marca o acesso.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = {"primed": False, "turns": 0}
+                self._sessions[session_id] = state
+            else:
+                self._sessions.move_to_end(session_id)
+            state["last_seen"] = now
+            evicted = self._collect_evictions(now)
+        self._notify(evicted)
+        return state
+
+    def next_turn(self, session_id: str) -> int:
+        state = self.touch(session_id)
+        with self._lock:
+            state["turns"] += 1
+            return state["turns"]
+
+    def is_primed(self, session_id: str) -> bool:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            return bool(state and state["primed"])
+
+    def mark_primed(self, session_id: str) -> None:
+        self.touch(session_id)["primed"] = True
+
+    def sweep(self) -> int:
+        """
+        Remove sessões ociosas sem depender de novos acessos; retorna quantas saíram.
+        """
+        with self._lock:
+            evicted = self._collect_evictions(time.monotonic())
+        self._notify(evicted)
+        return len(evicted)
+
+    def _sweep_loop(self, interval: float) -> None:
+        while not self._closed.wait(interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print("Erro ao varrer sessões:", e)
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._sweeper is not None:
+            self._sweeper.join(timeout=1)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
@@ -0,0 +1,131 @@
+# src/singleflight.py
+import asyncio
+import re
+import threading
+import unicodedata
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+from src.metrics import registry
+
+COALESCED = registry.counter(
+    "tutor_coalesced_total",
+    "Chamadas por estágio: leader executou o trabalho, follower reaproveitou uma chamada em andamento.",
+    ("stage", "role"),
+)
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """
+    Chave de coalescência: sem diferença de maiúsculas, espaços repetidos
+    e pontuação final ("Como uso <ol>?" == "como uso <ol>").
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return _SPACE_RE.sub(" ", text).strip().rstrip("?!.;, ")
+
+
+class _LeaderGone(Exception):
+    """
+    O leader foi interrompido (CancelledError, KeyboardInterrupt): os followers
+    não herdam a interrupção, disputam a chave de novo e um deles executa fn.
+    """
+
+
+class SingleFlight:
+    """
+    Coalescência de chamadas idênticas em andamento: o primeiro chamador de
+    uma chave (leader) executa fn; quem chega com a mesma chave antes do fim
+    (follower) espera e recebe o mesmo resultado, ou a mesma exceção (só
+    Exception: se o leader é cancelado, a liderança passa a um follower).
+    Nada é guardado depois que a chamada termina (isso é papel dos caches).
+
+    do() atende threads e ado() corrotinas; os dois compartilham as mesmas
+    chamadas em andamento via concurrent.futures.Future. Ambos retornam
+    (resultado, shared), com shared=True para os followers.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = Future()
+                self._inflight[key] = future
+                self.leaders += 1
+                leader = True
+            else:
+                self.followers += 1
+                leader = False
+        COALESCED.inc(stage=self.name, role="leader" if leader else "follower")
+        return future, leader
+
+    def _finish(self, key: Hashable, future: Future, result: Any = None, error: BaseException = None) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return future.result(), True
+            except _LeaderGone:
+                continue
+        try:
+            result = fn()
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        except BaseException:
+            self._finish(key, future, error=_LeaderGone())
+            raise
+        self._finish(key, future, result)
+        return result, False
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                # shield: o cancelamento de um follower não cancela a chamada compartilhada
+                return await asyncio.shield(asyncio.wrap_future(future)), True
+            except _LeaderGone:
+                continue
+        try:
+            result = await fn()
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        except BaseException:
+            self._finish(key, future, error=_LeaderGone())
+            raise
+        self._finish(key, future, result)
+        return result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.leaders + self.followers
+            return {
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "in_flight": len(self._inflight),
+                "coalescing_ratio": self.followers / total if total else 0.0,
+            }
+
+
+def coalescing_ratio_samples(flights: List[SingleFlight]) -> List[Tuple[Dict[str, str], float]]:
+    return [({"stage": f.name}, f.stats()["coalescing_ratio"]) for f in flights]
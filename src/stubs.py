@@ -0,0 +1,124 @@
+# src/stubs.py
+"""
+Substitutos locais do LLM e do retriever para testes de carga e benchmarks
+(LLM_BACKEND=stub / VECTOR_BACKEND=stub). Não fazem nenhuma chamada de rede.
+"""
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.retrievers import BaseRetriever
+
+STUB_ANSWER = (
+    "Claro! Em HTML5 a estrutura básica de uma página começa com `<!DOCTYPE html>`, "
+    "seguida das tags `<html>`, `<head>` e `<body>`."
+)
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Chat model determinístico com latência simulada.
+    Responde "YES" ao prompt do classificador e STUB_ANSWER ao resto.
+    classifier_answers/answers (chave: texto da última mensagem do aluno)
+    reproduzem respostas gravadas, como no replay de traces (benchmarks/replay.py).
+    """
+
+    latency: float = 0.5
+    answer: str = STUB_ANSWER
+    classifier_answer: str = "YES"
+    classifier_answers: Dict[str, str] = {}
+    answers: Dict[str, str] = {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _reply_for(self, messages: List[BaseMessage]) -> str:
+        first = str(getattr(messages[0], "content", "")) if messages else ""
+        last_human = next((str(m.content) for m in reversed(messages) if m.type == "human"), "")
+        if "classificador" in first:
+            return self.classifier_answers.get(last_human, self.classifier_answer)
+        return self.answers.get(last_human, self.answer)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply_for(messages)))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply_for(messages)))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        words = self._reply_for(messages).split(" ")
+        delay = self.latency / max(len(words), 1)
+        for i, word in enumerate(words):
+            time.sleep(delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        words = self._reply_for(messages).split(" ")
+        delay = self.latency / max(len(words), 1)
+        for i, word in enumerate(words):
+            await asyncio.sleep(delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class StubRetriever(BaseRetriever):
+    """
+    Retriever que devolve sempre os mesmos k documentos.
+    """
+
+    k: int = 2
+    latency: float = 0.0
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [
+            Document(
+                page_content=f"Seção {i + 1}\n\nConteúdo de exemplo sobre HTML5.",
+                metadata={"source": "stub", "title": f"Seção {i + 1}", "keywords": [f"Seção {i + 1}"]},
+            )
+            for i in range(self.k)
+        ]
@@ -0,0 +1,299 @@
+# src/student_profiles.py
+"""
+Perfil de aprendizagem por aluno: um vetor de domínio (mastery) por seção do
+material, atualizado a cada turno com busca, sem chamada ao LLM.
+
+Modelo (médias móveis, O(seções) por turno):
+  - todas as seções recuperam um pouco: m += recovery * (1 - m);
+  - as seções mais relevantes para a pergunta (o top-k da busca, antes do
+    perfil) contam uma consulta a mais; voltar a uma seção já consultada é o
+    sinal de dificuldade: m[s] *= 1 - penalty. A primeira consulta só conta.
+Aluno novo começa com m = 0.5 em tudo (nenhuma preferência). Na busca,
+candidatos de seções fracas sobem no máximo max_shift posições: ordem por
+posição - max_shift * fraqueza relativa (0 para o candidato de maior domínio,
+1 para o de menor; diferenças menores que MIN_SPREAD valem proporcionalmente
+menos). O perfil desempata candidatos
+próximos, mas não traz uma seção do fim da lista para o lugar de uma
+relevante; e como o registro usa o top-k sem o perfil, a promoção não
+realimenta o próprio perfil.
+
+Armazenamento: matrizes NumPy (alunos x seções) de float16 (domínio) e
+uint16 (consultas), ~4 bytes por aluno e seção. As colunas são os títulos
+das seções na ordem em que apareceram (só crescem). Linhas alteradas são
+gravadas em lote num SQLite por uma thread (a cada flush_interval segundos
+ou quando batch_size linhas mudaram) e relidas sob demanda. No máximo
+max_resident alunos ficam em memória: o menos recente sai (LRU) e sua linha
+é reaproveitada; se tinha alterações, elas vão no próximo lote.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+INITIAL_MASTERY = 0.5
+# diferença de domínio entre candidatos que vale o deslocamento inteiro
+MIN_SPREAD = 0.2
+
+
+class StudentProfileStore:
+    def __init__(
+        self,
+        path: str,
+        sections: Sequence[str] = (),
+        penalty: float = 0.3,
+        recovery: float = 0.02,
+        max_shift: float = 3.0,
+        batch_size: int = 512,
+        flush_interval: float = 5.0,
+        initial_capacity: int = 1024,
+        max_resident: int = 10_000,
+    ) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.penalty = penalty
+        self.recovery = recovery
+        self.max_shift = max_shift
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_resident = max(1, max_resident)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS profiles (student_id TEXT PRIMARY KEY, mastery BLOB NOT NULL, "
+            "counts BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db_lock = threading.Lock()
+
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'sections'").fetchone()
+        self.sections: List[str] = json.loads(row[0]) if row else []
+        self._columns: Dict[str, int] = {s: i for i, s in enumerate(self.sections)}
+
+        self._lock = threading.Lock()
+        # aluno -> linha das matrizes, do menos para o mais recente
+        self._rows: "OrderedDict[str, int]" = OrderedDict()
+        capacity = max(1, min(initial_capacity, self.max_resident))
+        self._mastery = np.full((capacity, len(self.sections)), INITIAL_MASTERY, dtype=np.float16)
+        self._counts = np.zeros((capacity, len(self.sections)), dtype=np.uint16)
+        self._used = 0
+        self._free: List[int] = []
+        self._dirty: set = set()
+        # alunos que saíram da memória com alterações ainda não gravadas: (mastery, counts)
+        self._evicted: Dict[str, Tuple[bytes, bytes]] = {}
+        # lote sendo gravado: quem volta à memória antes do COMMIT lê daqui, não do SQLite
+        self._writing: Dict[str, Tuple[bytes, bytes]] = {}
+        self.evictions = 0
+        self._sections_dirty = False
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.ensure_sections(sections)
+
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="profile-flush", daemon=True)
+        self._flusher.start()
+
+    # ---------- layout ----------
+    def ensure_sections(self, titles: Iterable[str]) -> List[int]:
+        """
+        Colunas das seções (novas seções ganham coluna no fim).
+        """
+        with self._lock:
+            return self._ensure_sections(titles)
+
+    def _ensure_sections(self, titles: Iterable[str]) -> List[int]:
+        columns = []
+        new = []
+        for title in titles:
+            col = self._columns.get(title)
+            if col is None:
+                col = len(self.sections)
+                self._columns[title] = col
+                self.sections.append(title)
+                new.append(title)
+            columns.append(col)
+        if new:
+            extra = len(new)
+            self._mastery = np.hstack([self._mastery, np.full((len(self._mastery), extra), INITIAL_MASTERY, np.float16)])
+            self._counts = np.hstack([self._counts, np.zeros((len(self._counts), extra), np.uint16)])
+            self._sections_dirty = True
+        return columns
+
+    def _grow(self) -> None:
+        capacity = min(len(self._mastery) * 2, self.max_resident)
+        mastery = np.full((capacity, len(self.sections)), INITIAL_MASTERY, dtype=np.float16)
+        counts = np.zeros((capacity, len(self.sections)), dtype=np.uint16)
+        mastery[:len(self._mastery)] = self._mastery
+        counts[:len(self._counts)] = self._counts
+        self._mastery, self._counts = mastery, counts
+
+    def _evict(self) -> None:
+        student_id, row = self._rows.popitem(last=False)
+        if student_id in self._dirty:
+            self._dirty.discard(student_id)
+            self._evicted[student_id] = (self._mastery[row].tobytes(), self._counts[row].tobytes())
+        self._mastery[row] = INITIAL_MASTERY
+        self._counts[row] = 0
+        self._free.append(row)
+        self.evictions += 1
+
+    def _row(self, student_id: str) -> int:
+        row = self._rows.get(student_id)
+        if row is not None:
+            self._rows.move_to_end(student_id)
+            return row
+        if not self._free and len(self._rows) >= self.max_resident:
+            self._evict()
+        if self._free:
+            row = self._free.pop()
+        else:
+            row = self._used
+            self._used += 1
+            if row >= len(self._mastery):
+                self._grow()
+        self._rows[student_id] = row
+        stored = self._evicted.pop(student_id, None)
+        if stored is not None:
+            # ainda não gravado: volta para a memória como alterado
+            self._dirty.add(student_id)
+        elif student_id in self._writing:
+            stored = self._writing[student_id]
+        else:
+            with self._db_lock:
+                stored = self._conn.execute(
+                    "SELECT mastery, counts FROM profiles WHERE student_id = ?", (student_id,)
+                ).fetchone()
+        if stored is not None:
+            # linhas gravadas antes de novas seções são mais curtas: o resto fica no valor inicial
+            mastery = np.frombuffer(stored[0], dtype=np.float16)
+            counts = np.frombuffer(stored[1], dtype=np.uint16)
+            self._mastery[row, :len(mastery)] = mastery[:len(self.sections)]
+            self._counts[row, :len(counts)] = counts[:len(self.sections)]
+        return row
+
+    # ---------- leitura/atualização ----------
+    def mastery(self, student_id: str) -> Dict[str, float]:
+        with self._lock:
+            row = self._row(student_id)
+            return {s: float(m) for s, m in zip(self.sections, self._mastery[row])}
+
+    def record_retrieval(self, student_id: str, titles: Sequence[str]) -> None:
+        """
+        Atualiza o perfil depois de um turno com busca (titles: as seções mais
+        relevantes para a pergunta, sem a reordenação do perfil).
+        """
+        with self._lock:
+            columns = self._ensure_sections(titles)
+            row = self._row(student_id)
+            m = self._mastery[row].astype(np.float32)
+            m += self.recovery * (1.0 - m)
+            if columns:
+                counts = self._counts[row]
+                repeated = [col for col in columns if counts[col] > 0]
+                if repeated:
+                    m[repeated] *= 1.0 - self.penalty
+                counts[columns] = np.minimum(counts[columns].astype(np.uint32) + 1, np.iinfo(np.uint16).max)
+            self._mastery[row] = m
+            self._dirty.add(student_id)
+            if len(self._dirty) + len(self._evicted) >= self.batch_size:
+                self._wake.set()
+
+    def rerank(self, student_id: str, documents: Sequence[Any], k: int, title_of: Callable[[Any], str]) -> List[Any]:
+        """
+        Os k melhores candidatos (em ordem de relevância) com as seções fracas
+        do aluno promovidas até max_shift posições. Seções desconhecidas contam
+        como domínio inicial.
+        """
+        if not documents:
+            return []
+        with self._lock:
+            row = self._row(student_id)
+            weakness = 1.0 - self._mastery[row].astype(np.float32)
+            columns = [self._columns.get(title_of(d)) for d in documents]
+        w = np.array([weakness[col] if col is not None else 1.0 - INITIAL_MASTERY for col in columns], dtype=np.float32)
+        relative = (w - w.min()) / max(float(w.max() - w.min()), MIN_SPREAD)
+        positions = np.arange(len(documents)) - self.max_shift * relative
+        order = sorted(range(len(documents)), key=lambda i: (positions[i], i))
+        return [documents[i] for i in order[:k]]
+
+    # ---------- persistência ----------
+    def flush(self) -> int:
+        with self._lock:
+            if not self._dirty and not self._evicted and not self._sections_dirty:
+                return 0
+            now = time.time()
+            rows = [
+                (sid, self._mastery[self._rows[sid]].tobytes(), self._counts[self._rows[sid]].tobytes(), now)
+                for sid in self._dirty
+            ]
+            rows.extend((sid, mastery, counts, now) for sid, (mastery, counts) in self._evicted.items())
+            sections = json.dumps(self.sections, ensure_ascii=False) if self._sections_dirty else None
+            self._writing = {sid: (mastery, counts) for sid, mastery, counts, _ in rows}
+            self._dirty = set()
+            self._evicted = {}
+            self._sections_dirty = False
+        committed = False
+        try:
+            with self._db_lock:
+                self._conn.execute("BEGIN")
+                try:
+                    if sections is not None:
+                        self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('sections', ?)", (sections,))
+                    self._conn.executemany("INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?)", rows)
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                self._conn.execute("COMMIT")
+                committed = True
+        finally:
+            with self._lock:
+                if not committed:
+                    # a gravação falhou: o lote volta para a próxima rodada
+                    for sid, stored in self._writing.items():
+                        if sid in self._rows:
+                            self._dirty.add(sid)
+                        elif sid not in self._evicted:
+                            self._evicted[sid] = stored
+                    self._sections_dirty = self._sections_dirty or sections is not None
+                self._writing = {}
+        self.flushes += 1
+        self.flushed_rows += len(rows)
+        return len(rows)
+
+    def _flush_loop(self) -> None:
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print("Erro ao gravar perfis de alunos:", e)
+
+    def close(self) -> None:
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._wake.set()
+        self._flusher.join(timeout=self.flush_interval + 1)
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "students": len(self._rows),
+                "sections": len(self.sections),
+                "dirty": len(self._dirty) + len(self._evicted),
+                "evictions": self.evictions,
+                "flushes": self.flushes,
+                "flushed_rows": self.flushed_rows,
+                "bytes": int(self._mastery[:self._used].nbytes + self._counts[:self._used].nbytes),
+            }
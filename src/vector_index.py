@@ -0,0 +1,230 @@
+# src/vector_index.py
+import hashlib
+import json
+import os
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+EMBEDDINGS_FILE = "embeddings.npy"
+DOCS_FILE = "docs.json"
+META_FILE = "meta.json"
+HNSW_FILE = "hnsw.bin"
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class LocalVectorIndex:
+    """
+    Índice vetorial local (in-process) para o corpus de seções do PDF.
+
+    - "exact": matriz NumPy de embeddings normalizados, top-k por cosseno exato
+      (produto interno). Para algumas dezenas de seções é a opção mais rápida.
+    - "hnsw": índice aproximado via hnswlib, útil para corpora maiores.
+
+    Os arquivos ficam em um diretório; a matriz é aberta com memory-map.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        documents: List[Document],
+        ids: Optional[List[str]] = None,
+        backend: str = "exact",
+        hnsw_index: Any = None,
+    ) -> None:
+        if len(vectors) != len(documents):
+            raise ValueError("vectors e documents devem ter o mesmo tamanho.")
+        self.vectors = vectors
+        self.documents = documents
+        self.ids = ids or [str(i) for i in range(len(documents))]
+        self.backend = backend
+        self._hnsw = hnsw_index
+
+    # ---------- construção ----------
+    @classmethod
+    def from_documents(
+        cls,
+        documents: Sequence[Document],
+        embeddings,
+        ids: Optional[List[str]] = None,
+        backend: str = "exact",
+    ) -> "LocalVectorIndex":
+        documents = list(documents)
+        raw = embeddings.embed_documents([d.page_content for d in documents])
+        vectors = _normalize(np.array(raw, dtype=np.float32).reshape(len(documents), -1))
+        index = cls(vectors, documents, ids=ids, backend=backend)
+        if backend == "hnsw":
+            index._hnsw = index._build_hnsw()
+        return index
+
+    def _build_hnsw(self):
+        import hnswlib
+
+        n, dim = self.vectors.shape
+        hnsw = hnswlib.Index(space="ip", dim=dim)
+        hnsw.init_index(max_elements=max(n, 1), ef_construction=200, M=16)
+        if n:
+            hnsw.add_items(np.asarray(self.vectors), np.arange(n))
+        hnsw.set_ef(max(50, min(n, 200)))
+        return hnsw
+
+    @classmethod
+    def empty(cls, backend: str = "exact") -> "LocalVectorIndex":
+        return cls(np.zeros((0, 0), dtype=np.float32), [], ids=[], backend=backend)
+
+    # ---------- atualização incremental ----------
+    def upsert(self, ids: Sequence[str], documents: Sequence[Document], vectors: Any) -> None:
+        """
+        Insere ou substitui (pelo id) documentos com embeddings já calculados.
+        """
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(documents), -1))
+        rows = {doc_id: (doc, self.vectors[i]) for i, (doc_id, doc) in enumerate(zip(self.ids, self.documents))}
+        for doc_id, doc, vector in zip(ids, documents, vectors):
+            rows[doc_id] = (doc, vector)
+        self._replace_rows(rows, dim=vectors.shape[1])
+
+    def delete(self, ids: Sequence[str]) -> None:
+        drop = set(ids)
+        rows = {
+            doc_id: (doc, self.vectors[i])
+            for i, (doc_id, doc) in enumerate(zip(self.ids, self.documents))
+            if doc_id not in drop
+        }
+        self._replace_rows(rows)
+
+    def _replace_rows(self, rows, dim: Optional[int] = None) -> None:
+        if dim is None:
+            dim = self.vectors.shape[1] if self.vectors.ndim == 2 else 0
+        # np.array copia: a matriz deixa de depender do memmap do arquivo antigo
+        self.vectors = np.array([vector for _, vector in rows.values()], dtype=np.float32).reshape(len(rows), dim)
+        self.documents = [doc for doc, _ in rows.values()]
+        self.ids = list(rows)
+        self._hnsw = self._build_hnsw() if self.backend == "hnsw" and self.ids else None
+
+    # ---------- persistência ----------
+    def fingerprint(self) -> str:
+        """
+        Hash estável do conteúdo indexado (ids + textos). Muda sempre que o
+        índice é reconstruído com conteúdo diferente.
+        """
+        h = hashlib.sha256()
+        for doc_id, doc in zip(self.ids, self.documents):
+            h.update(doc_id.encode("utf-8"))
+            h.update(b"\0")
+            h.update(doc.page_content.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()[:16]
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        # grava em arquivo temporário e troca: um processo com o índice aberto
+        # (memmap) nunca lê um arquivo pela metade
+        tmp_npy = os.path.join(directory, EMBEDDINGS_FILE + ".tmp.npy")
+        np.save(tmp_npy, np.ascontiguousarray(self.vectors, dtype=np.float32))
+        os.replace(tmp_npy, os.path.join(directory, EMBEDDINGS_FILE))
+        tmp_docs = os.path.join(directory, DOCS_FILE + ".tmp")
+        with open(tmp_docs, "w", encoding="utf-8") as f:
+            json.dump(
+                [
+                    {"id": doc_id, "page_content": d.page_content, "metadata": d.metadata}
+                    for doc_id, d in zip(self.ids, self.documents)
+                ],
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_docs, os.path.join(directory, DOCS_FILE))
+        meta = {
+            "backend": self.backend,
+            "count": len(self.documents),
+            "dim": int(self.vectors.shape[1]) if len(self.vectors) else 0,
+            "fingerprint": self.fingerprint(),
+        }
+        with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        if self.backend == "hnsw" and self.documents:
+            (self._hnsw or self._build_hnsw()).save_index(os.path.join(directory, HNSW_FILE))
+
+    @classmethod
+    def load(cls, directory: str, backend: Optional[str] = None) -> "LocalVectorIndex":
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, DOCS_FILE), encoding="utf-8") as f:
+            raw_docs = json.load(f)
+        vectors = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+        documents = [Document(page_content=d["page_content"], metadata=d.get("metadata", {})) for d in raw_docs]
+        ids = [d["id"] for d in raw_docs]
+        backend = backend or meta.get("backend", "exact")
+
+        hnsw = None
+        if backend == "hnsw":
+            import hnswlib
+
+            hnsw_path = os.path.join(directory, HNSW_FILE)
+            if os.path.exists(hnsw_path):
+                hnsw = hnswlib.Index(space="ip", dim=int(meta["dim"]))
+                hnsw.load_index(hnsw_path, max_elements=max(len(documents), 1))
+                hnsw.set_ef(max(50, min(len(documents), 200)))
+        index = cls(vectors, documents, ids=ids, backend=backend, hnsw_index=hnsw)
+        if backend == "hnsw" and hnsw is None:
+            index._hnsw = index._build_hnsw()
+        return index
+
+    # ---------- consulta ----------
+    def search(self, query_vector: Sequence[float], k: int = 2) -> List[Tuple[int, float]]:
+        """
+        Retorna [(posição, similaridade)] dos k vizinhos mais próximos.
+        """
+        n = len(self.documents)
+        if n == 0:
+            return []
+        k = min(k, n)
+        q = _normalize(np.asarray(query_vector, dtype=np.float32))
+
+        if self.backend == "hnsw" and self._hnsw is not None:
+            labels, distances = self._hnsw.knn_query(q, k=k)
+            # espaço "ip" devolve 1 - produto interno
+            return [(int(i), float(1.0 - d)) for i, d in zip(labels[0], distances[0])]
+
+        scores = self.vectors @ q
+        if k < n:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(n)
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def similarity_search_by_vector(self, query_vector: Sequence[float], k: int = 2) -> List[Document]:
+        return [self.documents[i] for i, _ in self.search(query_vector, k=k)]
+
+
+class LocalVectorRetriever(BaseRetriever):
+    """
+    Retriever LangChain sobre o LocalVectorIndex: substitui o
+    PineconeVectorStore.as_retriever(...) sem ida à rede.
+    """
+
+    index: Any
+    embeddings: Any
+    k: int = 2
+    candidates: int = 20
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_vector = self.embeddings.embed_query(query)
+        return self.index.similarity_search_by_vector(query_vector, k=self.k)
+
+    def candidate_documents(self, query: str, query_vector: Optional[Sequence[float]] = None) -> List[Document]:
+        # para reordenar por aluno (src/student_profiles.py) antes do corte em k
+        if query_vector is None:
+            query_vector = self.embeddings.embed_query(query)
+        return self.index.similarity_search_by_vector(query_vector, k=max(self.k, self.candidates))
@@ -1,40 +1,156 @@
-from dotenv import load_dotenv
+"""
+Indexa (incrementalmente) as fontes do curso no índice local e, com
+VECTOR_BACKEND=pinecone, no Pinecone. Formatos: PDF (seções), JSON de
+exercícios, texto e imagens via OCR (ver src/ingest.py).
+
+    python store_index.py                      # fontes de SOURCE_PATHS (padrão: resources/)
+    python store_index.py resources/ outro.pdf # arquivos e/ou diretórios
+    python store_index.py --full               # reembeda tudo
+    python store_index.py --dry-run            # só mostra o que mudaria
+    python store_index.py --course logica      # fontes e índice de um curso do catálogo
+
+Só seções novas ou alteradas são embedadas; as removidas são apagadas.
+Com caminhos explícitos, só os arquivos debaixo deles são comparados; o
+resto do manifesto (e do índice) fica como está.
+O manifesto fica em <índice do curso>/manifest.json (curso padrão: LOCAL_INDEX_DIR).
+"""
+import argparse
+import json
 import os
-from src.helper import extract_sections_as_documents, downloald_hugging_face_embeddings
-from pinecone import Pinecone
-from pinecone import ServerlessSpec
-from langchain_pinecone import PineconeVectorStore
+import time
+
+from dotenv import load_dotenv
+from src.courses import load_courses
+from src.helper import EMBEDDING_MODEL, downloald_hugging_face_embeddings
+from src.ingest import Ingestor, supported_extensions
+from src.indexing import MANIFEST_VERSION, index_version, load_manifest, plan_update, save_manifest
+from src.vector_index import META_FILE, LocalVectorIndex
 
 load_dotenv()
 
-PDF_PATH = "/home/janderson/Documentos/challenge-artificial-intelligence/data/Capítulo do Livro.pdf"
+# "pinecone" (padrão) também envia os chunks ao Pinecone; o índice local é sempre gerado.
+# Diretório do índice, fontes e índice/namespace do Pinecone vêm do curso (src/courses.py).
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+LOCAL_INDEX_TYPE = os.getenv("LOCAL_INDEX_TYPE", "exact")
+# arquivos lidos ao mesmo tempo (cada um pelo loader do seu formato)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+PINECONE_BATCH = 100
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
 
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
-os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
+def sync_pinecone(ids, docs, vectors, delete_ids, index_name="chatbot", namespace=None, clear=False) -> None:
+    """
+    Aplica o plano no Pinecone com os mesmos ids do índice local (upsert por
+    id substitui a versão anterior). O texto vai no campo "text" dos
+    metadados, como o PineconeVectorStore espera. Cada curso usa o próprio
+    namespace (o curso padrão, o namespace vazio).
 
-text_chunks = extract_sections_as_documents(PDF_PATH)
-embeddings = downloald_hugging_face_embeddings()
+    clear=True (primeira sincronização sem manifesto) esvazia o namespace
+    antes: vetores de uma indexação antiga (from_documents, ids aleatórios)
+    não seriam substituídos pelos ids estáveis e duplicariam as seções.
+    """
+    from pinecone import Pinecone
+    from pinecone import ServerlessSpec
 
-pinecone_api_key = PINECONE_API_KEY
-pc = Pinecone(api_key=pinecone_api_key)
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    if not pc.has_index(index_name):
+        pc.create_index(
+            name=index_name,
+            dimension=384,
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1")
+        )
+    index = pc.Index(index_name)
+    if clear:
+        try:
+            index.delete(delete_all=True, namespace=namespace)
+        except Exception as e:
+            # namespace ainda inexistente: nada a apagar
+            if getattr(e, "status", None) != 404:
+                raise
 
-index_name = 'chatbot'
+    records = [
+        {"id": doc_id, "values": [float(x) for x in vector], "metadata": {**doc.metadata, "text": doc.page_content}}
+        for doc_id, doc, vector in zip(ids, docs, vectors)
+    ]
+    for batch in _batches(records, PINECONE_BATCH):
+        index.upsert(vectors=batch, namespace=namespace)
+    for batch in _batches(list(delete_ids), PINECONE_BATCH):
+        index.delete(ids=batch, namespace=namespace)
 
-if  not pc.has_index(index_name): 
-    pc.create_index(
-        name=index_name,
-        dimension=384,
-        metric="cosine",
-        spec=ServerlessSpec(cloud="aws", region="us-east-1")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="arquivos ou diretórios (padrão: fontes do curso)")
+    parser.add_argument("--course", help="id do curso no catálogo (padrão: curso padrão)")
+    parser.add_argument("--full", action="store_true", help="reembeda todas as seções")
+    parser.add_argument("--dry-run", action="store_true", help="mostra o plano sem alterar nada")
+    args = parser.parse_args(argv)
+
+    courses, default_id = load_courses()
+    if (args.course or default_id) not in courses:
+        parser.error(f"curso desconhecido: {args.course}")
+    course = courses[args.course or default_id]
+    index_dir = course.index_dir
+
+    start = time.perf_counter()
+    manifest = load_manifest(index_dir)
+    have_index = os.path.exists(os.path.join(index_dir, META_FILE))
+    force = args.full or not have_index or manifest.get("embedding_model") != EMBEDDING_MODEL
+    ingestor = Ingestor()
+    plan = plan_update(
+        args.paths or course.sources,
+        manifest,
+        ingestor.load,
+        force=force,
+        extensions=supported_extensions(),
+        max_workers=INGEST_WORKERS,
     )
+    print(json.dumps(plan.summary()))
+    if ingestor.report():
+        print(json.dumps({"loaders": ingestor.report()}, ensure_ascii=False))
+    if args.dry_run:
+        return
+
+    if plan.changed or not have_index:
+        vectors = []
+        if plan.upsert_docs:
+            # o modelo só é carregado quando há algo para embedar
+            embeddings = downloald_hugging_face_embeddings()
+            vectors = embeddings.embed_documents([d.page_content for d in plan.upsert_docs])
+
+        if force:
+            local_index = LocalVectorIndex.empty(backend=LOCAL_INDEX_TYPE)
+        else:
+            local_index = LocalVectorIndex.load(index_dir, backend=LOCAL_INDEX_TYPE)
+        if plan.upsert_ids:
+            local_index.upsert(plan.upsert_ids, plan.upsert_docs, vectors)
+        if plan.delete_ids:
+            local_index.delete(plan.delete_ids)
+        local_index.save(index_dir)
+        print(f"Índice local salvo em {index_dir} ({len(local_index.documents)} seções, {LOCAL_INDEX_TYPE}).")
+
+        if VECTOR_BACKEND == "pinecone":
+            sync_pinecone(
+                plan.upsert_ids, plan.upsert_docs, vectors, plan.delete_ids,
+                index_name=course.pinecone_index, namespace=course.pinecone_namespace,
+                clear=not manifest.get("files"),
+            )
+    else:
+        print("Nenhuma seção mudou; índice mantido.")
+
+    # o manifesto é gravado por último: se algo acima falhar, a próxima
+    # execução refaz o mesmo plano
+    manifest = {"version": MANIFEST_VERSION, "embedding_model": EMBEDDING_MODEL, "files": plan.files}
+    # lido pelo servidor (fingerprint do cache de respostas com o Pinecone)
+    manifest["index_version"] = index_version(manifest)
+    save_manifest(index_dir, manifest)
+    print(f"Concluído em {time.perf_counter() - start:.1f}s.")
 
-index = pc.Index(index_name)
 
-docsearch = PineconeVectorStore.from_documents(
-    documents=text_chunks,
-    embedding=embeddings,
-    index_name=index_name, 
-)
+if __name__ == "__main__":
+    main()